@@ -0,0 +1,129 @@
+# answer_stream.py
+"""
+回答のストリーミング
+
+Streamlitの各アプリは参考にしたドキュメント・事例・関連ブログを先に表示し、
+iter_text_chunks() を st.write_stream() に渡して回答を生成され次第表示する。
+
+Server-Sent Events: app.py（asgi_app.py）の /ask/stream が、検索結果（すぐに求まる）を先に送り、
+LangGraphの stream_mode="messages" で得たトークンを生成され次第 SSE のイベントとして送る。
+イベントの順序:
+
+  sources {"sources": [...]}    参考にしたドキュメント（source_summaries()）
+  cases  {"cases": [...]}       関連する修理事例（case_summaries()）
+  blogs  {"blogs": [...]}       関連ブログ（blog_summaries()）
+  token  {"text": "..."}        回答の断片（届いた順につなげる）
+  reset  {}                     ツール呼び出しの後に回答を生成し直す（それまでの断片を破棄）
+  links  {"links": "..."}       関連リンク（/ask の links と同じ）
+  done   {"answer": "..."}      回答の全文
+  error  {"message": "..."}
+"""
+
+import json
+import os
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",      # nginx などのプロキシでバッファさせない
+}
+
+
+def sse_event(event, data):
+    """SSE のイベント1件（data はJSON。改行を含まない1行になる）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def source_summaries(docs, excerpt_length=200):
+    """検索したドキュメント（Document）の出典・ページ・抜粋"""
+    summaries = []
+    for doc in docs:
+        text = " ".join(doc.page_content.split())
+        summaries.append({
+            "source": os.path.basename(doc.metadata.get("source", "")),
+            "page": doc.metadata.get("page"),
+            "excerpt": text[:excerpt_length] + "..." if len(text) > excerpt_length else text,
+        })
+    return summaries
+
+
+def case_summaries(cases):
+    """関連する修理事例（KnowledgeCase）の見出しとURL"""
+    return [{"category": case.category, "code": case.code, "title": case.title, "urls": list(case.urls)}
+            for case in cases]
+
+
+def blog_summaries(blogs):
+    """関連ブログ（カタログの形式）のタイトル・URL・キーワード"""
+    return [{"title": blog["title"], "url": blog["url"], "keywords": list(blog.get("keywords", []))}
+            for blog in blogs]
+
+
+def _chunk_text(content):
+    if isinstance(content, list):
+        # コンテンツブロック形式（[{"type": "text", "text": ...}]）
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return content or ""
+
+
+def iter_text_chunks(llm, messages):
+    """llm.stream() の断片のテキストを返す（st.write_stream() に渡す）"""
+    for chunk in llm.stream(messages):
+        text = _chunk_text(getattr(chunk, "content", ""))
+        if text:
+            yield text
+
+
+def iter_answer_tokens(messages, node="agent"):
+    """stream_mode="messages" の (メッセージの断片, メタデータ) から回答の断片を返す
+
+    戻り値: (ステップ, テキスト)。ツールの結果・ツール呼び出しだけの断片は除く。
+    ステップが変わったら、前のステップの断片は最終的な回答に含まれない。
+    """
+    for chunk, metadata in messages:
+        if metadata.get("langgraph_node") != node:
+            continue
+        content = _chunk_text(getattr(chunk, "content", ""))
+        if content:
+            yield metadata.get("langgraph_step"), content
+
+
+async def aiter_answer_tokens(messages, node="agent"):
+    """iter_answer_tokens() の非同期版（app_flow.astream() の stream_mode="messages" 用）"""
+    async for chunk, metadata in messages:
+        if metadata.get("langgraph_node") != node:
+            continue
+        content = _chunk_text(getattr(chunk, "content", ""))
+        if content:
+            yield metadata.get("langgraph_step"), content
+
+
+class AnswerBuffer:
+    """回答の断片を token / reset イベントにしながら、最終的な回答の全文を組み立てる"""
+
+    def __init__(self):
+        self.parts = []
+        self.step = None
+
+    def feed(self, step, text):
+        """断片1つ分のイベント（ステップが変わったときは reset を前に付ける）"""
+        events = []
+        if step != self.step:
+            if self.parts:
+                self.parts = []
+                events.append(sse_event("reset", {}))
+            self.step = step
+        self.parts.append(text)
+        events.append(sse_event("token", {"text": text}))
+        return events
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+
+def stream_answer(messages, node="agent"):
+    """回答の断片を token / reset イベントにして返し、最後に全文を返す（ジェネレーターの戻り値）"""
+    answer = AnswerBuffer()
+    for step, text in iter_answer_tokens(messages, node):
+        yield from answer.feed(step, text)
+    return answer.text
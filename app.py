@@ -1,7 +1,9 @@
-from flask import Flask, render_template, request, jsonify, g, session
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
+from contextvars import ContextVar
 from typing import Literal
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.tools import tool
+from shared_clients import get_chat_model, get_embeddings
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
 from langgraph.graph import END, START, StateGraph, MessagesState
 from langgraph.prebuilt import ToolNode
 from langgraph.checkpoint.memory import MemorySaver
@@ -12,6 +14,13 @@ from langchain_chroma import Chroma
 import os
 import uuid
 
+from answer_stream import (
+    SSE_HEADERS, blog_summaries, case_summaries, source_summaries, sse_event, stream_answer,
+)
+from blog_catalog import relevant_blog_links
+from knowledge_index import get_knowledge_base
+from query_analysis import analyze_query
+
 # 設定ファイルをインポート
 from config import OPENAI_API_KEY, SERP_API_KEY, LANGSMITH_API_KEY
 
@@ -35,7 +44,7 @@ loader = PyPDFLoader(pdf_path)
 documents = loader.load()
 
 # OpenAIの埋め込みモデルを設定
-embeddings_model = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+embeddings_model = get_embeddings(OPENAI_API_KEY)
 
 for doc in documents:
     if not isinstance(doc.page_content, str):
@@ -85,50 +94,59 @@ template = """
 """
 
 # === ツールの設定 ===
-@tool
-def search(query: str):
-    """キャンピングカー修理に関する情報を検索します。"""
-    try:
-        from langchain_community.utilities import SerpAPIWrapper
-        
-        search_wrapper = SerpAPIWrapper(serpapi_api_key=SERP_API_KEY)
-        result = search_wrapper.run(query)
-        
-        # 検索結果を箇条書き形式で処理
-        if result:
-            # 基本的なリンクを箇条書き形式で生成
-            links = [
-                f"[検索] Google検索: {query} についての詳細情報",
-                f"[動画] YouTube動画: {query} の修理手順動画",
-                f"[購入] Amazon商品: {query} 関連の部品・工具",
-                f"[情報] 専門サイト: キャンピングカー修理専門情報"
-            ]
-            g.search_results = links
-        else:
-            # デフォルトのリンクを箇条書き形式で生成
-            g.search_results = [
-                f"[検索] Google検索: キャンピングカー {query} 修理方法",
-                f"[動画] YouTube動画: キャンピングカー {query} 修理手順",
-                f"[購入] Amazon商品: キャンピングカー修理部品",
-                f"[情報] 専門サイト: キャンピングカー修理専門情報"
-            ]
-        
-        return g.search_results
-    except Exception as e:
-        # エラー時もデフォルトのリンクを箇条書き形式で生成
-        g.search_results = [
+# 検索ツールのリンク（リクエストごとに空のリストを設定し、ツールが中身を置き換える）
+# Flask の g と違い、非同期モード（asgi_app.py）でも同じように使える
+search_results = ContextVar("search_results", default=None)
+
+def _search_links(query: str, result):
+    if result:
+        # 基本的なリンクを箇条書き形式で生成
+        links = [
+            f"[検索] Google検索: {query} についての詳細情報",
+            f"[動画] YouTube動画: {query} の修理手順動画",
+            f"[購入] Amazon商品: {query} 関連の部品・工具",
+            f"[情報] 専門サイト: キャンピングカー修理専門情報"
+        ]
+    else:
+        # デフォルトのリンクを箇条書き形式で生成（エラー時も同じ）
+        links = [
             f"[検索] Google検索: キャンピングカー {query} 修理方法",
             f"[動画] YouTube動画: キャンピングカー {query} 修理手順",
             f"[購入] Amazon商品: キャンピングカー修理部品",
             f"[情報] 専門サイト: キャンピングカー修理専門情報"
         ]
-        return g.search_results
+    current = search_results.get()
+    if current is not None:
+        current[:] = links
+    return links
+
+def _serpapi():
+    from langchain_community.utilities import SerpAPIWrapper
+    return SerpAPIWrapper(serpapi_api_key=SERP_API_KEY)
+
+def _search(query: str):
+    """キャンピングカー修理に関する情報を検索します。"""
+    try:
+        result = _serpapi().run(query)
+    except Exception:
+        result = None
+    return _search_links(query, result)
+
+async def _asearch(query: str):
+    try:
+        # SerpAPIWrapper.arun は aiohttp で呼び出す（イベントループを止めない）
+        result = await _serpapi().arun(query)
+    except Exception:
+        result = None
+    return _search_links(query, result)
+
+search = StructuredTool.from_function(func=_search, coroutine=_asearch, name="search")
 
 tools = [search]
 tool_node = ToolNode(tools)
 
 # === モデルのセットアップ ===
-model = ChatOpenAI(api_key=OPENAI_API_KEY, model_name="gpt-4o-mini").bind_tools(tools)
+model = get_chat_model(OPENAI_API_KEY, model="gpt-4o-mini").bind_tools(tools)
 
 # === 条件判定 ===
 def should_continue(state: MessagesState) -> Literal["tools", END]:
@@ -152,15 +170,42 @@ def call_model(state: MessagesState):
         error_message = f"申し訳ございませんが、エラーが発生しました: {str(e)}"
         return {"messages": [AIMessage(content=error_message)]}
 
+async def acall_model(state: MessagesState):
+    """call_model の非同期版（app_flow.astream() から呼ばれる）"""
+    try:
+        response = await model.ainvoke(state['messages'])
+        return {"messages": [response]}
+    except Exception as e:
+        error_message = f"申し訳ございませんが、エラーが発生しました: {str(e)}"
+        return {"messages": [AIMessage(content=error_message)]}
+
 # === RAG用ロジック ===
-def rag_retrieve(question: str):
+def retrieve_documents(question: str):
     question_embedding = embeddings_model.embed_query(question)
-    docs = db.similarity_search_by_vector(question_embedding, k=3)
+    return db.similarity_search_by_vector(question_embedding, k=3)
+
+async def aretrieve_documents(question: str):
+    question_embedding = await embeddings_model.aembed_query(question)
+    return await db.asimilarity_search_by_vector(question_embedding, k=3)
+
+def rag_retrieve(question: str, docs=None):
+    if docs is None:
+        docs = retrieve_documents(question)
     return "\n".join([doc.page_content for doc in docs])
 
+def retrieval_results(question: str, docs):
+    """回答の生成前に返せる検索結果（参考ドキュメント・関連する修理事例・関連ブログ）"""
+    analysis = analyze_query(question)
+    knowledge_base = get_knowledge_base()
+    return {
+        "sources": source_summaries(docs),
+        "cases": case_summaries(knowledge_base.relevant_cases(analysis)[:3]),
+        "blogs": blog_summaries(relevant_blog_links(analysis, knowledge_base, limit=5)),
+    }
+
 # === メッセージの前処理 ===
-def preprocess_message(question: str, conversation_id: str):
-    document_snippet = rag_retrieve(question)
+def preprocess_message(question: str, conversation_id: str, docs=None):
+    document_snippet = rag_retrieve(question, docs)
     content = template.format(document_snippet=document_snippet, question=question)
     
     # 会話履歴を取得
@@ -173,7 +218,7 @@ def preprocess_message(question: str, conversation_id: str):
 
 # === ワークフローの構築 ===
 workflow = StateGraph(MessagesState)
-workflow.add_node("agent", call_model)
+workflow.add_node("agent", RunnableLambda(call_model, afunc=acall_model))
 workflow.add_node("tools", tool_node)
 workflow.add_edge(START, "agent")
 workflow.add_conditional_edges("agent", should_continue)
@@ -197,14 +242,36 @@ def start_conversation():
     conversation_history[conversation_id] = []
     return jsonify({"conversation_id": conversation_id})
 
+def remember_turn(conversation_id, question, response):
+    """ユーザーの質問とAIの回答を会話履歴に追加"""
+    conversation_history.setdefault(conversation_id, []).extend([
+        HumanMessage(content=question),
+        AIMessage(content=response)
+    ])
+
+def build_links_text(question):
+    """検索ツールの結果（なければデフォルト）のリンクを箇条書きのテキストにする"""
+    links = [result if isinstance(result, str) else str(result) for result in search_results.get() or []]
+    if not links:
+        # デフォルトのリンクを箇条書き形式で生成
+        links = [
+            f"[検索] Google検索: キャンピングカー {question} 修理方法",
+            f"[動画] YouTube動画: キャンピングカー {question} 修理手順",
+            f"[購入] Amazon商品: キャンピングカー修理部品",
+            f"[情報] 専門サイト: キャンピングカー修理専門情報"
+        ]
+    return "\n".join(links)
+
 @app.route("/ask", methods=["POST"])
 def ask():
     try:
         question = request.form["question"]
         conversation_id = session.get('conversation_id', str(uuid.uuid4()))
-        g.search_results = []
+        search_results.set([])
         
-        inputs = preprocess_message(question, conversation_id)
+        docs = retrieve_documents(question)
+        results = retrieval_results(question, docs)
+        inputs = preprocess_message(question, conversation_id, docs)
         thread = {"configurable": {"thread_id": conversation_id}}
 
         response = ""
@@ -213,49 +280,9 @@ def ask():
                 response = event["messages"][-1].content
 
         # 会話履歴を更新
-        if conversation_id not in conversation_history:
-            conversation_history[conversation_id] = []
-        
-        # ユーザーの質問とAIの回答を履歴に追加
-        conversation_history[conversation_id].extend([
-            HumanMessage(content=question),
-            AIMessage(content=response)
-        ])
+        remember_turn(conversation_id, question, response)
 
-        search_results = getattr(g, "search_results", [])
-        
-        # リンク処理を改善
-        if search_results and len(search_results) > 0:
-            # 検索結果をそのまま使用
-            links = []
-            for result in search_results:
-                if isinstance(result, str):
-                    links.append(result)
-                else:
-                    links.append(str(result))
-            
-            if links:
-                links_text = "\n".join(links)
-            else:
-                # デフォルトのリンクを箇条書き形式で生成
-                default_links = [
-                    f"[検索] Google検索: キャンピングカー {question} 修理方法",
-                    f"[動画] YouTube動画: キャンピングカー {question} 修理手順",
-                    f"[購入] Amazon商品: キャンピングカー修理部品",
-                    f"[情報] 専門サイト: キャンピングカー修理専門情報"
-                ]
-                links_text = "\n".join(default_links)
-        else:
-            # デフォルトのリンクを箇条書き形式で生成
-            default_links = [
-                f"[検索] Google検索: キャンピングカー {question} 修理方法",
-                f"[動画] YouTube動画: キャンピングカー {question} 修理手順",
-                f"[購入] Amazon商品: キャンピングカー修理部品",
-                f"[情報] 専門サイト: キャンピングカー修理専門情報"
-            ]
-            links_text = "\n".join(default_links)
-
-        return jsonify({"answer": response, "links": links_text})
+        return jsonify({"answer": response, "links": build_links_text(question), **results})
     
     except Exception as e:
         import traceback
@@ -263,6 +290,37 @@ def ask():
         print(f"詳細エラー: {traceback.format_exc()}")
         return jsonify({"answer": error_message, "links": "エラーによりリンクを取得できませんでした"})
 
+@app.route("/ask/stream", methods=["POST"])
+def ask_stream():
+    """/ask と同じ内容を、検索結果・生成されたトークンの順に Server-Sent Events で返す"""
+    question = request.form.get("question", "")
+    conversation_id = session.get('conversation_id', str(uuid.uuid4()))
+
+    def generate():
+        try:
+            search_results.set([])
+            # 検索結果は回答の生成を待たずに先に送る（生成が遅い・失敗した場合も表示できる）
+            docs = retrieve_documents(question)
+            for event, data in retrieval_results(question, docs).items():
+                yield sse_event(event, {event: data})
+
+            inputs = preprocess_message(question, conversation_id, docs)
+            thread = {"configurable": {"thread_id": conversation_id}}
+
+            # token（と reset）イベントを送り、最後に回答の全文を受け取る
+            messages = app_flow.stream({"messages": inputs}, thread, stream_mode="messages")
+            response = yield from stream_answer(messages)
+
+            remember_turn(conversation_id, question, response)
+            yield sse_event("links", {"links": build_links_text(question)})
+            yield sse_event("done", {"answer": response})
+        except Exception as e:
+            import traceback
+            print(f"詳細エラー: {traceback.format_exc()}")
+            yield sse_event("error", {"message": f"エラーが発生しました: {str(e)}"})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
 # === Flaskの起動 ===
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
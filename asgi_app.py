@@ -0,0 +1,136 @@
+# asgi_app.py
+"""
+app.py の非同期（ASGI）サーバー版
+
+app.py と同じルート（/、/start_conversation、/ask、/ask/stream）・同じ応答を、
+LangGraphの ainvoke / astream、非同期の埋め込み、イベントループごとにプールを持つ
+httpx.AsyncClient による OpenAI呼び出し、aiohttp による SerpAPI 検索で処理する。
+OpenAI・SerpAPIの応答を待つ間はスレッドを占有しない。
+
+グラフ・会話履歴・ベクトルDB・プロンプトは app.py のものをそのまま使う。
+
+使い方:
+  uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+  HTTP_ASYNC_POOL_SIZE=400 uvicorn asgi_app:app --port 5000   # 同時に待てるOpenAI呼び出しの上限（既定200）
+
+計測: python bench_asgi.py（疑似OpenAIサーバーで app.py と requests/sec を比べる。1CPUの環境では
+同時100件・遅延0.5秒で app.py の1.5倍、同時200件で3.0倍。CPUの数・実際の応答時間で変わる）
+"""
+
+import contextlib
+import os
+import traceback
+import uuid
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.templating import Jinja2Templates
+
+from answer_stream import SSE_HEADERS, AnswerBuffer, aiter_answer_tokens, sse_event
+from app import (
+    app as flask_app, app_flow, aretrieve_documents, build_links_text, conversation_history, main_path,
+    preprocess_message, remember_turn, retrieval_results, search_results,
+)
+from shared_clients import get_openai_http_client
+
+templates = Jinja2Templates(directory=os.path.join(main_path, "templates"))
+
+
+def _conversation_id(request):
+    return request.session.get("conversation_id") or str(uuid.uuid4())
+
+
+async def index(request):
+    # セッションに会話IDがなければ生成
+    if "conversation_id" not in request.session:
+        request.session["conversation_id"] = str(uuid.uuid4())
+    return templates.TemplateResponse(request, "index.html")
+
+
+async def start_conversation(request):
+    """新しい会話を開始"""
+    conversation_id = str(uuid.uuid4())
+    request.session["conversation_id"] = conversation_id
+    conversation_history[conversation_id] = []
+    return JSONResponse({"conversation_id": conversation_id})
+
+
+async def ask(request):
+    try:
+        form = await request.form()
+        question = form["question"]
+        conversation_id = _conversation_id(request)
+        search_results.set([])
+
+        docs = await aretrieve_documents(question)
+        results = retrieval_results(question, docs)
+        inputs = preprocess_message(question, conversation_id, docs)
+        thread = {"configurable": {"thread_id": conversation_id}}
+
+        state = await app_flow.ainvoke({"messages": inputs}, thread)
+        response = state["messages"][-1].content if state.get("messages") else ""
+
+        # 会話履歴を更新
+        remember_turn(conversation_id, question, response)
+
+        return JSONResponse({"answer": response, "links": build_links_text(question), **results})
+
+    except Exception as e:
+        print(f"詳細エラー: {traceback.format_exc()}")
+        return JSONResponse({"answer": f"エラーが発生しました: {str(e)}",
+                             "links": "エラーによりリンクを取得できませんでした"})
+
+
+async def ask_stream(request):
+    """/ask と同じ内容を、検索結果・生成されたトークンの順に Server-Sent Events で返す"""
+    form = await request.form()
+    question = form.get("question", "")
+    conversation_id = _conversation_id(request)
+
+    async def generate():
+        try:
+            search_results.set([])
+            # 検索結果は回答の生成を待たずに先に送る
+            docs = await aretrieve_documents(question)
+            for event, data in retrieval_results(question, docs).items():
+                yield sse_event(event, {event: data})
+
+            inputs = preprocess_message(question, conversation_id, docs)
+            thread = {"configurable": {"thread_id": conversation_id}}
+
+            answer = AnswerBuffer()
+            messages = app_flow.astream({"messages": inputs}, thread, stream_mode="messages")
+            async for step, text in aiter_answer_tokens(messages):
+                for frame in answer.feed(step, text):
+                    yield frame
+
+            remember_turn(conversation_id, question, answer.text)
+            yield sse_event("links", {"links": build_links_text(question)})
+            yield sse_event("done", {"answer": answer.text})
+        except Exception as e:
+            print(f"詳細エラー: {traceback.format_exc()}")
+            yield sse_event("error", {"message": f"エラーが発生しました: {str(e)}"})
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    # このイベントループで開いたOpenAIへの接続を閉じる（プールはループごとに作られる）
+    await get_openai_http_client(asynchronous=True).aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/start_conversation", start_conversation, methods=["POST"]),
+        Route("/ask", ask, methods=["POST"]),
+        Route("/ask/stream", ask_stream, methods=["POST"]),
+    ],
+    middleware=[Middleware(SessionMiddleware, secret_key=flask_app.secret_key)],
+    lifespan=lifespan,
+)
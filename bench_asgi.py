@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+チャットバックエンドの同時処理性能を、従来のFlask（Werkzeug）と非同期のASGI（asgi_app.py）で比べる
+
+疑似OpenAIサーバー（fake_openai_server.py）を起動し、各モードのサーバーを別プロセスで起動して、
+同時に --concurrency 件ずつ /ask（または /ask/stream）を送り、requests/sec と応答時間を計測する。
+OpenAIの応答待ち（--latency）が支配的な状況で、1プロセスが同時にさばける会話数を比べる。
+
+使い方:
+  python bench_asgi.py
+  python bench_asgi.py --requests 1000 --concurrency 200 --latency 1.0
+  python bench_asgi.py --endpoint /ask/stream --modes asgi
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from fake_openai_server import start_fake_server
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUESTIONS = [
+    "サブバッテリーが充電されない",
+    "FFヒーターから異音がする",
+    "水道ポンプから水が出ない",
+    "インバーターの出力がゼロになる",
+    "天井から雨漏りしている",
+]
+
+MODES = {
+    "flask": ("Flask（Werkzeug・スレッド）", lambda port: [
+        sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--no-reload", "--no-debugger",
+    ]),
+    "asgi": ("ASGI（uvicorn・1ワーカー）", lambda port: [
+        # keep-alive（既定5秒）が切れる瞬間に計測側が接続を使い回して失敗しないよう長めにする
+        sys.executable, "-m", "uvicorn", "asgi_app:app", "--port", str(port), "--workers", "1", "--log-level", "warning",
+        "--timeout-keep-alive", "60",
+    ]),
+}
+
+
+def start_server(mode, port, env):
+    """サーバーを起動し、/ が応答するまで待つ（起動時にPDFの埋め込みを作成する）"""
+    process = subprocess.Popen(MODES[mode][1](port), cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} の起動に失敗しました: {process.stderr.read()[-500:]}")
+        try:
+            if httpx.get(url + "/", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"{mode} が起動しませんでした")
+
+
+async def run_load(url, endpoint, requests, concurrency, timeout):
+    """requests 件を同時に concurrency 件ずつ送る（戻り値: 所要時間, 成功した応答時間, 失敗数）"""
+    latencies, failures = [], 0
+    queue = asyncio.Queue()
+    for n in range(requests):
+        queue.put_nowait(QUESTIONS[n % len(QUESTIONS)])
+
+    async def worker():
+        nonlocal failures
+        # 計測側の接続は同時に送る1件ごとに持つ（大きな1つのプールは管理処理でCPUを使い、計測を歪める）
+        async with httpx.AsyncClient(verify=ssl_context, timeout=timeout) as client:
+            while not queue.empty():
+                question = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    # クッキーを送らないため、リクエストごとに新しい会話になる
+                    response = await client.post(url + endpoint, data={"question": question})
+                    ok = response.status_code == 200 and "エラーが発生しました" not in response.text
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    failures += 1
+
+    ssl_context = httpx.create_ssl_context()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, failures
+
+
+def _percentile(values, ratio):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask / ASGI モードの同時処理性能の計測")
+    parser.add_argument("--requests", type=int, default=400, help="送るリクエストの総数")
+    parser.add_argument("--concurrency", type=int, default=100, help="同時に処理中にするリクエスト数")
+    parser.add_argument("--latency", type=float, default=0.5, help="疑似OpenAIのチャット補完の遅延（秒）")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="疑似OpenAIの埋め込みの遅延（秒）")
+    parser.add_argument("--endpoint", default="/ask", choices=["/ask", "/ask/stream"])
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--timeout", type=float, default=120, help="1リクエストのタイムアウト（秒）")
+    args = parser.parse_args()
+
+    fake = start_fake_server(latency=args.latency, embedding_latency=args.embedding_latency)
+    env = os.environ.copy()
+    env.update({
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": fake.url,
+        "EMBEDDING_CHECK_CTX_LENGTH": "0",
+        # Flask のスレッドが OpenAI への接続待ちにならないようにする
+        # （ASGI は HTTP_ASYNC_POOL_SIZE の既定値のまま計測する）
+        "HTTP_POOL_SIZE": str(max(args.concurrency, 10)),
+    })
+    env.pop("LANGSMITH_API_KEY", None)
+    env.pop("SERP_API_KEY", None)
+
+    print(f"🚀 疑似OpenAIサーバー: {fake.url}（補完の遅延 {args.latency}秒, 埋め込みの遅延 {args.embedding_latency}秒）")
+    print(f"   {args.endpoint} に {args.requests}件（同時 {args.concurrency}件）\n")
+
+    results = []
+    for port, mode in enumerate(args.modes, start=5101):
+        name = MODES[mode][0]
+        try:
+            process, url = start_server(mode, port, env)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            continue
+        try:
+            # 接続・初回のモデル呼び出しを済ませてから計測する
+            asyncio.run(run_load(url, args.endpoint, len(QUESTIONS), len(QUESTIONS), args.timeout))
+            fake.reset_stats()
+            elapsed, latencies, failures = asyncio.run(
+                run_load(url, args.endpoint, args.requests, args.concurrency, args.timeout))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        results.append((name, len(latencies) / elapsed, latencies, failures))
+        print(f"✅ {name}: {elapsed:.1f}秒（補完 {fake.stats().get('chat.completions', 0)}回）")
+
+    fake.shutdown()
+
+    print(f"\n{'モード':<28}{'req/s':>8}{'p50(秒)':>10}{'p95(秒)':>10}{'失敗':>6}")
+    print("-" * 64)
+    for name, throughput, latencies, failures in results:
+        p50 = statistics.median(latencies) if latencies else float("nan")
+        print(f"{name:<28}{throughput:>8.1f}{p50:>10.2f}{_percentile(latencies, 0.95):>10.2f}{failures:>6}")
+    if len(results) == 2 and results[0][1]:
+        print(f"\n{results[1][0]} / {results[0][0]}: {results[1][1] / results[0][1]:.1f}倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+関連ブログ検索（blog_catalog.py）の1質問あたりの所要時間を計測する
+
+blog_links.json を指定件数まで複製したカタログで、全ブログを採点する方法
+（従来の get_relevant_blog_links と同じ）と転置索引で候補だけを採点する方法を比べる。
+
+使い方:
+  python bench_blog_links.py
+  python bench_blog_links.py --size 10000 --repeat 20
+"""
+
+import argparse
+import json
+import random
+import time
+
+from blog_catalog import BLOG_LINKS_FILE, BlogCatalog
+from keyword_matcher import MAIN_KEYWORDS, TROUBLE_KEYWORDS, match_vocabulary
+
+QUERIES = [
+    "サブバッテリーが充電されない",
+    "FFヒーターから異音がする",
+    "水道ポンプから水が出ない",
+    "インバーターの出力がゼロになる",
+    "天井から雨漏りしている",
+    "冷蔵庫が冷えない",
+    "キャンピングカーのおすすめの旅先",
+]
+
+
+def scaled_blogs(blogs, size, seed=0):
+    """カタログを size 件まで複製する（URLは一意、キーワードは語彙から少し足す）"""
+    rng = random.Random(seed)
+    vocabulary = sorted(set(MAIN_KEYWORDS + TROUBLE_KEYWORDS) | {kw for blog in blogs for kw in blog["keywords"]})
+    scaled = []
+    for n in range(size):
+        base = blogs[n % len(blogs)]
+        scaled.append({
+            "title": f"{base['title']} その{n}",
+            "url": f"{base['url']}?p={n}",
+            "keywords": base["keywords"] + rng.sample(vocabulary, 2),
+        })
+    return scaled
+
+
+def _query_args(query):
+    # get_relevant_blog_links と同じく質問の語彙を先に抽出しておく
+    hits = match_vocabulary(query)
+    return dict(query=query, query_keywords=hits.get("main", []) + hits.get("trouble", []), query_hits=hits)
+
+
+def measure(catalog, use_index, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            catalog.top(use_index=use_index, **_query_args(query))
+    return (time.perf_counter() - start) / (repeat * len(QUERIES)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="関連ブログ検索の計測")
+    parser.add_argument("--size", type=int, default=10000, help="カタログの件数")
+    parser.add_argument("--repeat", type=int, default=10, help="質問一覧を繰り返す回数")
+    args = parser.parse_args()
+
+    with open(BLOG_LINKS_FILE, "r", encoding="utf-8") as f:
+        blogs = scaled_blogs(json.load(f), args.size)
+
+    start = time.perf_counter()
+    catalog = BlogCatalog(blogs)
+    build_seconds = time.perf_counter() - start
+    print(f"🚀 カタログ {len(catalog)}件（索引の作成 {build_seconds:.2f}秒）")
+
+    for query in QUERIES:
+        args_ = _query_args(query)
+        assert catalog.top(use_index=True, **args_) == catalog.top(use_index=False, **args_), query
+
+    linear = measure(catalog, use_index=False, repeat=args.repeat)
+    indexed = measure(catalog, use_index=True, repeat=args.repeat)
+    print(f"全件採点:   {linear:8.2f} ms/質問")
+    print(f"転置索引:   {indexed:8.2f} ms/質問（{linear / indexed:.1f}倍）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+疑似Notionサーバー（fake_notion_server.py）上で各ローダー・スクリプトを実行し、
+API呼び出し回数・429（リトライが必要になった回数）・所要時間を計測する
+
+使い方:
+  python bench_notion_loaders.py
+  python bench_notion_loaders.py --latency 0.05 --rate-limit-every 20 --scale 10
+  python bench_notion_loaders.py --no-scripts   # ローダーのみ（移行スクリプトを除く）
+"""
+
+import argparse
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unicodedata
+
+from fake_notion_server import start_fake_server, NODE_DB_ID, CASE_DB_ID, ITEM_DB_ID
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _loader_benchmarks():
+    """アプリ内のローダーと同じ呼び出し方でNotionを読み込む処理"""
+    from shared_clients import get_notion_client
+    from notion_loader import iter_database_pages
+    from notion_schema import parse_pages, parse_diagnostic_node, parse_repair_case
+
+    client = get_notion_client(os.environ["NOTION_API_KEY"])
+
+    def load_nodes():
+        return len(list(parse_pages(iter_database_pages(client, NODE_DB_ID), parse_diagnostic_node)))
+
+    def load_cases():
+        return len(list(parse_pages(iter_database_pages(client, CASE_DB_ID), parse_repair_case)))
+
+    def find_terminal_cases():
+        # streamlit_app.py の find_repair_cases_for_node と同じ絞り込み
+        notion_filter = {"and": [
+            {"property": "ケースID", "title": {"is_not_empty": True}},
+            {"property": "ケースID", "title": {"equals": "CASE-2001"}},
+        ]}
+        pages = iter_database_pages(client, CASE_DB_ID, filter=notion_filter, page_size=3, prefetch=False)
+        return len(list(parse_pages(itertools.islice(pages, 3), parse_repair_case)))
+
+    return [
+        ("診断ノード全件読み込み", load_nodes),
+        ("修理ケース全件読み込み", load_cases),
+        ("終端ノードのケース絞り込み", find_terminal_cases),
+    ]
+
+
+SCRIPTS = [
+    # リンクは同じスナップショットで 全件取得 → 差分更新 → オフライン の順に計測する
+    ("notion_linker_jp.py (DRY_RUN・初回)", ["notion_linker_jp.py", "--full-refresh"]),
+    ("notion_linker_jp.py (DRY_RUN・差分)", ["notion_linker_jp.py"]),
+    ("notion_linker_jp.py (--from-snapshot)", ["notion_linker_jp.py", "--from-snapshot"]),
+    ("check_notion_structure.py", ["check_notion_structure.py"]),
+    ("full_data_migration.py", ["full_data_migration.py"]),
+    ("full_category_migration.py", ["full_category_migration.py"]),
+]
+
+
+def _run_script(command):
+    script, *script_args = command
+    completed = subprocess.run(
+        [sys.executable, os.path.join(BASE_DIR, script), *script_args],
+        cwd=BASE_DIR, env=os.environ.copy(), capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit {completed.returncode}")
+    return None
+
+
+def _pad(text, width):
+    # 全角文字は2桁として数えて左寄せする
+    text_width = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    return text + " " * max(width - text_width, 0)
+
+
+def measure(server, name, func):
+    server.reset_stats()
+    start = time.perf_counter()
+    try:
+        count = func()
+        status = "OK" if count is None else f"OK ({count}件)"
+    except Exception as e:
+        status = f"失敗: {str(e)[:60]}"
+    elapsed = time.perf_counter() - start
+    stats = server.stats()
+    return {"name": name, "calls": stats["calls"], "retries": stats["rate_limited"], "seconds": elapsed, "status": status}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notionローダーのオフライン計測")
+    parser.add_argument("--latency", type=float, default=0.0, help="1リクエストあたりの遅延（秒）")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="N回に1回429を返す（0で無効）")
+    parser.add_argument("--scale", type=int, default=1, help="フィクスチャを何倍に増やすか")
+    parser.add_argument("--no-scripts", action="store_true", help="移行・リンクスクリプトを実行しない")
+    args = parser.parse_args()
+
+    server = start_fake_server(latency=args.latency, rate_limit_every=args.rate_limit_every, scale=args.scale)
+    os.environ.update({
+        "NOTION_API_KEY": "secret_fake",
+        "NOTION_BASE_URL": server.url,
+        "NODE_DB_ID": NODE_DB_ID,
+        "CASE_DB_ID": CASE_DB_ID,
+        "ITEM_DB_ID": ITEM_DB_ID,
+        "DRY_RUN": "1",
+        # 移行スクリプトのチェックポイントとリンクのスナップショットは計測ごとに使い捨てる
+        "MIGRATION_JOURNAL_DIR": tempfile.mkdtemp(prefix="notion_bench_"),
+        "NOTION_SNAPSHOT_DIR": tempfile.mkdtemp(prefix="notion_bench_snapshot_"),
+    })
+
+    print(f"🚀 疑似Notionサーバー: {server.url} (遅延 {args.latency}秒, 429: {args.rate_limit_every or 'なし'}, 倍率 {args.scale})")
+    results = [measure(server, name, func) for name, func in _loader_benchmarks()]
+    if not args.no_scripts:
+        results += [measure(server, name, lambda command=command: _run_script(command)) for name, command in SCRIPTS]
+    server.shutdown()
+
+    print(f"\n{_pad('対象', 40)}{'呼び出し':>6}{'429':>6}{'秒':>8}  結果")
+    print("-" * 80)
+    for r in results:
+        print(f"{_pad(r['name'], 40)}{r['calls']:>10}{r['retries']:>6}{r['seconds']:>9.2f}  {r['status']}")
+
+
+if __name__ == "__main__":
+    main()
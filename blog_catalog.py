@@ -0,0 +1,238 @@
+# blog_catalog.py
+"""
+関連ブログのカタログ（blog_links.json）と転置索引
+
+カタログは一度だけ読み込み、キーワード -> ブログ の転置索引とブログごとの
+カテゴリーを前計算しておく。質問ごとのスコア計算は、質問とキーワード・
+タイトル・URL・カテゴリーのいずれかを共有するブログだけを対象にする。
+"""
+
+import heapq
+import json
+import os
+from functools import lru_cache
+
+from keyword_matcher import (
+    CATEGORY_RULES, DEFAULT_CATEGORY, KeywordMatcher, blog_category_labels, category_for_query, match_vocabulary,
+)
+from knowledge_index import as_knowledge_base
+from query_analysis import analyze_query
+from text_normalizer import normalize_text
+
+BLOG_LINKS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blog_links.json")
+
+
+class BlogCatalog:
+    """ブログリンク（title, url, keywords）の一覧と索引"""
+
+    def __init__(self, blogs):
+        self.blogs = tuple(blogs)
+        # タイトル・URL・キーワードは正規化した形で持つ（質問側のキーワードも正規化済み）
+        self._titles = tuple(normalize_text(blog["title"]) for blog in self.blogs)
+        self._urls = tuple(normalize_text(blog["url"]) for blog in self.blogs)
+        self._keywords = tuple(frozenset(normalize_text(kw) for kw in blog["keywords"]) for blog in self.blogs)
+        self._labels = tuple(blog_category_labels(blog) for blog in self.blogs)
+
+        by_keyword, by_url, by_label = {}, {}, {}
+        for i, blog in enumerate(self.blogs):
+            for keyword in self._keywords[i]:
+                by_keyword.setdefault(keyword, set()).add(i)
+            by_url.setdefault(blog["url"], set()).add(i)
+            for label in self._labels[i]:
+                by_label.setdefault(label, set()).add(i)
+        self._by_keyword = {k: frozenset(v) for k, v in by_keyword.items()}
+        self._by_url = {k: frozenset(v) for k, v in by_url.items()}
+        self._by_label = {k: frozenset(v) for k, v in by_label.items()}
+        # 質問に含まれるブログ側キーワードを1回の走査で求める
+        self._keyword_matcher = KeywordMatcher((kw, i) for i, keywords in enumerate(self._keywords) for kw in keywords)
+        # 語彙（質問・知識ベースのカテゴリー名）ごとの タイトル・URL を含むブログ（初回に一度だけ走査）
+        self._title_hits = {}
+        self._url_hits = {}
+
+    def __len__(self):
+        return len(self.blogs)
+
+    @staticmethod
+    def _containing(cache, texts, term):
+        hits = cache.get(term)
+        if hits is None:
+            hits = cache[term] = frozenset(i for i, text in enumerate(texts) if term in text)
+        return hits
+
+    def _score(self, i, query_keywords, extracted_keywords, in_query, category_match, extracted_urls,
+               common_keywords=frozenset(), common_in_query=()):
+        title, url, keywords = self._titles[i], self._urls[i], self._keywords[i]
+        if common_keywords:
+            keywords = keywords | common_keywords
+        score = 0
+        # 質問のキーワードとの直接マッチング（最高優先度）
+        for keyword in query_keywords:
+            if keyword in title:
+                score += 20
+            if keyword in url:
+                score += 15
+            if keyword in keywords:
+                score += 10
+        # ブログのキーワードが質問に含まれる数
+        found = in_query.get(i, ())
+        score += len(set(found).union(common_in_query)) if common_in_query else len(found)
+        # テキストデータから抽出したキーワードとのマッチング
+        for keyword in extracted_keywords:
+            if keyword in keywords:
+                score += 2
+            if keyword in title:
+                score += 3
+        if category_match:
+            score += 10
+        # テキストデータから抽出したURLを最優先
+        if self.blogs[i]["url"] in extracted_urls:
+            score += 50
+        return score
+
+    def _rank(self, query, query_keywords, extracted_keywords, extracted_urls, query_hits, use_index,
+              common_keywords=()):
+        hits = match_vocabulary(query) if query_hits is None else query_hits
+        query_category = category_for_query(hits)
+        in_query = self._keyword_matcher.find_values(query)
+        # 全ブログ共通のキーワード（質問ごとに変わる）は索引に入っていないため、全ブログを採点する
+        common_keywords = frozenset(normalize_text(kw) for kw in common_keywords)
+        folded_query = normalize_text(query or "")
+        common_in_query = {kw.strip() for kw in common_keywords if kw.strip() and kw.strip() in folded_query}
+        # 共通のキーワードで全ブログが当てはまるカテゴリー（blog_category_labels と同じ判定）
+        common_labels = {label for label, _, keywords in CATEGORY_RULES
+                         if common_keywords.intersection(map(normalize_text, keywords))} if common_keywords else ()
+
+        if use_index and not common_keywords:
+            candidates = set(in_query)
+            for keyword in query_keywords:
+                candidates |= self._containing(self._title_hits, self._titles, keyword)
+                candidates |= self._containing(self._url_hits, self._urls, keyword)
+                candidates |= self._by_keyword.get(keyword, frozenset())
+            for keyword in extracted_keywords:
+                candidates |= self._containing(self._title_hits, self._titles, keyword)
+                candidates |= self._by_keyword.get(keyword, frozenset())
+            for url in extracted_urls:
+                candidates |= self._by_url.get(url, frozenset())
+            if query_category != DEFAULT_CATEGORY:
+                candidates |= self._by_label.get(query_category, frozenset())
+        else:
+            candidates = range(len(self.blogs))
+
+        scored = []
+        for i in candidates:
+            # 質問のカテゴリー（最初に当てはまるカテゴリー）にブログが当てはまれば一致
+            category_match = (query_category in self._labels[i] or query_category in common_labels
+                              or query_category == DEFAULT_CATEGORY)
+            score = self._score(i, query_keywords, extracted_keywords, in_query, category_match, extracted_urls,
+                                common_keywords, common_in_query)
+            if score > 0:
+                scored.append((-score, i))
+        scored.sort()
+
+        ordered = scored
+        if use_index and not common_keywords and query_category == DEFAULT_CATEGORY:
+            # どのカテゴリーにも当てはまらない質問では全ブログがカテゴリー一致（10点）になる。
+            # 候補外のブログは10点で番号順に並ぶため、必要な分だけ合流させる
+            rest = ((-10, i) for i in range(len(self.blogs)) if i not in candidates)
+            ordered = heapq.merge(scored, rest)
+        return scored, ((self.blogs[i], -negative) for negative, i in ordered)
+
+    def rank(self, query, query_keywords=(), extracted_keywords=(), extracted_urls=(), query_hits=None, use_index=True,
+             common_keywords=()):
+        """スコアの高い順に (ブログ, スコア) を返す（同点はカタログの順）
+
+        use_index=False のときは索引を使わず全ブログを採点する（計測・検証用）。
+        common_keywords は全ブログのキーワードに加えて採点する（知識ベースのURLのカタログ用）。
+        """
+        return self._rank(query, query_keywords, extracted_keywords, set(extracted_urls), query_hits, use_index,
+                          common_keywords)[1]
+
+    def top(self, query, query_keywords=(), extracted_keywords=(), extracted_urls=(), query_hits=None,
+            limit=5, use_index=True, common_keywords=()):
+        """関連ブログを最大limit件（URLの重複なし・テキストデータから抽出したURLを最優先）"""
+        extracted_urls = set(extracted_urls)
+        scored, ranked = self._rank(query, query_keywords, extracted_keywords, extracted_urls, query_hits, use_index,
+                                    common_keywords)
+        result, added_urls = [], set()
+        # 抽出したURLのブログは必ず候補に含まれる
+        for _, i in scored:
+            url = self.blogs[i]["url"]
+            if url in extracted_urls and url not in added_urls:
+                result.append(self.blogs[i])
+                added_urls.add(url)
+        for blog, _ in ranked:
+            if len(result) >= limit:
+                break
+            if blog["url"] not in added_urls:
+                result.append(blog)
+                added_urls.add(blog["url"])
+        return result[:limit]
+
+
+@lru_cache(maxsize=4)
+def load_blog_catalog(path=BLOG_LINKS_FILE):
+    """blog_links.json を読み込んで索引を作成（パスごとに一度だけ）
+
+    既定のパスでは、ソースと一致するバンドル（knowledge_bundle.py）があれば索引ごと読み込む。
+    """
+    if path == BLOG_LINKS_FILE:
+        from knowledge_bundle import bundled
+        catalog = bundled("blog_catalog", [os.path.basename(BLOG_LINKS_FILE)], os.path.dirname(BLOG_LINKS_FILE))
+        if catalog is not None:
+            return catalog
+    with open(path, "r", encoding="utf-8") as f:
+        return BlogCatalog(json.load(f))
+
+
+_knowledge_base_catalogs = {}
+
+
+def knowledge_base_catalog(knowledge_base):
+    """知識ベースの本文中の全URLのカタログ（KnowledgeBase の版ごとに一度だけ作成）
+
+    キーワードは質問ごとに変わるため持たず、top() の common_keywords で渡す。
+    """
+    catalog = _knowledge_base_catalogs.get(knowledge_base.version)
+    if catalog is None:
+        catalog = BlogCatalog(knowledge_base.blog_links(()))
+        # 古い版のカタログは残さない（最新の数版だけ）
+        while len(_knowledge_base_catalogs) >= 4:
+            _knowledge_base_catalogs.pop(next(iter(_knowledge_base_catalogs)), None)
+        _knowledge_base_catalogs[knowledge_base.version] = catalog
+    return catalog
+
+
+def relevant_blog_links(query, knowledge_base=None, limit=5):
+    """質問と知識ベースに基づく関連ブログ（query: 質問文または QueryAnalysis）
+
+    知識ベースの本文にURLがあればそのブログから、なければカタログ（blog_links.json）から選ぶ。
+    """
+    # 主要キーワード・トラブル関連キーワード・カテゴリーは質問の解析時に抽出済み
+    analysis = analyze_query(query)
+    
+    # テキストデータ（読み込み時に作成した索引）からキーワードとURLを参照
+    knowledge_base = as_knowledge_base(knowledge_base)
+    extracted_keywords = knowledge_base.extracted_keywords(analysis.normalized, analysis.terms)
+    
+    # 質問と一致したケース・テーマに書かれているURLだけを最優先にする
+    extracted_urls = knowledge_base.matching_urls(analysis.text)
+    
+    # 質問から抽出したキーワードとテキストデータから抽出したキーワードを結合
+    all_keywords = list(set(analysis.keywords + tuple(extracted_keywords)))
+    
+    # 重複を除去
+    extracted_keywords = list(set(extracted_keywords))
+    
+    # テキストデータ中の全URLのカタログ（キーワードは質問とテキストデータから設定）。
+    # URLが見つからない場合のみカタログ（blog_links.json）を使用
+    if knowledge_base.urls:
+        catalog, common_keywords = knowledge_base_catalog(knowledge_base), all_keywords
+    else:
+        catalog, common_keywords = load_blog_catalog(), ()
+    
+    # 質問とキーワード・タイトル・URL・カテゴリーを共有するブログだけを採点し、
+    # テキストデータから抽出したURLを最優先で最大limit件（一つ一つ個別のブログ）を返す
+    blogs = catalog.top(analysis.text, analysis.keywords, extracted_keywords, extracted_urls,
+                        query_hits=analysis.hits, limit=limit, common_keywords=common_keywords)
+    # 知識ベースのURLのブログには、採点に使ったキーワードを付けて返す
+    return [{**blog, "keywords": list(common_keywords)} for blog in blogs] if common_keywords else blogs
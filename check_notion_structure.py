@@ -1,5 +1,5 @@
 # check_notion_structure.py
-from notion_client import Client
+from shared_clients import get_notion_client
 import os
 
 # 環境変数から設定を取得
@@ -8,7 +8,7 @@ NODE_DB = os.getenv("NODE_DB_ID")
 CASE_DB = os.getenv("CASE_DB_ID")
 ITEM_DB = os.getenv("ITEM_DB_ID")
 
-client = Client(auth=API_KEY)
+client = get_notion_client(API_KEY)
 
 def check_database_structure():
     """データベースの構造を確認"""
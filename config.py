@@ -21,8 +21,8 @@ LANGSMITH_API_KEY = os.getenv("LANGSMITH_API_KEY")
 LANGSMITH_PROJECT = os.getenv("LANGSMITH_PROJECT", "default")
 LANGSMITH_ENDPOINT = os.getenv("LANGSMITH_ENDPOINT", "https://api.smith.langchain.com")
 
-# LangChain Tracing設定
-os.environ["LANGCHAIN_TRACING_V2"] = "true"
+# LangChain Tracing設定（LangSmithのAPIキーがない場合は送信できないため無効）
+os.environ["LANGCHAIN_TRACING_V2"] = "true" if LANGSMITH_API_KEY else "false"
 os.environ["LANGCHAIN_PROJECT"] = LANGSMITH_PROJECT
 
 # LangSmith設定（APIキーが設定されている場合のみ）
@@ -0,0 +1,252 @@
+# diagnostic_engine.py
+"""
+診断フローのコンパイル済みグラフ
+
+各UIが st.session_state の生の辞書を毎回たどる代わりに、診断ノードを一度だけ
+変更不可のグラフにコンパイルして共有する。ノードIDは連番の整数に置き換え、
+遷移先は整数のタプル（隣接配列）で持つため、遷移・参照はどれも定数時間。
+
+入力は次の形式に対応する（どれも compile_graph() が受け取る共通形式に変換する）:
+- mock_diagnostic_nodes.json: ノードID -> {question, next_nodes, ...} の辞書（の一覧）
+- diagnostic_nodes_fixed.json: {"diagnostic_nodes": [{id, question, options: [{text, next_node}]}]}
+- diag_nodes_linked_5nodes.csv: 次の質問ID / 終端フラグ / terminal_case_id の列を持つCSV
+- Notionの診断フローDB（ページ一覧・ローカルスナップショット）
+"""
+
+import csv
+import json
+import os
+import re
+from types import MappingProxyType
+
+from notion_schema import parse_pages, parse_diagnostic_node
+
+
+class DiagnosticGraphError(ValueError):
+    """診断フローの不整合（存在しない遷移先・循環）"""
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("診断フローに不整合があります: " + " / ".join(self.problems[:5])
+                         + (f" ほか{len(self.problems) - 5}件" if len(self.problems) > 5 else ""))
+
+
+class DiagnosticGraph:
+    """変更不可の診断グラフ（ノードは 0..len-1 の整数で参照する）"""
+
+    def __init__(self, keys, questions, categories, results, terminal_case_ids,
+                 edges, labels, is_end, starts, problems):
+        self.keys = keys                    # 整数 -> 元のノードID
+        self.questions = questions
+        self.categories = categories
+        self.results = results
+        self.terminal_case_ids = terminal_case_ids
+        self.edges = edges                  # 整数 -> 遷移先の整数のタプル（存在しない遷移先はNone）
+        self.labels = labels                # 整数 -> 選択肢の文言のタプル（元データにない場合は空）
+        self.is_end = is_end
+        self.starts = starts
+        self._start_set = frozenset(starts)
+        self.terminals = tuple(i for i, end in enumerate(is_end) if end)
+        self.problems = problems            # strict=False で無視した不整合
+        self._index = MappingProxyType({key: i for i, key in enumerate(keys)})
+        starts_by_category = {}
+        for i in starts:
+            starts_by_category.setdefault(categories[i], []).append(i)
+        self.starts_by_category = MappingProxyType({c: tuple(v) for c, v in starts_by_category.items()})
+
+    def __reduce__(self):
+        # MappingProxyType はpickleできないため、コンストラクタの引数から作り直す
+        return (DiagnosticGraph, (self.keys, self.questions, self.categories, self.results, self.terminal_case_ids,
+                                  self.edges, self.labels, self.is_end, self.starts, self.problems))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def lookup(self, key):
+        """元のノードID -> 整数（存在しない場合はNone）"""
+        return self._index.get(key)
+
+    def key(self, node):
+        return self.keys[node]
+
+    def start(self, category):
+        """カテゴリの開始ノード（複数ある場合は先頭）"""
+        nodes = self.starts_by_category.get(category)
+        return nodes[0] if nodes else None
+
+    def categories_with_start(self):
+        return list(self.starts_by_category)
+
+    def step(self, node, choice=0):
+        """choice番目の選択肢の遷移先（0=はい/次へ, 1=いいえ ...）
+
+        選択肢の位置は元データのまま。遷移先が存在しない選択肢（行き止まり）はNoneを返す。
+        """
+        return self.edges[node][choice]
+
+    def node(self, node):
+        """UI表示用の辞書（Notionローダーの diagnostic_nodes と同じキー）"""
+        return {
+            "node_id": self.keys[node],
+            "question": self.questions[node],
+            "category": self.categories[node],
+            "is_start": node in self._start_set,
+            "is_end": self.is_end[node],
+            "next_nodes": [self.keys[n] if n is not None else None for n in self.edges[node]],
+            "result": self.results[node],
+            "terminal_case_id": self.terminal_case_ids[node],
+        }
+
+
+def _find_cycles(edges):
+    """反復DFSで循環を検出し、循環に含まれる辺（元, 先）の一覧を返す"""
+    WHITE, GRAY, BLACK = 0, 1, 2
+    color = [WHITE] * len(edges)
+    back_edges = []
+    for root in range(len(edges)):
+        if color[root] != WHITE:
+            continue
+        color[root] = GRAY
+        stack = [(root, iter(edges[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child is None:
+                    continue
+                if color[child] == GRAY:
+                    back_edges.append((node, child))
+                elif color[child] == WHITE:
+                    color[child] = GRAY
+                    stack.append((child, iter(edges[child])))
+                    break
+            else:
+                color[node] = BLACK
+                stack.pop()
+    return back_edges
+
+
+def compile_graph(nodes, strict=True):
+    """ノードID -> ノード辞書 をコンパイルする
+
+    ノード辞書のキー: question, category, is_start, is_end, next_nodes, result,
+    terminal_case_id, labels（選択肢の文言・任意）
+    strict=True のときは存在しない遷移先・循環があればDiagnosticGraphError、
+    strict=False のときは graph.problems に記録する。UIは選択肢を位置（はい=0, いいえ=1）で
+    選ぶため、遷移は除外しない（存在しない遷移先はNone、循環する遷移はそのまま残す）。
+    """
+    keys = tuple(nodes)
+    index = {key: i for i, key in enumerate(keys)}
+    problems = []
+
+    edges, labels = [], []
+    for key in keys:
+        node = nodes[key]
+        next_keys = node.get("next_nodes") or []
+        node_labels = tuple(node.get("labels") or ())
+        for next_key in next_keys:
+            if next_key not in index:
+                problems.append(f"{key} -> {next_key}（遷移先なし）")
+        edges.append([index.get(next_key) for next_key in next_keys])
+        labels.append(node_labels if len(node_labels) == len(next_keys) else ())
+
+    # 「いいえ -> 最初からやり直す」のような循環も元データのまま残し、記録だけする
+    for source, target in _find_cycles(edges):
+        problems.append(f"{keys[source]} -> {keys[target]}（循環）")
+
+    if strict and problems:
+        raise DiagnosticGraphError(problems)
+
+    starts = tuple(i for i, key in enumerate(keys) if nodes[key].get("is_start"))
+    return DiagnosticGraph(
+        keys=keys,
+        questions=tuple(nodes[key].get("question", "") or "" for key in keys),
+        categories=tuple(nodes[key].get("category", "") or "" for key in keys),
+        results=tuple(nodes[key].get("result", "") or "" for key in keys),
+        terminal_case_ids=tuple((nodes[key].get("terminal_case_id", "") or "").strip() for key in keys),
+        edges=tuple(tuple(e) for e in edges),
+        labels=tuple(labels),
+        is_end=tuple(bool(nodes[key].get("is_end")) or not edges[i] for i, key in enumerate(keys)),
+        starts=starts,
+        problems=tuple(problems),
+    )
+
+
+# === 入力形式ごとの変換 ===
+def nodes_from_mock_json(data):
+    """mock_diagnostic_nodes.json（ノード辞書、またはその一覧）"""
+    groups = data if isinstance(data, list) else [data]
+    nodes = {}
+    for group in groups:
+        nodes.update(group)
+    return nodes
+
+
+def nodes_from_options_json(data):
+    """diagnostic_nodes_fixed.json（options に選択肢と遷移先を持つ一覧）"""
+    items = data.get("diagnostic_nodes", []) if isinstance(data, dict) else data
+    referenced = {option.get("next_node") for item in items for option in item.get("options", [])}
+    nodes = {}
+    for item in items:
+        options = item.get("options", [])
+        nodes[item["id"]] = {
+            "question": item.get("question", ""),
+            "category": item.get("category", ""),
+            "is_start": item["id"] not in referenced,
+            "is_end": not options,
+            "next_nodes": [option.get("next_node") for option in options],
+            "labels": [option.get("text", "") for option in options],
+            "result": item.get("result", ""),
+        }
+    return nodes
+
+
+def nodes_from_csv_rows(rows):
+    """diag_nodes_linked_5nodes.csv の行（次の質問IDは質問IDを指す）"""
+    rows = list(rows)
+    by_question_id = {row.get("質問ID", "").strip(): row.get("node_id", "").strip() for row in rows}
+    nodes = {}
+    for row in rows:
+        next_ids = [n for n in re.split(r"[,、|]", row.get("次の質問ID", "") or "") if n.strip()]
+        nodes[row["node_id"].strip()] = {
+            "question": row.get("質問内容", ""),
+            "category": row.get("カテゴリ", ""),
+            "is_end": (row.get("終端フラグ", "") or "").strip() in {"1", "true", "True", "TRUE"},
+            # 質問IDで見つからない場合はそのまま（存在しない遷移先として検出される）
+            "next_nodes": [by_question_id.get(n.strip(), n.strip()) for n in next_ids],
+            "labels": [a for a in (row.get("回答パターン", "") or "").split("<br>") if a],
+            "result": row.get("診断結果", ""),
+            "terminal_case_id": row.get("terminal_case_id", ""),
+        }
+    referenced = {n for node in nodes.values() for n in node["next_nodes"]}
+    for key, node in nodes.items():
+        node["is_start"] = key not in referenced
+    return nodes
+
+
+def nodes_from_pages(pages):
+    """Notionの診断フローDBのページ一覧（APIの結果・ローカルスナップショット）"""
+    nodes = {}
+    for node_data in parse_pages(pages, parse_diagnostic_node):
+        nodes[node_data.pop("node_id")] = node_data
+    return nodes
+
+
+def load_graph(path, strict=True):
+    """ファイル（JSON/CSV）から診断グラフを作成"""
+    if os.path.splitext(path)[1].lower() == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return compile_graph(nodes_from_csv_rows(csv.DictReader(f)), strict=strict)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "diagnostic_nodes" in data:
+        return compile_graph(nodes_from_options_json(data), strict=strict)
+    return compile_graph(nodes_from_mock_json(data), strict=strict)
+
+
+def load_graph_from_snapshot(database_id, strict=True):
+    """notion_snapshot.py で保存した診断フローDBのスナップショットから作成（API呼び出しなし）"""
+    from notion_snapshot import read_snapshot_pages
+    return compile_graph(nodes_from_pages(read_snapshot_pages(database_id)), strict=strict)
@@ -2,12 +2,24 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
 import os
-import re
 import subprocess
 import sys
-from langchain_openai import ChatOpenAI
+from shared_clients import get_chat_model
+from answer_stream import iter_text_chunks
 from langchain.schema import HumanMessage, AIMessage
 import json
+import itertools
+from notion_loader import iter_database_pages
+from keyword_matcher import SymptomIndex
+from query_analysis import analyze_query
+from blog_catalog import relevant_blog_links
+from knowledge_cases import URL_PATTERN
+from knowledge_index import as_knowledge_base, get_knowledge_base
+from notion_schema import (
+    parse_pages, parse_kb_node, parse_kb_case, parse_kb_case_summary,
+    parse_kb_node_summary, parse_kb_item
+)
+from shared_clients import get_notion_client, check_notion_health, invalidate_notion_health
 
 # 必要なライブラリの自動インストール
 def install_required_packages():
@@ -63,9 +75,12 @@ os.environ["OPENAI_API_KEY"] = openai_api_key
 # Notion APIキーの設定
 notion_api_key = st.secrets.get("NOTION_API_KEY") or st.secrets.get("NOTION_TOKEN") or os.getenv("NOTION_API_KEY") or os.getenv("NOTION_TOKEN")
 
+# Notionから読み込んだ診断データ・症状の索引を使い回す秒数
+NOTION_DATA_TTL = float(os.getenv("NOTION_DATA_TTL", "300"))
+
 # NotionDB接続の初期化
-def initialize_notion_client():
-    """Notionクライアントを初期化（改善版）"""
+def initialize_notion_client(force_check=False):
+    """Notionクライアントを取得（プロセス共有・接続チェックはキャッシュ）"""
     try:
         # APIキーの確認
         if not notion_api_key:
@@ -81,70 +96,27 @@ def initialize_notion_client():
             st.warning("⚠️ Notion APIキーの形式が正しくない可能性があります")
             st.info("💡 正しい形式: secret_... または ntn_...")
         
-        from notion_client import Client
-        client = Client(auth=notion_api_key)
+        client = get_notion_client(notion_api_key)
         
-        # 接続テスト
-        try:
-            # ユーザー情報を取得して接続をテスト
-            user = client.users.me()
-            user_name = user.get('name', 'Unknown User')
-            # st.success(f"✅ Notion接続成功: {user_name}")  # 非表示化
-            
-            # データベースIDの確認
-            node_db_id = st.secrets.get("NODE_DB_ID") or st.secrets.get("NOTION_DIAGNOSTIC_DB_ID") or os.getenv("NODE_DB_ID") or os.getenv("NOTION_DIAGNOSTIC_DB_ID")
-            case_db_id = st.secrets.get("CASE_DB_ID") or st.secrets.get("NOTION_REPAIR_CASE_DB_ID") or os.getenv("CASE_DB_ID") or os.getenv("NOTION_REPAIR_CASE_DB_ID")
-            item_db_id = st.secrets.get("ITEM_DB_ID") or os.getenv("ITEM_DB_ID")
-            
-            # データベースアクセス権限のテスト
-            test_results = []
-            
-            if node_db_id:
-                try:
-                    response = client.databases.query(database_id=node_db_id)
-                    nodes_count = len(response.get("results", []))
-                    test_results.append(f"✅ 診断フローDB: {nodes_count}件のノード")
-                except Exception as e:
-                    test_results.append(f"❌ 診断フローDB: アクセス失敗 - {str(e)[:100]}")
-            
-            if case_db_id:
-                try:
-                    response = client.databases.query(database_id=case_db_id)
-                    cases_count = len(response.get("results", []))
-                    test_results.append(f"✅ 修理ケースDB: {cases_count}件のケース")
-                except Exception as e:
-                    test_results.append(f"❌ 修理ケースDB: アクセス失敗 - {str(e)[:100]}")
-            
-            if item_db_id:
-                try:
-                    response = client.databases.query(database_id=item_db_id)
-                    items_count = len(response.get("results", []))
-                    test_results.append(f"✅ 部品・工具DB: {items_count}件のアイテム")
-                except Exception as e:
-                    test_results.append(f"❌ 部品・工具DB: アクセス失敗 - {str(e)[:100]}")
-            
-            # テスト結果を表示（非表示化）
-            # st.info("📊 データベースアクセステスト:")
-            # for result in test_results:
-            #     st.write(f"  {result}")
-            
+        # 接続テスト（users.meのみ。成功結果はTTLの間キャッシュされる）
+        # データベースごとの詳細チェックは perform_detailed_notion_test() で行う
+        ok, error_msg = check_notion_health(notion_api_key, force=force_check)
+        if ok:
             return client
-            
-        except Exception as e:
-            error_msg = str(e)
-            st.error(f"❌ Notion接続テスト失敗: {error_msg}")
-            
-            # エラーの種類に応じた解決方法を提示
-            if "unauthorized" in error_msg.lower() or "401" in error_msg:
-                st.info("💡 解決方法: APIキーが無効です。新しいAPIキーを生成してください")
-            elif "not_found" in error_msg.lower() or "404" in error_msg:
-                st.info("💡 解決方法: データベースIDが間違っているか、アクセス権限がありません")
-            elif "rate_limited" in error_msg.lower() or "429" in error_msg:
-                st.info("💡 解決方法: API制限に達しました。しばらく待ってから再試行してください")
-            else:
-                st.info("💡 解決方法: ネットワーク接続とAPIキーの権限を確認してください")
-            
-            return None
+        
+        st.error(f"❌ Notion接続テスト失敗: {error_msg}")
+        
+        # エラーの種類に応じた解決方法を提示
+        if "unauthorized" in error_msg.lower() or "401" in error_msg:
+            st.info("💡 解決方法: APIキーが無効です。新しいAPIキーを生成してください")
+        elif "not_found" in error_msg.lower() or "404" in error_msg:
+            st.info("💡 解決方法: データベースIDが間違っているか、アクセス権限がありません")
+        elif "rate_limited" in error_msg.lower() or "429" in error_msg:
+            st.info("💡 解決方法: API制限に達しました。しばらく待ってから再試行してください")
+        else:
+            st.info("💡 解決方法: ネットワーク接続とAPIキーの権限を確認してください")
+        
+        return None
             
     except ImportError as e:
         st.error(f"❌ notion-clientライブラリがインストールされていません: {e}")
@@ -154,6 +126,16 @@ def initialize_notion_client():
         st.error(f"❌ Notionクライアントの初期化に失敗: {e}")
         return None
 
+def retrieve_related_records(client, page_ids, extract, label):
+    """リレーション先のページを取得し、スキーマでレコードに変換"""
+    records = []
+    for page_id in page_ids:
+        try:
+            records.append(extract(client.pages.retrieve(page_id=page_id)))
+        except Exception as e:
+            st.warning(f"{label}情報の取得に失敗: {e}")
+    return records
+
 def load_notion_diagnostic_data():
     """Notionから診断データを読み込み（改善版）"""
     client = initialize_notion_client()
@@ -180,17 +162,17 @@ def load_notion_diagnostic_data():
 
         # Notionから診断フローデータを取得（改善されたエラーハンドリング）
         try:
-            response = client.databases.query(database_id=node_db_id)
-            nodes = response.get("results", [])
+            # 全ページをカーソルで辿りながら逐次取得（先頭ページのみここで取得してエラーを判定）
+            pages = iter_database_pages(client, node_db_id)
+            first_node = next(pages, None)
             
-            if not nodes:
+            if first_node is None:
                 st.warning("⚠️ 診断フローDBにデータがありません")
                 st.info("💡 Notionデータベースに診断ノードを追加してください")
                 return None
-                
-            # st.success(f"✅ 診断フローDBから{len(nodes)}件のノードを取得しました")  # 非表示化
             
         except Exception as e:
+            invalidate_notion_health(notion_api_key)
             error_msg = str(e)
             st.error(f"❌ 診断フローDBのクエリに失敗: {error_msg}")
             
@@ -214,108 +196,15 @@ def load_notion_diagnostic_data():
             "start_nodes": []
         }
         
-        for node in nodes:
-            properties = node.get("properties", {})
-            
-            # ノードの基本情報を抽出
-            node_info = {
-                "id": node.get("id"),
-                "title": "",
-                "category": "",
-                "symptoms": [],
-                "next_nodes": [],
-                "related_cases": [],  # 関連する修理ケース
-                "related_items": []   # 関連する部品・工具
-            }
-            
-            # タイトルの抽出
-            title_prop = properties.get("タイトル", {})
-            if title_prop.get("type") == "title" and title_prop.get("title"):
-                node_info["title"] = title_prop["title"][0].get("plain_text", "")
-            
-            # カテゴリの抽出
-            category_prop = properties.get("カテゴリ", {})
-            if category_prop.get("type") == "select" and category_prop.get("select"):
-                node_info["category"] = category_prop["select"].get("name", "")
-            
-            # 症状の抽出
-            symptoms_prop = properties.get("症状", {})
-            if symptoms_prop.get("type") == "multi_select":
-                node_info["symptoms"] = [item.get("name", "") for item in symptoms_prop.get("multi_select", [])]
+        for node in itertools.chain([first_node], pages):
+            node_info = parse_kb_node(node)
+            case_ids = node_info.pop("related_case_ids")
+            item_ids = node_info.pop("related_item_ids")
+            node_info["next_nodes"] = []
             
-            # 関連修理ケースの抽出（リレーション対応）
-            cases_prop = properties.get("関連修理ケース", {})
-            if cases_prop.get("type") == "relation":
-                for relation in cases_prop.get("relation", []):
-                    try:
-                        case_response = client.pages.retrieve(page_id=relation["id"])
-                        case_properties = case_response.get("properties", {})
-                        
-                        case_info = {
-                            "id": relation["id"],
-                            "title": "",
-                            "category": "",
-                            "solution": ""
-                        }
-                        
-                        # ケースタイトルの抽出
-                        title_prop = case_properties.get("タイトル", {})
-                        if title_prop.get("type") == "title" and title_prop.get("title"):
-                            case_info["title"] = title_prop["title"][0].get("plain_text", "")
-                        
-                        # カテゴリの抽出
-                        cat_prop = case_properties.get("カテゴリ", {})
-                        if cat_prop.get("type") == "select" and cat_prop.get("select"):
-                            case_info["category"] = cat_prop["select"].get("name", "")
-                        
-                        # 解決方法の抽出
-                        solution_prop = case_properties.get("解決方法", {})
-                        if solution_prop.get("type") == "rich_text" and solution_prop.get("rich_text"):
-                            case_info["solution"] = solution_prop["rich_text"][0].get("plain_text", "")
-                        
-                        node_info["related_cases"].append(case_info)
-                    except Exception as e:
-                        st.warning(f"修理ケース情報の取得に失敗: {e}")
-            
-            # 関連部品・工具の抽出（リレーション対応）
-            items_prop = properties.get("関連部品・工具", {})
-            if items_prop.get("type") == "relation":
-                for relation in items_prop.get("relation", []):
-                    try:
-                        item_response = client.pages.retrieve(page_id=relation["id"])
-                        item_properties = item_response.get("properties", {})
-                        
-                        item_info = {
-                            "id": relation["id"],
-                            "name": "",
-                            "category": "",
-                            "price": "",
-                            "supplier": ""
-                        }
-                        
-                        # アイテム名の抽出
-                        name_prop = item_properties.get("名前", {})
-                        if name_prop.get("type") == "title" and name_prop.get("title"):
-                            item_info["name"] = name_prop["title"][0].get("plain_text", "")
-                        
-                        # カテゴリの抽出
-                        cat_prop = item_properties.get("カテゴリ", {})
-                        if cat_prop.get("type") == "select" and cat_prop.get("select"):
-                            item_info["category"] = cat_prop["select"].get("name", "")
-                        
-                        # 価格の抽出
-                        price_prop = item_properties.get("価格", {})
-                        if price_prop.get("type") == "number":
-                            item_info["price"] = str(price_prop.get("number", ""))
-                        
-                        # サプライヤーの抽出
-                        supplier_prop = item_properties.get("サプライヤー", {})
-                        if supplier_prop.get("type") == "rich_text" and supplier_prop.get("rich_text"):
-                            item_info["supplier"] = supplier_prop["rich_text"][0].get("plain_text", "")
-                        
-                        node_info["related_items"].append(item_info)
-                    except Exception as e:
-                        st.warning(f"部品・工具情報の取得に失敗: {e}")
+            # 関連する修理ケース・部品・工具の取得（リレーション対応）
+            node_info["related_cases"] = retrieve_related_records(client, case_ids, parse_kb_case_summary, "修理ケース")
+            node_info["related_items"] = retrieve_related_records(client, item_ids, parse_kb_item, "部品・工具")
             
             diagnostic_data["nodes"].append(node_info)
             
@@ -326,6 +215,7 @@ def load_notion_diagnostic_data():
         return diagnostic_data
         
     except Exception as e:
+        invalidate_notion_health(notion_api_key)
         st.error(f"❌ Notionからの診断データ読み込みに失敗: {e}")
         return None
 
@@ -339,8 +229,8 @@ def perform_detailed_notion_test():
     }
     
     try:
-        # クライアント初期化テスト
-        client = initialize_notion_client()
+        # クライアント初期化テスト（キャッシュを使わず接続チェックをやり直す）
+        client = initialize_notion_client(force_check=True)
         if not client:
             test_results["databases"]["クライアント初期化"] = {
                 "status": "error",
@@ -503,1012 +393,150 @@ def load_notion_repair_cases():
         if not case_db_id:
             return []
         
-        # Notionから修理ケースを取得
-        response = client.databases.query(database_id=case_db_id)
-        cases = response.get("results", [])
+        # Notionから修理ケースを取得（全ページをカーソルで辿りながら逐次取得）
+        cases = iter_database_pages(client, case_db_id)
         
         repair_cases = []
         
-        for case in cases:
-            properties = case.get("properties", {})
-            
-            case_info = {
-                "id": case.get("id"),
-                "title": "",
-                "category": "",
-                "symptoms": [],
-                "solution": "",
-                "parts": [],
-                "tools": [],
-                "related_nodes": [],  # 関連する診断ノード
-                "related_items": []   # 関連する部品・工具
-            }
-            
-            # タイトルの抽出
-            title_prop = properties.get("タイトル", {})
-            if title_prop.get("type") == "title" and title_prop.get("title"):
-                case_info["title"] = title_prop["title"][0].get("plain_text", "")
-            
-            # カテゴリの抽出
-            category_prop = properties.get("カテゴリ", {})
-            if category_prop.get("type") == "select" and category_prop.get("select"):
-                case_info["category"] = category_prop["select"].get("name", "")
+        for case_info in parse_pages(cases, parse_kb_case):
+            part_ids = case_info.pop("part_ids")
+            tool_ids = case_info.pop("tool_ids")
+            node_ids = case_info.pop("related_node_ids")
             
-            # 症状の抽出
-            symptoms_prop = properties.get("症状", {})
-            if symptoms_prop.get("type") == "multi_select":
-                case_info["symptoms"] = [item.get("name", "") for item in symptoms_prop.get("multi_select", [])]
-            
-            # 解決方法の抽出
-            solution_prop = properties.get("解決方法", {})
-            if solution_prop.get("type") == "rich_text" and solution_prop.get("rich_text"):
-                case_info["solution"] = solution_prop["rich_text"][0].get("plain_text", "")
-            
-            # 必要な部品の抽出（リレーション対応）
-            parts_prop = properties.get("必要な部品", {})
-            if parts_prop.get("type") == "relation":
-                # リレーションから部品情報を取得
-                for relation in parts_prop.get("relation", []):
-                    try:
-                        item_response = client.pages.retrieve(page_id=relation["id"])
-                        item_properties = item_response.get("properties", {})
-                        
-                        item_info = {
-                            "id": relation["id"],
-                            "name": "",
-                            "category": "",
-                            "price": "",
-                            "supplier": ""
-                        }
-                        
-                        # 部品名の抽出
-                        name_prop = item_properties.get("名前", {})
-                        if name_prop.get("type") == "title" and name_prop.get("title"):
-                            item_info["name"] = name_prop["title"][0].get("plain_text", "")
-                        
-                        # カテゴリの抽出
-                        cat_prop = item_properties.get("カテゴリ", {})
-                        if cat_prop.get("type") == "select" and cat_prop.get("select"):
-                            item_info["category"] = cat_prop["select"].get("name", "")
-                        
-                        # 価格の抽出
-                        price_prop = item_properties.get("価格", {})
-                        if price_prop.get("type") == "number":
-                            item_info["price"] = str(price_prop.get("number", ""))
-                        
-                        # サプライヤーの抽出
-                        supplier_prop = item_properties.get("サプライヤー", {})
-                        if supplier_prop.get("type") == "rich_text" and supplier_prop.get("rich_text"):
-                            item_info["supplier"] = supplier_prop["rich_text"][0].get("plain_text", "")
-                        
-                        case_info["related_items"].append(item_info)
-                    except Exception as e:
-                        st.warning(f"部品情報の取得に失敗: {e}")
-            elif parts_prop.get("type") == "multi_select":
-                # 従来のmulti_select形式
-                case_info["parts"] = [item.get("name", "") for item in parts_prop.get("multi_select", [])]
-            
-            # 必要な工具の抽出（リレーション対応）
-            tools_prop = properties.get("必要な工具", {})
-            if tools_prop.get("type") == "relation":
-                # リレーションから工具情報を取得
-                for relation in tools_prop.get("relation", []):
-                    try:
-                        item_response = client.pages.retrieve(page_id=relation["id"])
-                        item_properties = item_response.get("properties", {})
-                        
-                        tool_info = {
-                            "id": relation["id"],
-                            "name": "",
-                            "category": "",
-                            "price": "",
-                            "supplier": ""
-                        }
-                        
-                        # 工具名の抽出
-                        name_prop = item_properties.get("名前", {})
-                        if name_prop.get("type") == "title" and name_prop.get("title"):
-                            tool_info["name"] = name_prop["title"][0].get("plain_text", "")
-                        
-                        # カテゴリの抽出
-                        cat_prop = item_properties.get("カテゴリ", {})
-                        if cat_prop.get("type") == "select" and cat_prop.get("select"):
-                            tool_info["category"] = cat_prop["select"].get("name", "")
-                        
-                        # 価格の抽出
-                        price_prop = item_properties.get("価格", {})
-                        if price_prop.get("type") == "number":
-                            tool_info["price"] = str(price_prop.get("number", ""))
-                        
-                        # サプライヤーの抽出
-                        supplier_prop = item_properties.get("サプライヤー", {})
-                        if supplier_prop.get("type") == "rich_text" and supplier_prop.get("rich_text"):
-                            tool_info["supplier"] = supplier_prop["rich_text"][0].get("plain_text", "")
-                        
-                        case_info["related_items"].append(tool_info)
-                    except Exception as e:
-                        st.warning(f"工具情報の取得に失敗: {e}")
-            elif tools_prop.get("type") == "multi_select":
-                # 従来のmulti_select形式
-                case_info["tools"] = [item.get("name", "") for item in tools_prop.get("multi_select", [])]
-            
-            # 関連診断ノードの抽出（リレーション対応）
-            nodes_prop = properties.get("関連診断ノード", {})
-            if nodes_prop.get("type") == "relation":
-                for relation in nodes_prop.get("relation", []):
-                    try:
-                        node_response = client.pages.retrieve(page_id=relation["id"])
-                        node_properties = node_response.get("properties", {})
-                        
-                        node_info = {
-                            "id": relation["id"],
-                            "title": "",
-                            "category": "",
-                            "symptoms": []
-                        }
-                        
-                        # ノードタイトルの抽出
-                        title_prop = node_properties.get("タイトル", {})
-                        if title_prop.get("type") == "title" and title_prop.get("title"):
-                            node_info["title"] = title_prop["title"][0].get("plain_text", "")
-                        
-                        # カテゴリの抽出
-                        cat_prop = node_properties.get("カテゴリ", {})
-                        if cat_prop.get("type") == "select" and cat_prop.get("select"):
-                            node_info["category"] = cat_prop["select"].get("name", "")
-                        
-                        # 症状の抽出
-                        symptoms_prop = node_properties.get("症状", {})
-                        if symptoms_prop.get("type") == "multi_select":
-                            node_info["symptoms"] = [item.get("name", "") for item in symptoms_prop.get("multi_select", [])]
-                        
-                        case_info["related_nodes"].append(node_info)
-                    except Exception as e:
-                        st.warning(f"診断ノード情報の取得に失敗: {e}")
+            # リレーション形式の部品・工具は詳細を取得（multi_select形式はparts/toolsに入る）
+            case_info["related_items"] = (
+                retrieve_related_records(client, part_ids, parse_kb_item, "部品")
+                + retrieve_related_records(client, tool_ids, parse_kb_item, "工具")
+            )
+            case_info["related_nodes"] = retrieve_related_records(client, node_ids, parse_kb_node_summary, "診断ノード")
             
             repair_cases.append(case_info)
         
         return repair_cases
         
     except Exception as e:
+        invalidate_notion_health(notion_api_key)
         st.error(f"❌ Notionからの修理ケース読み込みに失敗: {e}")
         return []
 
 # 知識ベースの読み込み
 def load_knowledge_base():
-    """テキストファイルから知識ベースを読み込み"""
-    knowledge_base = {}
-    
-    # テキストファイルのリスト
-    text_files = [
-        "インバーター.txt", "バッテリー.txt", "水道ポンプ.txt", "冷蔵庫.txt",
-        "車体外装の破損.txt", "ウインドウ.txt", "排水タンク.txt", "雨漏り.txt",
-        "外部電源.txt", "家具.txt", "ルーフベント　換気扇.txt", "電装系.txt",
-        "FFヒーター.txt", "ガスコンロ.txt", "トイレ.txt", "室内LED.txt",
-        "ソーラーパネル.txt", "異音.txt"
-    ]
-    
-    for file_name in text_files:
-        if os.path.exists(file_name):
-            try:
-                with open(file_name, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # ファイル名からカテゴリを抽出
-                category = file_name.replace('.txt', '')
-                knowledge_base[category] = content
-                
-            except Exception as e:
-                st.error(f"ファイル読み込みエラー {file_name}: {e}")
-    
+    """テキストファイルから知識ベースを読み込み（プロセス全体で共有し、変更されたファイルだけを読み直す）"""
+    knowledge_base = get_knowledge_base()
+    for file_name, error in knowledge_base.errors:
+        st.error(f"ファイル読み込みエラー {file_name}: {error}")
     return knowledge_base
 
 def extract_relevant_knowledge(query, knowledge_base):
-    """クエリに関連する知識を抽出"""
-    query_lower = query.lower()
-    relevant_content = []
-    
-    # キーワードマッピング
-    keyword_mapping = {
-        "インバーター": ["インバーター", "DC-AC", "正弦波", "電源変換"],
-        "バッテリー": ["バッテリー", "サブバッテリー", "充電", "電圧"],
-        "トイレ": ["トイレ", "カセット", "マリン", "フラッパー"],
-        "ルーフベント": ["ルーフベント", "換気扇", "マックスファン", "ファン"],
-        "水道": ["水道", "ポンプ", "給水", "水"],
-        "冷蔵庫": ["冷蔵庫", "冷凍", "コンプレッサー"],
-        "ガス": ["ガス", "コンロ", "ヒーター", "FF"],
-        "電気": ["電気", "LED", "照明", "電装"],
-        "雨漏り": ["雨漏り", "防水", "シール"],
-        "異音": ["異音", "音", "騒音", "振動"]
-    }
-    
-    # 関連カテゴリを特定
-    relevant_categories = []
-    for category, keywords in keyword_mapping.items():
-        for keyword in keywords:
-            if keyword in query_lower:
-                relevant_categories.append(category)
-                break
-    
-    # 関連コンテンツを抽出
-    for category in relevant_categories:
-        if category in knowledge_base:
-            content = knowledge_base[category]
-            
-            # トラブル事例を抽出
-            case_pattern = r'## 【Case.*?】.*?(?=##|$)'
-            cases = re.findall(case_pattern, content, re.DOTALL)
-            
-            for case in cases:
-                if any(keyword in case.lower() for keyword in query_lower.split()):
-                    relevant_content.append(f"【{category}】\n{case}")
-    
-    return relevant_content
+    """クエリに関連する知識を抽出（query: 質問文または QueryAnalysis）"""
+    # 関連カテゴリの関連コンテンツを抽出（読み込み時に解析済みのケースを参照）
+    cases = as_knowledge_base(knowledge_base).relevant_cases(analyze_query(query))
+    return [f"【{case.category}】\n{case.render()}" for case in cases]
 
 def extract_urls_from_text(content):
     """テキストからURLを抽出"""
-    import re
-    url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-    urls = re.findall(url_pattern, content)
-    return urls
+    return URL_PATTERN.findall(content)
 
 def determine_blog_category(blog, query):
-    """ブログのカテゴリーを判定"""
-    query_lower = query.lower()
-    title_lower = blog['title'].lower()
-    url_lower = blog['url'].lower()
-    keywords_lower = [kw.lower() for kw in blog['keywords']]
-    
-    # インバーター関連
-    if any(keyword in query_lower for keyword in ['インバーター', 'inverter', 'dc-ac', '正弦波', '電源変換']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['インバーター', 'inverter', '正弦波', '矩形波', 'dc-ac']):
-            return "🔌 インバーター関連"
-    
-    # バッテリー関連
-    if any(keyword in query_lower for keyword in ['バッテリー', 'battery', '充電', '電圧']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['バッテリー', 'battery', '充電', '電圧', 'agm', 'リチウム']):
-            return "🔋 バッテリー関連"
-    
-    # 水道ポンプ関連
-    if any(keyword in query_lower for keyword in ['水道', 'ポンプ', 'water', 'pump', '給水']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['水道', 'ポンプ', 'water', 'pump', '給水']):
-            return "💧 水道・ポンプ関連"
-    
-    # 雨漏り関連
-    if any(keyword in query_lower for keyword in ['雨漏り', 'rain', 'leak', '防水', 'シール']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['雨漏り', 'rain', 'leak', '防水', 'シール']):
-            return "🌧️ 雨漏り・防水関連"
-    
-    # 電気・電装系関連
-    if any(keyword in query_lower for keyword in ['電気', '電装', 'electrical', 'led', '照明']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['電気', '電装', 'electrical', 'led', '照明']):
-            return "⚡ 電気・電装系関連"
-    
-    # 冷蔵庫関連
-    if any(keyword in query_lower for keyword in ['冷蔵庫', '冷凍', 'コンプレッサー']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['冷蔵庫', '冷凍', 'コンプレッサー']):
-            return "❄️ 冷蔵庫・冷凍関連"
-    
-    # ガス関連
-    if any(keyword in query_lower for keyword in ['ガス', 'gas', 'コンロ', 'ヒーター', 'ff']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['ガス', 'gas', 'コンロ', 'ヒーター', 'ff']):
-            return "🔥 ガス・ヒーター関連"
-    
-    # トイレ関連
-    if any(keyword in query_lower for keyword in ['トイレ', 'toilet', 'カセット', 'マリン']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['トイレ', 'toilet', 'カセット', 'マリン']):
-            return "🚽 トイレ関連"
-    
-    # ルーフベント関連
-    if any(keyword in query_lower for keyword in ['ルーフベント', '換気扇', 'ファン', 'vent']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['ルーフベント', '換気扇', 'ファン', 'vent']):
-            return "💨 ルーフベント・換気扇関連"
-    
-    # 異音・騒音関連
-    if any(keyword in query_lower for keyword in ['異音', '騒音', '音', '振動', 'noise']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['異音', '騒音', '音', '振動', 'noise']):
-            return "🔊 異音・騒音関連"
-    
-    # 基本修理・メンテナンス関連
-    if any(keyword in query_lower for keyword in ['修理', 'メンテナンス', 'repair', 'maintenance']):
-        if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower 
-               for keyword in ['修理', 'メンテナンス', 'repair', 'maintenance']):
-            return "🔧 基本修理・メンテナンス関連"
-    
-    # デフォルトカテゴリー
-    return "📚 その他関連記事"
+    """ブログのカテゴリーを判定（質問・ブログの両方に当てはまる最初のカテゴリー）"""
+    return analyze_query(query).blog_category(blog)
 
 def determine_query_category(query):
     """クエリのカテゴリーを判定"""
-    query_lower = query.lower()
-    
-    # インバーター関連
-    if any(keyword in query_lower for keyword in ['インバーター', 'inverter', 'dc-ac', '正弦波', '電源変換']):
-        return "🔌 インバーター関連"
-    
-    # バッテリー関連
-    if any(keyword in query_lower for keyword in ['バッテリー', 'battery', '充電', '電圧']):
-        return "🔋 バッテリー関連"
-    
-    # 水道ポンプ関連
-    if any(keyword in query_lower for keyword in ['水道', 'ポンプ', 'water', 'pump', '給水']):
-        return "💧 水道・ポンプ関連"
-    
-    # 雨漏り関連
-    if any(keyword in query_lower for keyword in ['雨漏り', 'rain', 'leak', '防水', 'シール']):
-        return "🌧️ 雨漏り・防水関連"
-    
-    # 電気・電装系関連
-    if any(keyword in query_lower for keyword in ['電気', '電装', 'electrical', 'led', '照明']):
-        return "⚡ 電気・電装系関連"
-    
-    # 冷蔵庫関連
-    if any(keyword in query_lower for keyword in ['冷蔵庫', '冷凍', 'コンプレッサー']):
-        return "❄️ 冷蔵庫・冷凍関連"
-    
-    # ガス関連
-    if any(keyword in query_lower for keyword in ['ガス', 'gas', 'コンロ', 'ヒーター', 'ff']):
-        return "🔥 ガス・ヒーター関連"
-    
-    # トイレ関連
-    if any(keyword in query_lower for keyword in ['トイレ', 'toilet', 'カセット', 'マリン']):
-        return "🚽 トイレ関連"
-    
-    # ルーフベント関連
-    if any(keyword in query_lower for keyword in ['ルーフベント', '換気扇', 'ファン', 'vent']):
-        return "💨 ルーフベント・換気扇関連"
-    
-    # 異音・騒音関連
-    if any(keyword in query_lower for keyword in ['異音', '騒音', '音', '振動', 'noise']):
-        return "🔊 異音・騒音関連"
-    
-    # 基本修理・メンテナンス関連
-    if any(keyword in query_lower for keyword in ['修理', 'メンテナンス', 'repair', 'maintenance']):
-        return "🔧 基本修理・メンテナンス関連"
-    
-    # デフォルトカテゴリー
-    return "📚 その他関連記事"
+    return analyze_query(query).category
 
 def get_relevant_blog_links(query, knowledge_base=None):
-    """クエリとテキストデータに基づいて関連ブログを返す"""
-    query_lower = query.lower()
-    
-    # 質問から直接キーワードを抽出
-    query_keywords = []
-    
-    # 主要な技術用語を質問から直接抽出
-    main_keywords = [
-        "バッテリー", "インバーター", "ポンプ", "冷蔵庫", "ヒーター", "コンロ",
-        "トイレ", "ルーフベント", "換気扇", "水道", "給水", "排水", "雨漏り",
-        "防水", "シーリング", "配線", "電装", "LED", "ソーラーパネル",
-        "ガス", "電気", "異音", "振動", "故障", "修理", "メンテナンス",
-        "シャワー", "水", "電圧", "充電", "出力", "電源", "音", "騒音"
-    ]
-    
-    for keyword in main_keywords:
-        if keyword in query_lower:
-            query_keywords.append(keyword)
-    
-    # トラブル関連キーワードを質問から直接抽出
-    trouble_keywords = [
-        "水が出ない", "圧力不足", "異音", "過熱", "電圧低下", "充電されない",
-        "電源入らない", "出力ゼロ", "水漏れ", "臭い", "ファン故障", "開閉不良",
-        "配管漏れ", "雨漏り", "防水", "シール", "音", "騒音", "振動"
-    ]
-    
-    for keyword in trouble_keywords:
-        if keyword in query_lower:
-            query_keywords.append(keyword)
-    
-    # テキストデータからキーワードとURLを抽出
-    extracted_keywords = []
-    extracted_urls = []
-    
-    if knowledge_base:
-        for category, content in knowledge_base.items():
-            # カテゴリ名をキーワードとして追加
-            if category.lower() in query_lower:
-                extracted_keywords.append(category.lower())
-            
-            # コンテンツから重要なキーワードを抽出
-            content_lower = content.lower()
-            
-            # 技術用語の抽出
-            tech_keywords = [
-                "バッテリー", "インバーター", "ポンプ", "冷蔵庫", "ヒーター", "コンロ",
-                "トイレ", "ルーフベント", "換気扇", "水道", "給水", "排水", "雨漏り",
-                "防水", "シーリング", "配線", "電装", "LED", "ソーラーパネル",
-                "ガス", "電気", "異音", "振動", "故障", "修理", "メンテナンス"
-            ]
-            
-            for keyword in tech_keywords:
-                if keyword in content_lower and keyword in query_lower:
-                    extracted_keywords.append(keyword)
+    """クエリとテキストデータに基づいて関連ブログを返す（query: 質問文または QueryAnalysis）"""
+    return relevant_blog_links(query, knowledge_base, limit=5)
+
+def show_retrieved_knowledge(relevant_knowledge):
+    """回答の参考にした知識ベースの事例を表示"""
+    if relevant_knowledge:
+        with st.expander(f"📄 参考にした修理事例（{len(relevant_knowledge[:3])}件）"):
+            for text in relevant_knowledge[:3]:
+                st.markdown(text)
+
+def generate_ai_response_with_knowledge(prompt, knowledge_base, stream=False):
+    """知識ベースを活用したAI回答を生成（prompt: 質問文または QueryAnalysis）
+
+    stream=True のときは参考にした事例・関連ブログを先に表示してから回答をトークンが
+    届くたびに表示し、サポートセンターの案内・エラーも含めてこの関数が表示する
+    （戻り値は表示と同じ順の 関連ブログ・回答・サポートセンターの案内 の全文）。
+    参考にした事例・関連ブログは、APIキーがない場合や生成に失敗した場合も表示する。
+    """
+    # 質問文の解析は一度だけ行い、関連知識・関連ブログ・ブログの分類で共有する
+    analysis = analyze_query(prompt)
+    prompt = analysis.text
+    blog_section = ""
+
+    def finish(message):
+        if stream:
+            st.markdown(message)
+        return blog_section + message
+
+    try:
+        # 関連知識を抽出
+        knowledge_base = as_knowledge_base(knowledge_base)
+        relevant_knowledge = extract_relevant_knowledge(analysis, knowledge_base)
+        blog_links = get_relevant_blog_links(analysis, knowledge_base)
+        
+        # 関連ブログ（回答の生成前に用意し、ストリーミング時は先に表示する）
+        if blog_links:
+            blog_section = "\n\n## 📚 関連ブログ・参考記事\n"
+            blog_section += "より詳しい情報や実践的な対処法については、以下の記事もご参考ください：\n\n"
             
-            # トラブル関連キーワードの抽出
-            trouble_keywords = [
-                "水が出ない", "圧力不足", "異音", "過熱", "電圧低下", "充電されない",
-                "電源入らない", "出力ゼロ", "水漏れ", "臭い", "ファン故障", "開閉不良",
-                "配管漏れ", "雨漏り", "防水", "シール", "音", "騒音", "振動"
-            ]
+            # デバッグ情報（開発時のみ表示）
+            # blog_section += f"**🔍 抽出されたキーワード**: {', '.join(all_keywords[:5])}\n\n"
             
-            for keyword in trouble_keywords:
-                if keyword in content_lower and keyword in query_lower:
-                    extracted_keywords.append(keyword)
+            # 重複するURLを除去して、ユニークなURLのみを表示
+            unique_blogs = []
+            seen_urls = set()
             
-            # URLを抽出
-            urls = extract_urls_from_text(content)
-            for url in urls:
-                if url not in extracted_urls:
-                    extracted_urls.append(url)
-    
-    # 質問から抽出したキーワードとテキストデータから抽出したキーワードを結合
-    all_keywords = list(set(query_keywords + extracted_keywords))
-    
-    # 重複を除去
-    extracted_keywords = list(set(extracted_keywords))
-    
-    # テキストデータから抽出したURLを基にブログリンクを生成
-    blog_links = []
-    
-    # 抽出したURLからブログリンクを作成
-    for url in extracted_urls:
-        # URLにカンマが含まれている場合は分割
-        individual_urls = url.split(',')
-        
-        for individual_url in individual_urls:
-            individual_url = individual_url.strip()  # 前後の空白を除去
-            if not individual_url:  # 空のURLはスキップ
-                continue
+            for blog in blog_links:
+                # URLにカンマが含まれている場合は分割
+                urls = blog['url'].split(',')
                 
-            # URLから正確なタイトルを推測
-            title = ""
-            if "water-pump" in individual_url or "水道" in individual_url or "ポンプ" in individual_url:
-                title = "水道ポンプ関連記事"
-            elif "battery" in individual_url or "バッテリー" in individual_url:
-                title = "バッテリー関連記事"
-            elif "inverter" in individual_url or "インバーター" in individual_url:
-                title = "インバーター関連記事"
-            elif "rain-leak" in individual_url or "雨漏り" in individual_url:
-                title = "雨漏り関連記事"
-            elif "electrical" in individual_url or "電気" in individual_url or "電装" in individual_url:
-                title = "電気・電装系関連記事"
-            elif "shower" in individual_url:
-                title = "シャワー・給水関連記事"
-            elif "repair" in individual_url or "修理" in individual_url:
-                title = "修理関連記事"
-            else:
-                title = "キャンピングカー関連記事"
+                for url in urls:
+                    url = url.strip()  # 前後の空白を除去
+                    if url and url not in seen_urls:
+                        # 分割されたURLごとに個別のブログエントリを作成
+                        unique_blogs.append({
+                            'title': blog['title'],
+                            'url': url,
+                            'keywords': blog['keywords']
+                        })
+                        seen_urls.add(url)
             
-            # キーワードを質問のキーワードとテキストデータから抽出したキーワードから設定
-            keywords = all_keywords.copy()
+            # カテゴリーごとにブログを分類
+            categorized_blogs = {}
+            for blog in unique_blogs:
+                category = analysis.blog_category(blog)
+                if category not in categorized_blogs:
+                    categorized_blogs[category] = []
+                categorized_blogs[category].append(blog)
             
-            blog_links.append({
-                "title": title,
-                "url": individual_url,
-                "keywords": keywords
-            })
-    
-    # 基本的なブログリンクデータベース（フォールバック用）
-    fallback_blog_links = [
-        {
-            "title": "サブバッテリーの種類と選び方",
-            "url": "https://camper-repair.net/blog/battery-types/",
-            "keywords": ["バッテリー", "AGM", "リチウム", "ニッケル水素", "価格比較", "容量計算", "選び方"]
-        },
-        {
-            "title": "サブバッテリー容量計算のコツ",
-            "url": "https://camper-repair.net/battery-selection/",
-            "keywords": ["バッテリー", "容量計算", "消費電力", "連続運用", "充電サイクル", "最大負荷"]
-        },
-        {
-            "title": "サブバッテリーの充電方法・充電器比較",
-            "url": "https://camper-repair.net/blog/risk1/",
-            "keywords": ["バッテリー", "充電方法", "走行充電", "外部電源", "ソーラーパネル", "AC充電器", "DC-DC充電器"]
-        },
-        {
-            "title": "サブバッテリーとインバーターの組み合わせ",
-            "url": "https://camper-repair.net/blog/battery-inverter/",
-            "keywords": ["バッテリー", "インバーター", "DC-AC変換", "正弦波", "容量選定", "消費電力"]
-        },
-        {
-            "title": "サブバッテリーとソーラーパネルの連携",
-            "url": "https://camper-repair.net/blog/battery-solar/",
-            "keywords": ["バッテリー", "ソーラーパネル", "充電制御", "MPPTコントローラー", "PWM制御", "発電量"]
-        },
-        {
-            "title": "サブバッテリーの寿命と交換時期",
-            "url": "https://camper-repair.net/blog/battery-life/",
-            "keywords": ["バッテリー", "寿命", "サイクル回数", "容量低下", "経年劣化", "交換目安"]
-        },
-        {
-            "title": "サブバッテリー運用時の注意点",
-            "url": "https://camper-repair.net/blog/battery-care/",
-            "keywords": ["バッテリー", "過放電", "過充電", "ショート防止", "ヒューズ", "温度上昇"]
-        },
-        {
-            "title": "サブバッテリーのメンテナンス方法",
-            "url": "https://camper-repair.net/battery-selection/",
-            "keywords": ["バッテリー", "定期点検", "端子清掃", "バッテリー液", "比重測定", "電圧測定"]
-        },
-        {
-            "title": "サブバッテリーの取り付け・配線例",
-            "url": "https://camper-repair.net/blog/risk1/",
-            "keywords": ["バッテリー", "取り付け", "配線方法", "配線図", "ヒューズ", "ケーブルサイズ"]
-        },
-        {
-            "title": "サブバッテリーのトラブル・故障事例",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["バッテリー", "故障", "電圧低下", "容量不足", "過放電", "過充電", "膨張"]
-        },
-        {
-            "title": "サブバッテリーの容量アップ・増設術",
-            "url": "https://camper-repair.net/battery-selection/",
-            "keywords": ["バッテリー", "容量アップ", "増設", "並列接続", "直列接続", "配線図"]
-        },
-        {
-            "title": "サブバッテリーと家庭用家電の利用",
-            "url": "https://camper-repair.net/blog/risk1/",
-            "keywords": ["バッテリー", "家庭用家電", "インバーター", "消費電力", "冷蔵庫", "電子レンジ", "エアコン"]
-        },
-        {
-            "title": "サブバッテリー残量管理・インジケーター活用",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["バッテリー", "残量管理", "インジケーター", "電圧計", "電流計", "モニター"]
-        },
-        {
-            "title": "サブバッテリーと外部電源切替運用",
-            "url": "https://camper-repair.net/battery-selection/",
-            "keywords": ["バッテリー", "外部電源", "切替リレー", "優先給電", "AC/DC切替", "手動/自動切替"]
-        },
-        {
-            "title": "サブバッテリーのDIYカスタム事例",
-            "url": "https://camper-repair.net/blog/risk1/",
-            "keywords": ["バッテリー", "DIY", "カスタム", "容量アップ", "配線見直し", "充電方法"]
-        },
-        {
-            "title": "サブバッテリーの廃棄・リサイクル方法",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["バッテリー", "廃棄", "リサイクル", "回収業者", "鉛バッテリー", "リチウムバッテリー"]
-        },
-        {
-            "title": "サブバッテリー車検・法規制まとめ",
-            "url": "https://camper-repair.net/battery-selection/",
-            "keywords": ["バッテリー", "車検", "保安基準", "追加装備", "配線基準", "容量制限"]
-        },
-        {
-            "title": "サブバッテリーQ&A・よくある質問集",
-            "url": "https://camper-repair.net/blog/risk1/",
-            "keywords": ["バッテリー", "Q&A", "FAQ", "容量選定", "充電方法", "運用方法", "DIY"]
-        },
-        {
-            "title": "サブバッテリー運用の体験談・口コミ",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["バッテリー", "体験談", "運用失敗", "成功事例", "トラブル事例", "口コミ"]
-        },
-        
-        # インバーター関連（20テーマ）
-        {
-            "title": "インバーター完全ガイド",
-            "url": "https://camper-repair.net/blog/inverter1/",
-            "keywords": ["インバーター", "正弦波", "矩形波", "DC-AC変換", "容量選定", "出力波形", "連続出力"]
-        },
-        {
-            "title": "インバーターの仕組みと役割",
-            "url": "https://camper-repair.net/blog/inverter-selection/",
-            "keywords": ["インバーター", "変換回路", "DC入力", "AC出力", "電圧変換", "周波数変換", "回路構成"]
-        },
-        {
-            "title": "インバーターの種類と特徴",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["インバーター", "正弦波インバーター", "修正正弦波", "矩形波", "定格容量", "連続出力", "ピーク出力"]
-        },
-        {
-            "title": "インバーター容量の選び方",
-            "url": "https://camper-repair.net/blog/inverter1/",
-            "keywords": ["インバーター", "容量選定", "必要容量計算", "家電消費電力", "ピーク電力", "同時使用機器"]
-        },
-        {
-            "title": "インバーターの配線・設置方法",
-            "url": "https://camper-repair.net/blog/inverter-selection/",
-            "keywords": ["インバーター", "配線手順", "接続ケーブル", "端子加工", "アース線", "ヒューズ設置"]
-        },
-        {
-            "title": "インバーター運用時の安全対策",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["インバーター", "安全基準", "ヒューズ設置", "ブレーカー", "アース接続", "ショート対策"]
-        },
-        {
-            "title": "インバーターで使える家電リスト",
-            "url": "https://camper-repair.net/blog/inverter1/",
-            "keywords": ["インバーター", "家電使用可否", "冷蔵庫", "電子レンジ", "IH調理器", "エアコン", "TV"]
-        },
-        {
-            "title": "インバーターとサブバッテリーの関係",
-            "url": "https://camper-repair.net/blog/inverter-selection/",
-            "keywords": ["インバーター", "サブバッテリー", "直結接続", "容量配分", "バッテリー消耗", "電圧降下"]
-        },
-        {
-            "title": "インバーター切替運用のポイント",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["インバーター", "外部電源", "切替スイッチ", "サブバッテリー連動", "優先給電", "手動切替"]
-        },
-        {
-            "title": "インバータートラブル事例と対策",
-            "url": "https://camper-repair.net/blog/inverter1/",
-            "keywords": ["インバーター", "電源入らない", "出力ゼロ", "波形異常", "ヒューズ切れ", "過熱停止"]
-        },
-        {
-            "title": "インバーターの定期メンテナンス",
-            "url": "https://camper-repair.net/blog/inverter-selection/",
-            "keywords": ["インバーター", "メンテナンス", "定期点検", "端子清掃", "配線緩み", "ヒューズ確認"]
-        },
-        {
-            "title": "インバーター選びの失敗例と注意点",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["インバーター", "容量不足", "波形選定ミス", "安価モデル", "発熱問題", "ノイズ問題"]
-        },
-        {
-            "title": "インバーターと冷蔵庫の相性",
-            "url": "https://camper-repair.net/blog/inverter1/",
-            "keywords": ["インバーター", "冷蔵庫", "起動電流", "定格消費電力", "コンプレッサー方式", "正弦波必須"]
-        },
-        {
-            "title": "インバーターのノイズ・電波障害対策",
-            "url": "https://camper-repair.net/blog/inverter-selection/",
-            "keywords": ["インバーター", "ノイズ対策", "電波障害", "出力波形", "アース強化", "配線分離"]
-        },
-        {
-            "title": "インバーターの消費電力と省エネ運用",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["インバーター", "消費電力", "待機電力", "負荷効率", "省エネ家電", "エコ運転"]
-        },
-        {
-            "title": "インバーターのDIY設置手順",
-            "url": "https://camper-repair.net/blog/inverter1/",
-            "keywords": ["インバーター", "DIY設置", "作業手順", "配線設計", "部品選定", "固定方法"]
-        },
-        {
-            "title": "インバーターの人気モデル比較",
-            "url": "https://camper-repair.net/blog/inverter-selection/",
-            "keywords": ["インバーター", "人気モデル", "メーカー比較", "スペック比較", "容量別", "波形別"]
-        },
-        {
-            "title": "インバーターと発電機の連携運用",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["インバーター", "発電機", "連動運転", "入力切替", "出力安定", "発電量制御"]
-        },
-        {
-            "title": "インバーターとソーラー発電の組み合わせ",
-            "url": "https://camper-repair.net/blog/inverter1/",
-            "keywords": ["インバーター", "ソーラーパネル", "チャージコントローラー", "バッテリー充電", "連携運用", "出力安定化"]
-        },
-        {
-            "title": "インバーターの保証・サポート活用法",
-            "url": "https://camper-repair.net/blog/inverter-selection/",
-            "keywords": ["インバーター", "メーカー保証", "保証期間", "保証内容", "初期不良対応", "修理サポート"]
-        },
-        
-        # 電気・電装系関連
-        {
-            "title": "電気・電装系トラブル完全ガイド",
-            "url": "https://camper-repair.net/blog/electrical/",
-            "keywords": ["電気", "電装", "配線", "LED", "照明", "電装系"]
-        },
-        {
-            "title": "ソーラーパネル・電気システム連携",
-            "url": "https://camper-repair.net/blog/electrical-solar-panel/",
-            "keywords": ["ソーラーパネル", "電気", "発電", "充電", "太陽光", "電装系"]
-        },
-        
-        # 基本修理・メンテナンス
-        {
-            "title": "基本修理・キャンピングカー修理の基本",
-            "url": "https://camper-repair.net/blog/risk1/",
-            "keywords": ["修理", "基本", "手順", "工具", "部品", "故障", "メンテナンス"]
-        },
-        {
-            "title": "定期点検・定期点検とメンテナンス",
-            "url": "https://camper-repair.net/battery-selection/",
-            "keywords": ["点検", "メンテナンス", "定期", "予防", "保守", "チェック", "定期点検"]
-        },
-        
-        # その他のカテゴリ
-        {
-            "title": "ルーフベント・換気扇の選び方",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["ルーフベント", "換気扇", "ファン", "換気", "ベント"]
-        },
-        {
-            "title": "トイレ・カセットトイレのトラブル対処",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["トイレ", "カセット", "マリン", "フラッパー", "トイレ"]
-        },
-                 {
-             "title": "水道ポンプ・給水システム",
-             "url": "https://camper-repair.net/blog/repair1/",
-             "keywords": ["水道", "ポンプ", "給水", "水", "水道ポンプ"]
-         },
-         {
-             "title": "水道ポンプ完全ガイド",
-             "url": "https://camper-repair.net/blog/water-pump/",
-             "keywords": ["水道ポンプ", "給水ポンプ", "ポンプ", "水道", "給水", "水", "圧力", "流量"]
-         },
-         {
-             "title": "水道ポンプの種類と選び方",
-             "url": "https://camper-repair.net/blog/water-pump-selection/",
-             "keywords": ["水道ポンプ", "種類", "選び方", "圧力式", "流量式", "DCポンプ", "ACポンプ"]
-         },
-         {
-             "title": "水道ポンプの取り付け・設置方法",
-             "url": "https://camper-repair.net/blog/water-pump-installation/",
-             "keywords": ["水道ポンプ", "取り付け", "設置", "配管", "配線", "固定", "アース"]
-         },
-         {
-             "title": "水道ポンプのトラブル・故障事例",
-             "url": "https://camper-repair.net/blog/water-pump-trouble/",
-             "keywords": ["水道ポンプ", "故障", "トラブル", "水が出ない", "圧力不足", "異音", "過熱"]
-         },
-         {
-             "title": "水道ポンプのメンテナンス方法",
-             "url": "https://camper-repair.net/blog/water-pump-maintenance/",
-             "keywords": ["水道ポンプ", "メンテナンス", "定期点検", "清掃", "フィルター", "オイル交換"]
-         },
-         {
-             "title": "水道ポンプとタンクの関係",
-             "url": "https://camper-repair.net/blog/water-pump-tank/",
-             "keywords": ["水道ポンプ", "タンク", "給水タンク", "容量", "水位", "空焚き防止"]
-         },
-         {
-             "title": "水道ポンプの配管・配線工事",
-             "url": "https://camper-repair.net/blog/water-pump-piping/",
-             "keywords": ["水道ポンプ", "配管", "配線", "工事", "ケーブル", "ヒューズ", "スイッチ"]
-         },
-         {
-             "title": "水道ポンプの省エネ運用",
-             "url": "https://camper-repair.net/blog/water-pump-energy/",
-             "keywords": ["水道ポンプ", "省エネ", "消費電力", "効率", "運転時間", "自動停止"]
-         },
-         {
-             "title": "水道ポンプのDIY修理術",
-             "url": "https://camper-repair.net/blog/water-pump-diy/",
-             "keywords": ["水道ポンプ", "DIY", "修理", "分解", "部品交換", "調整"]
-         },
-         {
-             "title": "水道ポンプの人気モデル比較",
-             "url": "https://camper-repair.net/blog/water-pump-comparison/",
-             "keywords": ["水道ポンプ", "人気モデル", "比較", "スペック", "価格", "メーカー"]
-         },
-        {
-            "title": "冷蔵庫・冷凍システム",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["冷蔵庫", "冷凍", "コンプレッサー", "冷蔵"]
-        },
-        {
-            "title": "ガスシステム・FFヒーター",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["ガス", "コンロ", "ヒーター", "FF", "ガスシステム"]
-        },
-        # 雨漏り関連（20テーマ）
-        {
-            "title": "雨漏り完全ガイド",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["雨漏り", "屋根防水", "シーリング", "パッキン", "ウインドウ周り", "天窓"]
-        },
-        {
-            "title": "雨漏りしやすい箇所と見分け方",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["雨漏り箇所", "屋根継ぎ目", "ウインドウ", "ドア", "ルーフベント", "天窓"]
-        },
-        {
-            "title": "雨漏り点検のコツと頻度",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["雨漏り点検", "目視点検", "シーリングチェック", "パッキン硬化", "隙間確認"]
-        },
-        {
-            "title": "雨漏り応急処置の方法",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["応急処置", "防水テープ", "ブルーシート", "シーリング材", "パテ", "止水スプレー"]
-        },
-        {
-            "title": "雨漏りのDIY補修術",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["DIY補修", "シーリング打ち直し", "防水テープ貼付", "パッキン交換", "コーキング"]
-        },
-        {
-            "title": "プロに依頼するべき雨漏り修理",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["プロ修理", "専門業者", "診断機器", "調査手法", "補修提案", "見積もり"]
-        },
-        {
-            "title": "屋根防水の見直しポイント",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["屋根防水", "防水塗料", "トップコート", "シーリング材", "ジョイント部", "パネル接合部"]
-        },
-        {
-            "title": "シーリング材の選び方と施工",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["シーリング材", "種類比較", "ウレタン系", "シリコン系", "ブチル系", "耐久性"]
-        },
-        {
-            "title": "ウインドウ・天窓の防水対策",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["ウインドウ", "天窓", "ゴムパッキン", "パッキン交換", "シーリング", "結露防止"]
-        },
-        {
-            "title": "ルーフベント・サイドオーニングの漏水防止",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["ルーフベント", "サイドオーニング", "取付部", "シーリング補修", "防水テープ", "構造確認"]
-        },
-        {
-            "title": "配線取り出し部の雨対策",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["配線出口", "グロメット", "パッキン", "シーリング", "経年硬化", "結束バンド"]
-        },
-        {
-            "title": "経年劣化による雨漏り原因",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["経年劣化", "パッキン硬化", "シーリングひび割れ", "コーキング剥がれ", "樹脂部品変形"]
-        },
-        {
-            "title": "雨漏りと結露の違い",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["雨漏り", "結露", "現象比較", "発生タイミング", "場所の違い", "水滴の性状"]
-        },
-        {
-            "title": "カビ・悪臭防止と室内換気",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["カビ", "悪臭", "湿度管理", "雨漏り", "室内換気", "換気扇", "ルーフベント"]
-        },
-        {
-            "title": "雨漏りの再発防止策",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["再発防止", "予防点検", "定期シーリング補修", "パッキン交換", "塗装メンテナンス"]
-        },
-        {
-            "title": "雨漏り補修後の確認ポイント",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["補修確認", "漏水チェック", "水かけ試験", "シーリング乾燥", "補修跡観察"]
-        },
-        {
-            "title": "DIYでできる雨漏り対策グッズ",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["防水テープ", "シーリング材", "パテ", "防水スプレー", "ブルーシート", "コーキングガン"]
-        },
-        {
-            "title": "雨漏りのプロ診断・高精度調査法",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["プロ診断", "散水テスト", "サーモグラフィ", "蛍光剤", "漏水検知機", "音響調査"]
-        },
-        {
-            "title": "雨漏りと保険・保証制度",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["保険適用", "車両保険", "雨漏り補償", "修理保証", "自然災害対応", "補修範囲"]
-        },
-        {
-            "title": "雨漏りトラブル体験談・事例集",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["雨漏り体験談", "修理事例", "失敗例", "DIY体験", "プロ修理体験", "再発例"]
-        },
-        {
-            "title": "雨漏りトラブルを未然に防ぐ習慣",
-            "url": "https://camper-repair.net/blog/rain-leak/",
-            "keywords": ["予防習慣", "定期点検", "屋根掃除", "排水路確認", "パッキン保湿", "シーリング補修"]
-        },
-        {
-            "title": "異音・騒音対策",
-            "url": "https://camper-repair.net/blog/repair1/",
-            "keywords": ["異音", "音", "騒音", "振動", "ノイズ"]
-                 }
-     ]
-    
-    # テキストデータからURLが見つからない場合のみフォールバックを使用
-    if not blog_links:
-        # フォールバック用のブログリンクを使用
-        blog_links = fallback_blog_links
-    
-    relevant_blogs = []
-    for blog in blog_links:
-        score = 0
-        
-        # テキストデータから抽出したURLかどうかを判定
-        is_extracted_url = blog["url"] in extracted_urls
-        
-        # 質問のキーワードとの直接マッチング（最高優先度）
-        for query_keyword in query_keywords:
-            if query_keyword in blog["title"].lower():
-                score += 20  # 質問キーワードがタイトルに含まれる場合は高スコア
-            if query_keyword in blog["url"].lower():
-                score += 15  # 質問キーワードがURLに含まれる場合も高スコア
-            if query_keyword in blog["keywords"]:
-                score += 10  # 質問キーワードがキーワードに含まれる場合
-        
-        # 基本キーワードマッチング
-        for keyword in blog["keywords"]:
-            if keyword in query_lower:
-                score += 1
-        
-        # テキストデータから抽出したキーワードとのマッチング
-        for extracted_keyword in extracted_keywords:
-            if extracted_keyword in blog["keywords"]:
-                score += 2  # テキストデータからのキーワードは重みを高く
-        
-        # カテゴリマッチング（より高い重み）
-        for extracted_keyword in extracted_keywords:
-            if extracted_keyword in blog["title"].lower():
-                score += 3
-        
-        # カテゴリー判定による重み付け
-        blog_category = determine_blog_category(blog, query)
-        query_category = determine_query_category(query)
-        
-        # カテゴリーが一致する場合は大幅にスコアを上げる
-        if blog_category == query_category:
-            score += 10
+            # カテゴリーごとに表示
+            for category, blogs in categorized_blogs.items():
+                if blogs:
+                    blog_section += f"### {category}\n"
+                    for i, blog in enumerate(blogs[:3], 1):  # 各カテゴリー最大3件
+                        # テキストデータから抽出したURLかどうかを判定
+                        is_extracted = blog['url'] in knowledge_base.blog_titles
+                        source_indicator = "📄" if is_extracted else "📖"
+                        blog_section += f"**{i}. {blog['title']}** {source_indicator}\n"
+                        blog_section += f"   {blog['url']}\n\n"
         
-        # テキストデータから抽出したURLの場合は大幅にスコアを上げる
-        if is_extracted_url:
-            score += 50  # テキストデータからのURLを最優先
+        if stream:
+            # 参考にした事例・関連ブログは回答の生成を待たずに先に表示する
+            show_retrieved_knowledge(relevant_knowledge)
+            if blog_section:
+                st.markdown(blog_section)
         
-        if score > 0:
-            relevant_blogs.append((blog, score))
-    
-    relevant_blogs.sort(key=lambda x: x[1], reverse=True)
-    
-    # テキストデータから抽出したURLを最優先で返す
-    result_blogs = []
-    added_urls = set()  # 追加済みURLを追跡
-    
-    # まず、テキストデータから抽出したURLを含むブログを最優先で追加
-    for blog, score in relevant_blogs:
-        if blog["url"] in extracted_urls and blog["url"] not in added_urls:
-            result_blogs.append(blog)
-            added_urls.add(blog["url"])
-    
-    # 次に、その他の関連ブログを追加（重複を避ける）
-    for blog, score in relevant_blogs:
-        if blog["url"] not in added_urls and len(result_blogs) < 5:
-            result_blogs.append(blog)
-            added_urls.add(blog["url"])
-    
-    # 最終的に重複を除去してユニークなURLのみを返す
-    final_blogs = []
-    final_urls = set()
-    
-    for blog in result_blogs:
-        if blog["url"] not in final_urls:
-            final_blogs.append(blog)
-            final_urls.add(blog["url"])
-    
-    # 最大5件まで返す（一つ一つ個別のブログ）
-    return final_blogs[:5]
-
-def generate_ai_response_with_knowledge(prompt, knowledge_base):
-    """知識ベースを活用したAI回答を生成"""
-    try:
         openai_api_key = os.getenv("OPENAI_API_KEY")
         if not openai_api_key:
-            return "⚠️ **OpenAI APIキーが設定されていません。**\n\nAPIキーを設定してから再度お試しください。\n\n## 🛠️ 岡山キャンピングカー修理サポートセンター\n専門的な修理やメンテナンスが必要な場合は、お気軽にご相談ください：\n\n**🏢 岡山キャンピングカー修理サポートセンター**\n📍 **住所**: 〒700-0921 岡山市北区東古松485-4 2F\n📞 **電話**: 086-206-6622\n📧 **お問合わせ**: https://camper-repair.net/contact/\n🌐 **ホームページ**: https://camper-repair.net/blog/\n⏰ **営業時間**: 年中無休（9:00～21:00）\n※不在時は折り返しお電話差し上げます。\n\n**（運営）株式会社リクエストプラス**"
+            return finish("⚠️ **OpenAI APIキーが設定されていません。**\n\nAPIキーを設定してから再度お試しください。\n\n## 🛠️ 岡山キャンピングカー修理サポートセンター\n専門的な修理やメンテナンスが必要な場合は、お気軽にご相談ください：\n\n**🏢 岡山キャンピングカー修理サポートセンター**\n📍 **住所**: 〒700-0921 岡山市北区東古松485-4 2F\n📞 **電話**: 086-206-6622\n📧 **お問合わせ**: https://camper-repair.net/contact/\n🌐 **ホームページ**: https://camper-repair.net/blog/\n⏰ **営業時間**: 年中無休（9:00～21:00）\n※不在時は折り返しお電話差し上げます。\n\n**（運営）株式会社リクエストプラス**")
         
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7,
-            openai_api_key=openai_api_key
-        )
-        
-        # 関連知識を抽出
-        relevant_knowledge = extract_relevant_knowledge(prompt, knowledge_base)
-        blog_links = get_relevant_blog_links(prompt, knowledge_base)
+        llm = get_chat_model(openai_api_key, model="gpt-4o-mini", temperature=0.7)
         
         # 知識ベースの内容をシステムプロンプトに含める
         knowledge_context = ""
@@ -1547,7 +575,10 @@ def generate_ai_response_with_knowledge(prompt, knowledge_base):
             HumanMessage(content=prompt)
         ]
         
-        response = llm.invoke(messages)
+        if stream:
+            answer = st.write_stream(iter_text_chunks(llm, messages))
+        else:
+            answer = llm.invoke(messages).content
         
         # 岡山キャンピングカー修理サポートセンター情報を追加
         support_section = "\n\n## 🛠️ 岡山キャンピングカー修理サポートセンター\n"
@@ -1573,60 +604,12 @@ def generate_ai_response_with_knowledge(prompt, knowledge_base):
         support_section += "• 希望する対応方法\n"
         support_section += "をお教えください。\n\n"
         
-        response.content += support_section
-        
-        # 関連ブログを追加
-        if blog_links:
-            blog_section = "\n\n## 📚 関連ブログ・参考記事\n"
-            blog_section += "より詳しい情報や実践的な対処法については、以下の記事もご参考ください：\n\n"
-            
-            # デバッグ情報（開発時のみ表示）
-            # blog_section += f"**🔍 抽出されたキーワード**: {', '.join(all_keywords[:5])}\n\n"
-            
-            # 重複するURLを除去して、ユニークなURLのみを表示
-            unique_blogs = []
-            seen_urls = set()
-            
-            for blog in blog_links:
-                # URLにカンマが含まれている場合は分割
-                urls = blog['url'].split(',')
-                
-                for url in urls:
-                    url = url.strip()  # 前後の空白を除去
-                    if url and url not in seen_urls:
-                        # 分割されたURLごとに個別のブログエントリを作成
-                        unique_blogs.append({
-                            'title': blog['title'],
-                            'url': url,
-                            'keywords': blog['keywords']
-                        })
-                        seen_urls.add(url)
-            
-            # カテゴリーごとにブログを分類
-            categorized_blogs = {}
-            for blog in unique_blogs:
-                category = determine_blog_category(blog, prompt)
-                if category not in categorized_blogs:
-                    categorized_blogs[category] = []
-                categorized_blogs[category].append(blog)
-            
-            # カテゴリーごとに表示
-            for category, blogs in categorized_blogs.items():
-                if blogs:
-                    blog_section += f"### {category}\n"
-                    for i, blog in enumerate(blogs[:3], 1):  # 各カテゴリー最大3件
-                        # テキストデータから抽出したURLかどうかを判定
-                        is_extracted = blog['url'] in extracted_urls if 'extracted_urls' in locals() else False
-                        source_indicator = "📄" if is_extracted else "📖"
-                        blog_section += f"**{i}. {blog['title']}** {source_indicator}\n"
-                        blog_section += f"   {blog['url']}\n\n"
-            
-            response.content += blog_section
-        
-        return response.content
+        if stream:
+            st.markdown(support_section)
+        return blog_section + answer + support_section
         
     except Exception as e:
-        return f"""⚠️ **エラーが発生しました: {str(e)}**
+        return finish(f"""⚠️ **エラーが発生しました: {str(e)}**
 
 申し訳ございませんが、一時的に回答を生成できませんでした。
 しばらく時間をおいてから再度お試しください。
@@ -1650,7 +633,16 @@ def generate_ai_response_with_knowledge(prompt, knowledge_base):
 • 雨漏り・防水工事
 • 各種家電・設備の修理
 • 定期点検・メンテナンス
-• 緊急対応・出張修理（要相談）"""
+• 緊急対応・出張修理（要相談）""")
+
+@st.cache_resource(ttl=NOTION_DATA_TTL, show_spinner=False)
+def load_notion_symptom_data(api_key):
+    """診断データ・修理ケースと症状の索引をまとめて読み込む（TTLの間は再実行でも使い回す）"""
+    diagnostic_data = load_notion_diagnostic_data()
+    repair_cases = load_notion_repair_cases()
+    # 症状の索引は読み込み時に一度だけ作成し、AI診断の照合で使い回す
+    symptom_index = SymptomIndex((diagnostic_data or {}).get("nodes", []), repair_cases)
+    return diagnostic_data, repair_cases, symptom_index
 
 def run_diagnostic_flow():
     """対話式症状診断（NotionDB連携版）"""
@@ -1660,14 +652,16 @@ def run_diagnostic_flow():
     notion_status = "❌ 未接続"
     diagnostic_data = None
     repair_cases = []
+    symptom_index = SymptomIndex([], [])
     
     if notion_api_key:
         try:
-            diagnostic_data = load_notion_diagnostic_data()
-            repair_cases = load_notion_repair_cases()
+            diagnostic_data, repair_cases, symptom_index = load_notion_symptom_data(notion_api_key)
             if diagnostic_data or repair_cases:
                 notion_status = "✅ 接続済み"
             else:
+                # データが取れなかった結果はキャッシュせず、次の操作で読み込み直す
+                load_notion_symptom_data.clear()
                 notion_status = "⚠️ データなし"
         except Exception as e:
             notion_status = f"❌ エラー: {str(e)[:50]}"
@@ -1688,13 +682,13 @@ def run_diagnostic_flow():
     )
     
     if diagnostic_mode == "🤖 AI診断（推奨）":
-        run_ai_diagnostic(diagnostic_data, repair_cases)
+        run_ai_diagnostic(diagnostic_data, repair_cases, symptom_index)
     elif diagnostic_mode == "📋 対話式診断":
         run_interactive_diagnostic(diagnostic_data, repair_cases)
     else:
         run_detailed_diagnostic(diagnostic_data, repair_cases)
 
-def run_ai_diagnostic(diagnostic_data, repair_cases):
+def run_ai_diagnostic(diagnostic_data, repair_cases, symptom_index):
     """AI診断モード（リレーション活用版）"""
     st.markdown("### 🤖 AI診断")
     st.markdown("症状を詳しく説明してください。最適な診断と解決策を提案します。")
@@ -1712,8 +706,11 @@ def run_ai_diagnostic(diagnostic_data, repair_cases):
                 # 知識ベースを読み込み
                 knowledge_base = load_knowledge_base()
                 
+                # 症状の索引で関連する診断ノード・修理ケースを一度だけ照合
+                matches = symptom_index.search(symptoms_input)
+                
                 # リレーションデータを活用した高度なコンテキスト作成
-                context = create_relation_context(symptoms_input, diagnostic_data, repair_cases)
+                context = create_relation_context(matches)
                 
                 # 診断プロンプトを作成
                 diagnosis_prompt = f"""症状: {symptoms_input}
@@ -1728,33 +725,20 @@ def run_ai_diagnostic(diagnostic_data, repair_cases):
 4. **具体的な修理手順**
 5. **予防メンテナンスのアドバイス**"""
                 
-                # AI診断を実行
-                diagnosis_result = generate_ai_response_with_knowledge(diagnosis_prompt, knowledge_base)
-                
+                # AI診断を実行（結果は生成しながら表示する）
                 st.markdown("## 📋 AI診断結果")
-                st.markdown(diagnosis_result)
+                generate_ai_response_with_knowledge(diagnosis_prompt, knowledge_base, stream=True)
                 
                 # リレーションデータの詳細表示
-                show_relation_details(symptoms_input, diagnostic_data, repair_cases)
+                show_relation_details(matches)
         else:
             st.warning("症状を入力してください。")
 
-def create_relation_context(symptoms_input, diagnostic_data, repair_cases):
-    """リレーションデータを活用したコンテキストを作成"""
+def create_relation_context(matches):
+    """リレーションデータを活用したコンテキストを作成（matches: SymptomIndex.search() の結果）"""
     context = ""
-    
-    # 症状に基づいて関連する診断ノードを特定
-    relevant_nodes = []
-    if diagnostic_data and diagnostic_data.get("nodes"):
-        for node in diagnostic_data["nodes"]:
-            if any(symptom in symptoms_input.lower() for symptom in node.get("symptoms", [])):
-                relevant_nodes.append(node)
-    
-    # 関連する修理ケースを特定
-    relevant_cases = []
-    for case in repair_cases:
-        if any(symptom in symptoms_input.lower() for symptom in case.get("symptoms", [])):
-            relevant_cases.append(case)
+    relevant_nodes = matches["nodes"]
+    relevant_cases = matches["cases"]
     
     # コンテキストの構築
     if relevant_nodes:
@@ -1791,41 +775,32 @@ def create_relation_context(symptoms_input, diagnostic_data, repair_cases):
     
     return context
 
-def show_relation_details(symptoms_input, diagnostic_data, repair_cases):
-    """リレーションデータの詳細を表示"""
+def show_relation_details(matches):
+    """リレーションデータの詳細を表示（matches: SymptomIndex.search() の結果）"""
     st.markdown("## 🔗 リレーションデータ詳細")
     
     # 関連診断ノードの表示
-    if diagnostic_data and diagnostic_data.get("nodes"):
-        relevant_nodes = []
-        for node in diagnostic_data["nodes"]:
-            if any(symptom in symptoms_input.lower() for symptom in node.get("symptoms", [])):
-                relevant_nodes.append(node)
-        
-        if relevant_nodes:
-            st.markdown("### 📊 関連診断ノード")
-            for node in relevant_nodes[:3]:
-                with st.expander(f"🔹 {node['title']} ({node['category']})"):
-                    st.write("**症状**:", ", ".join(node["symptoms"]))
-                    
-                    if node.get("related_cases"):
-                        st.write("**関連修理ケース**:")
-                        for case in node["related_cases"][:2]:
-                            st.write(f"  • {case['title']}: {case['solution'][:100]}...")
-                    
-                    if node.get("related_items"):
-                        st.write("**関連部品・工具**:")
-                        for item in node["related_items"][:3]:
-                            price_info = f" (¥{item['price']})" if item.get('price') else ""
-                            supplier_info = f" - {item['supplier']}" if item.get('supplier') else ""
-                            st.write(f"  • {item['name']}{price_info}{supplier_info}")
+    relevant_nodes = matches["nodes"]
+    if relevant_nodes:
+        st.markdown("### 📊 関連診断ノード")
+        for node in relevant_nodes[:3]:
+            with st.expander(f"🔹 {node['title']} ({node['category']})"):
+                st.write("**症状**:", ", ".join(node["symptoms"]))
+                
+                if node.get("related_cases"):
+                    st.write("**関連修理ケース**:")
+                    for case in node["related_cases"][:2]:
+                        st.write(f"  • {case['title']}: {case['solution'][:100]}...")
+                
+                if node.get("related_items"):
+                    st.write("**関連部品・工具**:")
+                    for item in node["related_items"][:3]:
+                        price_info = f" (¥{item['price']})" if item.get('price') else ""
+                        supplier_info = f" - {item['supplier']}" if item.get('supplier') else ""
+                        st.write(f"  • {item['name']}{price_info}{supplier_info}")
     
     # 関連修理ケースの表示
-    relevant_cases = []
-    for case in repair_cases:
-        if any(symptom in symptoms_input.lower() for symptom in case.get("symptoms", [])):
-            relevant_cases.append(case)
-    
+    relevant_cases = matches["cases"]
     if relevant_cases:
         st.markdown("### 🔧 関連修理ケース")
         for case in relevant_cases[:3]:
@@ -1959,14 +934,14 @@ def run_interactive_diagnostic(diagnostic_data, repair_cases):
             if st.button("🔍 診断開始", type="primary"):
                 with st.spinner("診断中..."):
                     diagnosis_prompt = f"{selected_category}の症状: {', '.join(selected_symptoms)}"
+                    analysis = analyze_query(diagnosis_prompt)
                     knowledge_base = load_knowledge_base()
-                    diagnosis_result = generate_ai_response_with_knowledge(diagnosis_prompt, knowledge_base)
                     
                     st.markdown("## 📋 診断結果")
-                    st.markdown(diagnosis_result)
+                    generate_ai_response_with_knowledge(analysis, knowledge_base, stream=True)
                     
                     # 関連ブログの表示
-                    blog_links = get_relevant_blog_links(diagnosis_prompt, knowledge_base)
+                    blog_links = get_relevant_blog_links(analysis, knowledge_base)
                     if blog_links:
                         st.markdown("## 📚 関連ブログ")
                         display_blog_links(blog_links, diagnosis_prompt)
@@ -2064,13 +1039,11 @@ def run_detailed_diagnostic(diagnostic_data, repair_cases):
 def test_notion_connection():
     """NotionDB接続をテスト"""
     try:
-        client = initialize_notion_client()
+        # ユーザー情報を取得して接続をテスト（キャッシュを使わない）
+        client = initialize_notion_client(force_check=True)
         if not client:
             return False, "Notionクライアントの初期化に失敗"
         
-        # ユーザー情報を取得して接続をテスト
-        user = client.users.me()
-        
         # データベース接続テスト
         test_results = {}
         
@@ -2176,7 +1149,7 @@ def main():
     """, unsafe_allow_html=True)
     
     # ヘッダー
-        st.markdown("""
+    st.markdown("""
     <div class="main-header">
         <h1 style="font-size: 1.3rem; margin-bottom: 0.5rem;">🚐 キャンピングカー修理専門AI相談</h1>
         <p style="font-size: 0.8rem; margin-top: 0;">豊富な知識ベースを活用した専門的な修理・メンテナンスアドバイス</p>
@@ -2215,9 +1188,8 @@ def main():
             
             # AI回答を生成
             with st.chat_message("assistant", avatar="https://camper-repair.net/blog/wp-content/uploads/2025/05/dummy_staff_01-150x138-1.png"):
-                with st.spinner("専門知識を活用して回答を生成中..."):
-                    response = generate_ai_response_with_knowledge(prompt, knowledge_base)
-                    st.markdown(response)
+                # 回答はトークンが届くたびに表示する
+                response = generate_ai_response_with_knowledge(prompt, knowledge_base, stream=True)
                 
                 # AIメッセージを追加
                 st.session_state.messages.append({"role": "assistant", "content": response})
@@ -2251,9 +1223,7 @@ def main():
             
             # 追加質問の回答を生成
             with st.chat_message("assistant", avatar="https://camper-repair.net/blog/wp-content/uploads/2025/05/dummy_staff_01-150x138-1.png"):
-                with st.spinner("追加質問への回答を生成中..."):
-                    additional_response = generate_ai_response_with_knowledge(additional_question, knowledge_base)
-                    st.markdown(additional_response)
+                additional_response = generate_ai_response_with_knowledge(additional_question, knowledge_base, stream=True)
             
             # AI回答をチャット履歴に追加
             st.session_state.messages.append({"role": "assistant", "content": additional_response})
@@ -2385,7 +1355,7 @@ def show_system_info():
     st.markdown("#### 📚 知識ベース状況")
     knowledge_base = load_knowledge_base()
     if knowledge_base:
-        st.success(f"✅ 知識ベース: 読み込み成功 ({len(knowledge_base)}件のファイル)")
+        st.success(f"✅ 知識ベース: 読み込み成功 ({len(knowledge_base)}件のファイル・版 {knowledge_base.version})")
         for category in list(knowledge_base.keys())[:5]:  # 最初の5件を表示
             st.write(f"  - {category}")
         if len(knowledge_base) > 5:
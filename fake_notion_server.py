@@ -0,0 +1,538 @@
+# fake_notion_server.py
+"""
+オフライン計測・テスト用のローカル疑似Notion APIサーバー
+
+各スクリプトが使うAPIのサブセットだけを実装する:
+  users.me / databases.query（カーソル・filter・sorts）/ databases.retrieve /
+  pages.retrieve / pages.create / pages.update
+
+リポジトリのCSV/JSONフィクスチャから3つのDBを作成し、応答遅延と
+429（rate_limited）の注入を設定できる。スキーマの検証は行わず、
+作成・更新されたプロパティはそのまま保存する。
+
+使い方:
+  python fake_notion_server.py --port 8765 --latency 0.05 --rate-limit-every 20
+  NOTION_BASE_URL=http://127.0.0.1:8765 python notion_linker_jp.py
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NODE_DB_ID = "fake-node-db"
+CASE_DB_ID = "fake-case-db"
+ITEM_DB_ID = "fake-item-db"
+
+MAX_PAGE_SIZE = 100
+
+TEXT_TYPES = ("title", "rich_text")
+PROPERTY_TYPES = ("title", "rich_text", "checkbox", "select", "multi_select", "number", "relation", "url")
+
+
+class NotionAPIError(Exception):
+    """Notion形式のエラー応答（status, code, message）"""
+
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _text_segment(content):
+    return {"type": "text", "text": {"content": content, "link": None}, "plain_text": content}
+
+
+def _normalize_property(value):
+    """リクエスト形式のプロパティ値を応答形式（type付き・plain_text付き）に変換"""
+    prop_type = value.get("type") or next((t for t in PROPERTY_TYPES if t in value), None)
+    if prop_type not in PROPERTY_TYPES:
+        raise NotionAPIError(400, "validation_error", f"Unsupported property value: {value}")
+    raw = value.get(prop_type)
+    if prop_type in TEXT_TYPES:
+        raw = [_text_segment(s.get("plain_text") or s.get("text", {}).get("content", "")) for s in raw or []]
+    elif prop_type == "select":
+        raw = {"name": raw.get("name", "")} if raw else None
+    elif prop_type == "multi_select":
+        raw = [{"name": option.get("name", "")} for option in raw or []]
+    elif prop_type == "relation":
+        raw = [{"id": relation["id"]} for relation in raw or []]
+    return {"type": prop_type, prop_type: raw}
+
+
+def _property_text(prop):
+    prop_type = prop.get("type")
+    value = prop.get(prop_type)
+    if prop_type in TEXT_TYPES:
+        return "".join(s.get("plain_text", "") for s in value or [])
+    if prop_type == "select":
+        return value.get("name", "") if value else ""
+    if prop_type == "multi_select":
+        return ",".join(option.get("name", "") for option in value or [])
+    if value is None:
+        return ""
+    return str(value)
+
+
+def _match_condition(prop, condition):
+    prop_type = prop.get("type")
+    value = prop.get(prop_type)
+    (operator, operand), = condition.items()
+
+    if operator == "is_empty":
+        return value in (None, [], "", False) or _property_text(prop) == ""
+    if operator == "is_not_empty":
+        return not _match_condition(prop, {"is_empty": True})
+
+    if prop_type in TEXT_TYPES or prop_type in ("url", "select"):
+        text = _property_text(prop)
+        # Notionのテキスト比較は大文字・小文字を区別しない
+        folded, target = text.casefold(), str(operand).casefold()
+        if operator == "equals":
+            return folded == target
+        if operator == "does_not_equal":
+            return folded != target
+        if operator == "contains":
+            return target in folded
+        if operator == "does_not_contain":
+            return target not in folded
+        if operator == "starts_with":
+            return folded.startswith(target)
+        if operator == "ends_with":
+            return folded.endswith(target)
+    elif prop_type == "checkbox":
+        if operator == "equals":
+            return bool(value) == operand
+        if operator == "does_not_equal":
+            return bool(value) != operand
+    elif prop_type == "number" and value is not None:
+        comparisons = {
+            "equals": value == operand,
+            "does_not_equal": value != operand,
+            "greater_than": value > operand,
+            "less_than": value < operand,
+            "greater_than_or_equal_to": value >= operand,
+            "less_than_or_equal_to": value <= operand,
+        }
+        if operator in comparisons:
+            return comparisons[operator]
+    elif prop_type in ("multi_select", "relation"):
+        key = "name" if prop_type == "multi_select" else "id"
+        names = {entry.get(key) for entry in value or []}
+        if operator == "contains":
+            return operand in names
+        if operator == "does_not_contain":
+            return operand not in names
+    else:
+        return False
+
+    raise NotionAPIError(400, "validation_error", f"Unsupported filter: {prop_type}.{operator}")
+
+
+def _match_filter(page, notion_filter):
+    if not notion_filter:
+        return True
+    if "and" in notion_filter:
+        return all(_match_filter(page, f) for f in notion_filter["and"])
+    if "or" in notion_filter:
+        return any(_match_filter(page, f) for f in notion_filter["or"])
+    if "timestamp" in notion_filter:
+        timestamp = notion_filter["timestamp"]
+        (operator, operand), = notion_filter[timestamp].items()
+        value = page[timestamp]
+        comparisons = {
+            "equals": value == operand,
+            "after": value > operand,
+            "before": value < operand,
+            "on_or_after": value >= operand,
+            "on_or_before": value <= operand,
+        }
+        if operator not in comparisons:
+            raise NotionAPIError(400, "validation_error", f"Unsupported filter: {timestamp}.{operator}")
+        return comparisons[operator]
+
+    prop_name = notion_filter.get("property")
+    prop = page["properties"].get(prop_name)
+    if prop is None:
+        raise NotionAPIError(400, "validation_error", f"Could not find property with name or id: {prop_name}")
+    conditions = [value for key, value in notion_filter.items() if key != "property"]
+    if len(conditions) != 1:
+        raise NotionAPIError(400, "validation_error", f"Invalid filter: {notion_filter}")
+    return _match_condition(prop, conditions[0])
+
+
+class FakeNotionStore:
+    """疑似Notionのデータ（DBごとのページ一覧）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.databases = {}   # DB ID -> {"title": str, "pages": [page_id, ...]}
+        self.pages = {}       # ページID -> ページオブジェクト
+
+    def add_database(self, database_id, title):
+        self.databases[database_id] = {"title": title, "pages": []}
+
+    def create_page(self, parent, properties):
+        database_id = (parent or {}).get("database_id")
+        with self.lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                raise NotionAPIError(404, "object_not_found", f"Could not find database with ID: {database_id}")
+            now = _now()
+            page = {
+                "object": "page",
+                "id": str(uuid.uuid4()),
+                "created_time": now,
+                "last_edited_time": now,
+                "archived": False,
+                "parent": {"type": "database_id", "database_id": database_id},
+                "properties": {name: _normalize_property(value) for name, value in (properties or {}).items()},
+            }
+            self.pages[page["id"]] = page
+            database["pages"].append(page["id"])
+            return page
+
+    def retrieve_page(self, page_id):
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                raise NotionAPIError(404, "object_not_found", f"Could not find page with ID: {page_id}")
+            return page
+
+    def update_page(self, page_id, properties=None, archived=None):
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                raise NotionAPIError(404, "object_not_found", f"Could not find page with ID: {page_id}")
+            for name, value in (properties or {}).items():
+                page["properties"][name] = _normalize_property(value)
+            if archived is not None:
+                page["archived"] = bool(archived)
+            page["last_edited_time"] = _now()
+            return page
+
+    def retrieve_database(self, database_id):
+        with self.lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                raise NotionAPIError(404, "object_not_found", f"Could not find database with ID: {database_id}")
+            # プロパティ定義はページの内容から推定する
+            properties = {}
+            for page_id in database["pages"]:
+                for name, prop in self.pages[page_id]["properties"].items():
+                    properties.setdefault(name, {"id": name, "name": name, "type": prop["type"], prop["type"]: {}})
+            return {
+                "object": "database",
+                "id": database_id,
+                "title": [_text_segment(database["title"])],
+                "properties": properties,
+            }
+
+    def query_database(self, database_id, body):
+        page_size = min(int(body.get("page_size") or MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+        start = int(body.get("start_cursor") or 0)
+        with self.lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                raise NotionAPIError(404, "object_not_found", f"Could not find database with ID: {database_id}")
+            pages = [self.pages[page_id] for page_id in database["pages"]]
+            pages = [page for page in pages if not page["archived"] and _match_filter(page, body.get("filter"))]
+            for sort in reversed(body.get("sorts") or []):
+                if "timestamp" in sort:
+                    key = lambda page, ts=sort["timestamp"]: page[ts]
+                else:
+                    key = lambda page, name=sort["property"]: _property_text(page["properties"].get(name, {}))
+                pages.sort(key=key, reverse=sort.get("direction") == "descending")
+            end = start + page_size
+            has_more = end < len(pages)
+            return {
+                "object": "list",
+                "results": pages[start:end],
+                "has_more": has_more,
+                "next_cursor": str(end) if has_more else None,
+            }
+
+
+# === フィクスチャからの初期データ作成 ===
+def _text(value):
+    return {"rich_text": [{"text": {"content": value}}]}
+
+
+def _read_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _node_properties_from_fixtures(base_dir):
+    """mock_diagnostic_nodes.json と diag_nodes_linked_5nodes.csv から診断ノードを作成"""
+    nodes = []
+    with open(os.path.join(base_dir, "mock_diagnostic_nodes.json"), "r", encoding="utf-8") as f:
+        for group in json.load(f):
+            for node_id, node in group.items():
+                nodes.append({
+                    "ノードID": {"title": [{"text": {"content": node_id}}]},
+                    "質問内容": _text(node.get("question", "")),
+                    "診断結果": _text(node.get("result", "")),
+                    "カテゴリ": _text(node.get("category", "")),
+                    "開始フラグ": {"checkbox": node.get("is_start", False)},
+                    "終端フラグ": {"checkbox": node.get("is_end", False)},
+                    "次のノード": _text(", ".join(node.get("next_nodes", []))),
+                    "terminal_case_id": _text(""),
+                })
+    for row in _read_csv(os.path.join(base_dir, "diag_nodes_linked_5nodes.csv")):
+        next_ids = [f"NODE-{i}" for i in re.split(r"[,、\s]+", row.get("次の質問ID", "")) if i]
+        nodes.append({
+            "ノードID": {"title": [{"text": {"content": row["node_id"]}}]},
+            "質問内容": _text(row.get("質問内容", "")),
+            "診断結果": _text(row.get("診断結果", "")),
+            "カテゴリ": _text(row.get("カテゴリ", "")),
+            "開始フラグ": {"checkbox": False},
+            "終端フラグ": {"checkbox": row.get("終端フラグ", "").strip() in ("1", "true", "TRUE")},
+            "次のノード": _text(", ".join(next_ids)),
+            "terminal_case_id": _text(row.get("terminal_case_id", "")),
+        })
+    return nodes
+
+
+def _case_properties_from_fixtures(base_dir):
+    """修理ケースDBのCSVと battery_cases_with_keys.csv から修理ケースを作成"""
+    rows = {}
+    for name in ("修理ケースDB 24d709bb38f18039a8b3e0bec10bb7eb.csv", "battery_cases_with_keys.csv"):
+        for row in _read_csv(os.path.join(base_dir, name)):
+            case_id = row.get("terminal_case_id") or row.get("case_id") or row.get("対象名称", "")
+            rows.setdefault(case_id, row)
+
+    cases = []
+    for case_id, row in rows.items():
+        cost = re.sub(r"[^\d.]", "", row.get("推定コスト", ""))
+        cases.append({
+            "ケースID": {"title": [{"text": {"content": case_id}}]},
+            "case_id": _text(case_id),
+            "症状": _text(row.get("症状", "")),
+            "修理手順": _text(row.get("修理手順", "").replace("<br>", "\n")),
+            "必要な部品": _text(row.get("必要な部品", "")),
+            "必要な工具": _text(row.get("必要な工具", "")),
+            "難易度": _text(row.get("難易度", "")),
+            "作業時間": _text(row.get("作業時間", "")),
+            "推定コスト": {"number": float(cost) if cost else None},
+            "注意事項": _text(row.get("注意事項", "")),
+        })
+    return cases
+
+
+def _item_properties_from_fixtures(base_dir):
+    """case_items_bridge.csv の部品・工具名から部品・工具DBを作成"""
+    items = {}
+    for row in _read_csv(os.path.join(base_dir, "case_items_bridge.csv")):
+        items.setdefault(row["name"], "工具" if row.get("role") == "工具" else "その他")
+    return [
+        {"部品名": {"title": [{"text": {"content": name}}]}, "カテゴリ": {"select": {"name": category}}}
+        for name, category in items.items()
+    ]
+
+
+def _scaled(properties_list, key_prop, scale):
+    # scale > 1 のときはキー（title）に連番を付けて件数を増やす
+    for n in range(scale):
+        for properties in properties_list:
+            if n == 0:
+                yield properties
+                continue
+            copied = dict(properties)
+            key = copied[key_prop]["title"][0]["text"]["content"]
+            copied[key_prop] = {"title": [{"text": {"content": f"{key}-{n}"}}]}
+            yield copied
+
+
+def seed_from_fixtures(store, base_dir=None, scale=1):
+    """フィクスチャから診断フロー・修理ケース・部品工具の3DBを作成"""
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    seeds = (
+        (NODE_DB_ID, "診断フローDB", "ノードID", _node_properties_from_fixtures(base_dir)),
+        (CASE_DB_ID, "修理ケースDB", "ケースID", _case_properties_from_fixtures(base_dir)),
+        (ITEM_DB_ID, "部品・工具DB", "部品名", _item_properties_from_fixtures(base_dir)),
+    )
+    for database_id, title, key_prop, properties_list in seeds:
+        store.add_database(database_id, title)
+        for properties in _scaled(properties_list, key_prop, scale):
+            store.create_page({"database_id": database_id}, properties)
+    return {"NODE_DB_ID": NODE_DB_ID, "CASE_DB_ID": CASE_DB_ID, "ITEM_DB_ID": ITEM_DB_ID}
+
+
+# === HTTPサーバー ===
+ROUTES = (
+    ("GET", re.compile(r"^/v1/users/me$"), "users.me"),
+    ("POST", re.compile(r"^/v1/databases/([^/]+)/query$"), "databases.query"),
+    ("GET", re.compile(r"^/v1/databases/([^/]+)$"), "databases.retrieve"),
+    ("GET", re.compile(r"^/v1/pages/([^/]+)$"), "pages.retrieve"),
+    ("POST", re.compile(r"^/v1/pages$"), "pages.create"),
+    ("PATCH", re.compile(r"^/v1/pages/([^/]+)$"), "pages.update"),
+)
+
+
+class FakeNotionServer(ThreadingHTTPServer):
+    """疑似Notionサーバー本体（呼び出し回数と429の回数を記録）"""
+
+    daemon_threads = True
+
+    def __init__(self, address, store, latency=0.0, rate_limit_every=0, retry_after=0):
+        super().__init__(address, _Handler)
+        self.store = store
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.stats_lock = threading.Lock()
+        self.calls = Counter()        # エンドポイント名 -> 成功した呼び出し回数
+        self.rate_limited = Counter()  # エンドポイント名 -> 429を返した回数
+        self.requests = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.calls.clear()
+            self.rate_limited.clear()
+            self.requests = 0
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "calls": sum(self.calls.values()),
+                "rate_limited": sum(self.rate_limited.values()),
+                "by_endpoint": dict(self.calls),
+            }
+
+    def _should_rate_limit(self):
+        with self.stats_lock:
+            self.requests += 1
+            return self.rate_limit_every and self.requests % self.rate_limit_every == 0
+
+    def handle_api(self, method, path, body, authorized):
+        for route_method, pattern, endpoint in ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                break
+        else:
+            raise NotionAPIError(400, "invalid_request_url", f"Invalid request URL: {method} {path}")
+
+        if not authorized:
+            raise NotionAPIError(401, "unauthorized", "API token is invalid.")
+        if self.latency:
+            time.sleep(self.latency)
+        if self._should_rate_limit():
+            with self.stats_lock:
+                self.rate_limited[endpoint] += 1
+            raise NotionAPIError(429, "rate_limited", "You have been rate limited. Please try again in a few minutes.")
+
+        store = self.store
+        args = match.groups()
+        if endpoint == "users.me":
+            result = {"object": "user", "id": "fake-bot", "type": "bot", "name": "Fake Notion"}
+        elif endpoint == "databases.query":
+            result = store.query_database(args[0], body)
+        elif endpoint == "databases.retrieve":
+            result = store.retrieve_database(args[0])
+        elif endpoint == "pages.retrieve":
+            result = store.retrieve_page(args[0])
+        elif endpoint == "pages.create":
+            result = store.create_page(body.get("parent"), body.get("properties"))
+        else:
+            result = store.update_page(args[0], body.get("properties"), body.get("archived"))
+
+        with self.stats_lock:
+            self.calls[endpoint] += 1
+        return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-aliveで接続を使い回せるようにする
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        headers = {}
+        try:
+            body = json.loads(raw) if raw else {}
+            path = self.path.split("?", 1)[0]
+            authorized = self.headers.get("Authorization", "").startswith("Bearer ")
+            status, payload = 200, self.server.handle_api(method, path, body, authorized)
+        except NotionAPIError as e:
+            status = e.status
+            payload = {"object": "error", "status": e.status, "code": e.code, "message": e.message}
+            if e.status == 429:
+                headers["Retry-After"] = str(self.server.retry_after)
+        except (ValueError, KeyError, TypeError) as e:
+            status = 400
+            payload = {"object": "error", "status": 400, "code": "validation_error", "message": str(e)}
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+
+def start_fake_server(host="127.0.0.1", port=0, latency=0.0, rate_limit_every=0, retry_after=0, scale=1, seed=True):
+    """疑似Notionサーバーをバックグラウンドスレッドで起動して返す（server.shutdown()で停止）"""
+    store = FakeNotionStore()
+    if seed:
+        seed_from_fixtures(store, scale=scale)
+    server = FakeNotionServer((host, port), store, latency, rate_limit_every, retry_after)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカル疑似Notion APIサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="1リクエストあたりの遅延（秒）")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="N回に1回429を返す（0で無効）")
+    parser.add_argument("--retry-after", type=int, default=0, help="429応答のRetry-After（秒）")
+    parser.add_argument("--scale", type=int, default=1, help="フィクスチャを何倍に増やすか")
+    args = parser.parse_args()
+
+    server = start_fake_server(args.host, args.port, args.latency, args.rate_limit_every, args.retry_after, args.scale)
+    print(f"🚀 疑似Notionサーバーを起動しました: {server.url}")
+    print(f"  NOTION_BASE_URL={server.url}")
+    print("  NOTION_API_KEY=secret_fake")
+    print(f"  NODE_DB_ID={NODE_DB_ID}  CASE_DB_ID={CASE_DB_ID}  ITEM_DB_ID={ITEM_DB_ID}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
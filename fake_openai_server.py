@@ -0,0 +1,172 @@
+# fake_openai_server.py
+"""
+オフライン計測・テスト用のローカル疑似OpenAI APIサーバー
+
+app.py / asgi_app.py が使うAPIのサブセットだけを実装する:
+  POST /v1/chat/completions（stream あり・なし。ツールは呼び出さない）/ POST /v1/embeddings
+
+応答遅延（生成の待ち時間）を設定でき、埋め込みは入力テキストから決まるベクトルを返す。
+
+使い方:
+  python fake_openai_server.py --port 8766 --latency 0.5
+  OPENAI_BASE_URL=http://127.0.0.1:8766/v1 OPENAI_API_KEY=sk-fake python app.py
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 16
+ANSWER = "【状況確認】\nバッテリーの電圧を確認してください。\n【修理アドバイス】\n• 端子の緩みを確認する"
+
+
+def fake_embedding(text):
+    """テキストから決まる単位ベクトル（同じテキストは同じベクトル）"""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    vector = [byte - 127.5 for byte in digest[:EMBEDDING_DIMENSIONS]]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+def _completion(model, content):
+    return {
+        "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def _completion_chunks(model, content, chunk_size=8):
+    base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+    yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}
+    for start in range(0, len(content), chunk_size):
+        delta = {"content": content[start:start + chunk_size]}
+        yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+    yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """疑似OpenAIサーバー本体（エンドポイントごとの呼び出し回数を記録）"""
+
+    daemon_threads = True
+    request_queue_size = 1024   # 同時接続の計測で接続を取りこぼさない
+
+    def __init__(self, address, latency=0.0, embedding_latency=0.0, answer=ANSWER):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.embedding_latency = embedding_latency
+        self.answer = answer
+        self.stats_lock = threading.Lock()
+        self.calls = Counter()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.calls.clear()
+
+    def stats(self):
+        with self.stats_lock:
+            return dict(self.calls)
+
+    def count(self, endpoint):
+        with self.stats_lock:
+            self.calls[endpoint] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-aliveで接続を使い回せるようにする
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, chunks):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            return self._send_json(400, {"error": {"message": str(e), "type": "invalid_request_error"}})
+        server = self.server
+        path = self.path.split("?", 1)[0]
+
+        if path.endswith("/embeddings"):
+            texts = body.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            if server.embedding_latency:
+                time.sleep(server.embedding_latency)
+            server.count("embeddings")
+            return self._send_json(200, {
+                "object": "list", "model": body.get("model", ""),
+                # 入力がトークンIDの配列の場合も、その文字列表現から決まるベクトルを返す
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(str(text))}
+                         for i, text in enumerate(texts)],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            })
+
+        if path.endswith("/chat/completions"):
+            if server.latency:
+                time.sleep(server.latency)
+            server.count("chat.completions")
+            model = body.get("model", "")
+            if body.get("stream"):
+                return self._send_stream(_completion_chunks(model, server.answer))
+            return self._send_json(200, _completion(model, server.answer))
+
+        self._send_json(404, {"error": {"message": f"Unknown path: {path}", "type": "invalid_request_error"}})
+
+
+def start_fake_server(host="127.0.0.1", port=0, latency=0.0, embedding_latency=0.0):
+    """疑似OpenAIサーバーをバックグラウンドスレッドで起動して返す（server.shutdown()で停止）"""
+    server = FakeOpenAIServer((host, port), latency, embedding_latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカル疑似OpenAI APIサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.5, help="チャット補完1回あたりの遅延（秒）")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="埋め込み1回あたりの遅延（秒）")
+    args = parser.parse_args()
+
+    server = start_fake_server(args.host, args.port, args.latency, args.embedding_latency)
+    print(f"🚀 疑似OpenAIサーバーを起動しました: {server.url}")
+    print(f"  OPENAI_BASE_URL={server.url}")
+    print("  OPENAI_API_KEY=sk-fake")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 # full_category_migration.py
 import json
 import csv
-from notion_client import Client
+from shared_clients import get_notion_client
+from notion_migration import sync_pages
+import argparse
 import os
 import time
 
@@ -11,20 +13,112 @@ NODE_DB = os.getenv("NODE_DB_ID")
 CASE_DB = os.getenv("CASE_DB_ID")
 ITEM_DB = os.getenv("ITEM_DB_ID")
 
-client = Client(auth=API_KEY)
+client = get_notion_client(API_KEY)
+
+# 利用可能なカテゴリ
+CATEGORIES = [
+    "サブバッテリー", "バッテリー", "走行充電", "換気扇・排気システム",
+    "室内収納・家具", "室内灯・LED", "トイレ", "FFヒーター", 
+    "インバーター", "冷蔵庫", "水道ポンプ", "ソーラーパネル",
+    "ガスコンロ", "ウインドウ", "雨漏り", "車体外装の破損",
+    "異音", "電装系", "外部電源", "排水タンク", "家具"
+]
+
+# 基本的な部品・工具リスト
+ITEMS = [
+    {"name": "バッテリー", "category": "バッテリー", "price": "15,000円〜", "supplier": "カー用品店"},
+    {"name": "ブースターケーブル", "category": "工具", "price": "3,000円〜", "supplier": "ホームセンター"},
+    {"name": "テスター", "category": "工具", "price": "2,000円〜", "supplier": "ホームセンター"},
+    {"name": "バッテリーチャージャー", "category": "工具", "price": "8,000円〜", "supplier": "カー用品店"},
+    {"name": "端子クリーナー", "category": "工具", "price": "1,500円〜", "supplier": "ホームセンター"},
+    {"name": "冷蔵庫", "category": "冷蔵庫", "price": "50,000円〜", "supplier": "キャンピングカー専門店"},
+    {"name": "FFヒーター", "category": "ヒーター", "price": "80,000円〜", "supplier": "キャンピングカー専門店"},
+    {"name": "インバーター", "category": "電装系", "price": "20,000円〜", "supplier": "カー用品店"},
+    {"name": "水道ポンプ", "category": "ポンプ", "price": "5,000円〜", "supplier": "キャンピングカー専門店"},
+    {"name": "トイレ", "category": "トイレ", "price": "30,000円〜", "supplier": "キャンピングカー専門店"}
+]
+
+def build_node_properties(node_id, node_info, category):
+    """診断ノードのNotionプロパティを作成"""
+    return {
+        "ノードID": {
+            "title": [{"text": {"content": node_id}}]
+        },
+        "質問内容": {
+            "rich_text": [{"text": {"content": node_info.get("question", "")}}]
+        },
+        "診断結果": {
+            "rich_text": [{"text": {"content": node_info.get("result", "")}}]
+        },
+        "カテゴリ": {
+            "rich_text": [{"text": {"content": category}}]
+        },
+        "開始フラグ": {
+            "checkbox": node_info.get("is_start", False)
+        },
+        "終端フラグ": {
+            "checkbox": node_info.get("is_end", False)
+        },
+        "次のノード": {
+            "rich_text": [{"text": {"content": ", ".join(node_info.get("next_nodes", []))}}]
+        }
+    }
+
+def build_case_properties(case, index):
+    """修理ケースのNotionプロパティを作成（ケースIDがない行は連番を振る）"""
+    return {
+        "ケースID": {
+            "title": [{"text": {"content": case.get("case_id", f"CASE-{index:04d}")}}]
+        },
+        "症状": {
+            "rich_text": [{"text": {"content": case.get("症状", "")}}]
+        },
+        "修理手順": {
+            "rich_text": [{"text": {"content": case.get("修理手順", "")}}]
+        },
+        "必要な部品": {
+            "rich_text": [{"text": {"content": case.get("必要な部品", "")}}]
+        },
+        "必要な工具": {
+            "rich_text": [{"text": {"content": case.get("必要な工具", "")}}]
+        },
+        "推定時間": {
+            "rich_text": [{"text": {"content": case.get("推定時間", "")}}]
+        },
+        "難易度": {
+            "rich_text": [{"text": {"content": case.get("難易度", "")}}]
+        },
+        "注意事項": {
+            "rich_text": [{"text": {"content": case.get("注意事項", "")}}]
+        }
+    }
+
+def build_item_properties(item):
+    """部品・工具のNotionプロパティを作成"""
+    return {
+        "部品名": {
+            "title": [{"text": {"content": item["name"]}}]
+        },
+        "カテゴリ": {
+            "rich_text": [{"text": {"content": item["category"]}}]
+        },
+        "価格": {
+            "rich_text": [{"text": {"content": item["price"]}}]
+        },
+        "購入先": {
+            "rich_text": [{"text": {"content": item["supplier"]}}]
+        },
+        "在庫状況": {
+            "rich_text": [{"text": {"content": "在庫あり"}}]
+        }
+    }
 
 def migrate_all_categories():
     """全カテゴリのデータを移行"""
     print("🚀 全カテゴリデータ移行を開始...")
     
     # 利用可能なカテゴリ
-    categories = [
-        "サブバッテリー", "バッテリー", "走行充電", "換気扇・排気システム",
-        "室内収納・家具", "室内灯・LED", "トイレ", "FFヒーター", 
-        "インバーター", "冷蔵庫", "水道ポンプ", "ソーラーパネル",
-        "ガスコンロ", "ウインドウ", "雨漏り", "車体外装の破損",
-        "異音", "電装系", "外部電源", "排水タンク", "家具"
-    ]
+    categories = CATEGORIES
     
     # mock_diagnostic_nodes.jsonを読み込み
     with open('mock_diagnostic_nodes.json', 'r', encoding='utf-8') as f:
@@ -46,29 +140,7 @@ def migrate_all_categories():
                 if node_info.get("category") == category:
                     try:
                         # Notionに追加
-                        properties = {
-                            "ノードID": {
-                                "title": [{"text": {"content": node_id}}]
-                            },
-                            "質問内容": {
-                                "rich_text": [{"text": {"content": node_info.get("question", "")}}]
-                            },
-                            "診断結果": {
-                                "rich_text": [{"text": {"content": node_info.get("result", "")}}]
-                            },
-                            "カテゴリ": {
-                                "rich_text": [{"text": {"content": category}}]
-                            },
-                            "開始フラグ": {
-                                "checkbox": node_info.get("is_start", False)
-                            },
-                            "終端フラグ": {
-                                "checkbox": node_info.get("is_end", False)
-                            },
-                            "次のノード": {
-                                "rich_text": [{"text": {"content": ", ".join(node_info.get("next_nodes", []))}}]
-                            }
-                        }
+                        properties = build_node_properties(node_id, node_info, category)
                         
                         response = client.pages.create(
                             parent={"database_id": NODE_DB},
@@ -107,41 +179,16 @@ def migrate_repair_cases():
     
     created_cases = {}
     
-    for case in cases:
+    for index, case in enumerate(cases, 1):
         try:
-            properties = {
-                "ケースID": {
-                    "title": [{"text": {"content": case.get("case_id", f"CASE-{len(created_cases)+1:04d}")}}]
-                },
-                "症状": {
-                    "rich_text": [{"text": {"content": case.get("症状", "")}}]
-                },
-                "修理手順": {
-                    "rich_text": [{"text": {"content": case.get("修理手順", "")}}]
-                },
-                "必要な部品": {
-                    "rich_text": [{"text": {"content": case.get("必要な部品", "")}}]
-                },
-                "必要な工具": {
-                    "rich_text": [{"text": {"content": case.get("必要な工具", "")}}]
-                },
-                "推定時間": {
-                    "rich_text": [{"text": {"content": case.get("推定時間", "")}}]
-                },
-                "難易度": {
-                    "rich_text": [{"text": {"content": case.get("難易度", "")}}]
-                },
-                "注意事項": {
-                    "rich_text": [{"text": {"content": case.get("注意事項", "")}}]
-                }
-            }
+            properties = build_case_properties(case, index)
             
             response = client.pages.create(
                 parent={"database_id": CASE_DB},
                 properties=properties
             )
             
-            case_id = case.get("case_id", f"CASE-{len(created_cases)+1:04d}")
+            case_id = case.get("case_id", f"CASE-{index:04d}")
             created_cases[case_id] = response["id"]
             print(f"  ✅ {case_id} を追加しました")
             
@@ -156,40 +203,13 @@ def migrate_items():
     print("\n🔧 部品・工具データの移行を開始...")
     
     # 基本的な部品・工具リスト
-    items = [
-        {"name": "バッテリー", "category": "バッテリー", "price": "15,000円〜", "supplier": "カー用品店"},
-        {"name": "ブースターケーブル", "category": "工具", "price": "3,000円〜", "supplier": "ホームセンター"},
-        {"name": "テスター", "category": "工具", "price": "2,000円〜", "supplier": "ホームセンター"},
-        {"name": "バッテリーチャージャー", "category": "工具", "price": "8,000円〜", "supplier": "カー用品店"},
-        {"name": "端子クリーナー", "category": "工具", "price": "1,500円〜", "supplier": "ホームセンター"},
-        {"name": "冷蔵庫", "category": "冷蔵庫", "price": "50,000円〜", "supplier": "キャンピングカー専門店"},
-        {"name": "FFヒーター", "category": "ヒーター", "price": "80,000円〜", "supplier": "キャンピングカー専門店"},
-        {"name": "インバーター", "category": "電装系", "price": "20,000円〜", "supplier": "カー用品店"},
-        {"name": "水道ポンプ", "category": "ポンプ", "price": "5,000円〜", "supplier": "キャンピングカー専門店"},
-        {"name": "トイレ", "category": "トイレ", "price": "30,000円〜", "supplier": "キャンピングカー専門店"}
-    ]
+    items = ITEMS
     
     created_items = {}
     
     for item in items:
         try:
-            properties = {
-                "部品名": {
-                    "title": [{"text": {"content": item["name"]}}]
-                },
-                "カテゴリ": {
-                    "rich_text": [{"text": {"content": item["category"]}}]
-                },
-                "価格": {
-                    "rich_text": [{"text": {"content": item["price"]}}]
-                },
-                "購入先": {
-                    "rich_text": [{"text": {"content": item["supplier"]}}]
-                },
-                "在庫状況": {
-                    "rich_text": [{"text": {"content": "在庫あり"}}]
-                }
-            }
+            properties = build_item_properties(item)
             
             response = client.pages.create(
                 parent={"database_id": ITEM_DB},
@@ -205,14 +225,50 @@ def migrate_items():
     print(f"📊 部品・工具移行完了: {len(created_items)}件")
     return created_items
 
+def sync_all(dry_run=False, archive=False, workers=None):
+    """既存ページとの差分だけを作成・更新・アーカイブする（同期モード）"""
+    print("🔄 同期モード: 既存ページを取得して差分を計算します" + ("（ドライラン）" if dry_run else ""))
+    
+    with open('mock_diagnostic_nodes.json', 'r', encoding='utf-8') as f:
+        diagnostic_data = json.load(f)
+    with open('修理ケースDB 24d709bb38f18039a8b3e0bec10bb7eb.csv', 'r', encoding='utf-8') as f:
+        cases = list(csv.DictReader(f))
+    
+    # 移行モードと同じ順序・同じ内容のプロパティを作成
+    node_properties = [
+        build_node_properties(node_id, node_info, category)
+        for category in CATEGORIES
+        for node_data in diagnostic_data
+        for node_id, node_info in node_data.items()
+        if node_info.get("category") == category
+    ]
+    case_properties = [build_case_properties(case, index) for index, case in enumerate(cases, 1)]
+    item_properties = [build_item_properties(item) for item in ITEMS]
+    
+    options = {"dry_run": dry_run, "archive": archive, "workers": workers}
+    nodes, _ = sync_pages(client, NODE_DB, node_properties, "ノードID", label="診断ノード", **options)
+    cases, _ = sync_pages(client, CASE_DB, case_properties, "ケースID", label="修理ケース", **options)
+    items, _ = sync_pages(client, ITEM_DB, item_properties, "部品名", label="部品・工具", **options)
+    return nodes, cases, items
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全カテゴリのデータをNotionに移行")
+    parser.add_argument("--sync", action="store_true", help="既存ページとの差分だけを作成・更新する（同期モード）")
+    parser.add_argument("--dry-run", action="store_true", help="同期モードで書き込まずに差分だけを表示する")
+    parser.add_argument("--archive", action="store_true", help="同期モードで移行元にないページ・重複ページをアーカイブする")
+    parser.add_argument("--workers", type=int, default=None, help="同期モードで並列に書き込むスレッド数")
+    args = parser.parse_args()
+    
     print("🚀 全カテゴリデータ移行スクリプト開始")
     print("=" * 50)
     
     # 各データベースの移行を実行
-    nodes = migrate_all_categories()
-    cases = migrate_repair_cases()
-    items = migrate_items()
+    if args.sync or args.dry_run:
+        nodes, cases, items = sync_all(args.dry_run, args.archive, args.workers)
+    else:
+        nodes = migrate_all_categories()
+        cases = migrate_repair_cases()
+        items = migrate_items()
     
     print("\n" + "=" * 50)
     print("✅ 全データ移行完了！")
@@ -1,9 +1,10 @@
 # full_data_migration.py
 import json
 import csv
-from notion_client import Client
+from shared_clients import get_notion_client
+from notion_migration import MigrationJournal, migrate_pages, sync_pages
+import argparse
 import os
-import time
 
 # 環境変数から設定を取得
 API_KEY = os.getenv("NOTION_API_KEY")
@@ -11,9 +12,20 @@ NODE_DB = os.getenv("NODE_DB_ID")
 CASE_DB = os.getenv("CASE_DB_ID")
 ITEM_DB = os.getenv("ITEM_DB_ID")
 
-client = Client(auth=API_KEY)
+client = get_notion_client(API_KEY)
 
-def migrate_all_diagnostic_nodes():
+def write_pages(database_id, records, key_property, label, journal_label, workers=None, sync=None):
+    """移行モード（ジャーナル付きで作成）または同期モード（差分のみ書き込み）でページを書き込む
+
+    sync: 同期モードのオプション（{"dry_run": bool, "archive": bool}）。Noneなら移行モード
+    """
+    if sync is not None:
+        return sync_pages(client, database_id, [properties for _, properties in records], key_property,
+                          workers=workers, label=label, **sync)
+    journal = MigrationJournal.for_database(database_id, journal_label)
+    return migrate_pages(client, database_id, records, journal, workers=workers, label=label)
+
+def migrate_all_diagnostic_nodes(workers=None, sync=None):
     """すべての診断フローデータを移行"""
     print(" 全診断フローデータの移行を開始...")
     
@@ -21,16 +33,10 @@ def migrate_all_diagnostic_nodes():
     with open('mock_diagnostic_nodes.json', 'r', encoding='utf-8') as f:
         diagnostic_data = json.load(f)
     
-    created_pages = {}
-    total_nodes = len(diagnostic_data[0])
-    processed = 0
+    records = []
     
-    # 各診断ノードをNotionに追加
+    # 各診断ノードのNotionプロパティを作成
     for node_id, node_data in diagnostic_data[0].items():
-        processed += 1
-        print(f"📝 [{processed}/{total_nodes}] {node_id} を追加中...")
-        
-        # Notionページを作成
         properties = {
             "ノードID": {"title": [{"text": {"content": node_id}}]},
             "質問内容": {"rich_text": [{"text": {"content": node_data.get("question", "")}}]},
@@ -42,28 +48,17 @@ def migrate_all_diagnostic_nodes():
             "難易度": {"rich_text": [{"text": {"content": "初級"}}]},
             "メモ": {"rich_text": [{"text": {"content": f"{node_data.get('category', '')}関連の診断ノード"}}]}
         }
-        
-        try:
-            response = client.pages.create(
-                parent={"database_id": NODE_DB},
-                properties=properties
-            )
-            created_pages[node_id] = response["id"]
-            print(f"✅ {node_id} を追加しました")
-            
-            # API制限を避けるため少し待機
-            time.sleep(0.1)
-            
-        except Exception as e:
-            print(f"❌ {node_id} の追加に失敗: {e}")
+        records.append((node_id, properties))
+    
+    created_pages, failed = write_pages(NODE_DB, records, "ノードID", "診断ノード", "nodes", workers, sync)
     
     print(f"\n📊 診断フロー移行結果:")
     print(f"成功: {len(created_pages)}件")
-    print(f"失敗: {total_nodes - len(created_pages)}件")
+    print(f"失敗: {len(failed)}件")
     
     return created_pages
 
-def migrate_all_repair_cases():
+def migrate_all_repair_cases(workers=None, sync=None):
     """すべての修理ケースデータを移行"""
     print("\n 全修理ケースデータの移行を開始...")
     
@@ -72,14 +67,10 @@ def migrate_all_repair_cases():
         reader = csv.DictReader(f)
         cases = list(reader)
     
-    created_cases = {}
-    total_cases = len(cases)
-    processed = 0
+    records = []
     
-    for row in cases:
-        processed += 1
-        case_name = row.get("対象名称", f"CASE-{processed}")
-        print(f" [{processed}/{total_cases}] {case_name} を追加中...")
+    for processed, row in enumerate(cases, 1):
+        case_key = row.get("terminal_case_id") or row.get("対象名称") or f"CASE-{processed}"
         
         # HTMLタグを除去（<br>を改行に変換）
         repair_steps = row.get("修理手順", "").replace("<br>", "\n")
@@ -94,28 +85,17 @@ def migrate_all_repair_cases():
             "難易度": {"rich_text": [{"text": {"content": row.get("難易度", "初級")}}]},
             "注意事項": {"rich_text": [{"text": {"content": row.get("注意事項", "")}}]}
         }
-        
-        try:
-            response = client.pages.create(
-                parent={"database_id": CASE_DB},
-                properties=properties
-            )
-            created_cases[case_name] = response["id"]
-            print(f"✅ {case_name} を追加しました")
-            
-            # API制限を避けるため少し待機
-            time.sleep(0.1)
-            
-        except Exception as e:
-            print(f"❌ {case_name} の追加に失敗: {e}")
+        records.append((case_key, properties))
+    
+    created_cases, failed = write_pages(CASE_DB, records, "ケースID", "修理ケース", "cases", workers, sync)
     
     print(f"\n📊 修理ケース移行結果:")
     print(f"成功: {len(created_cases)}件")
-    print(f"失敗: {total_cases - len(created_cases)}件")
+    print(f"失敗: {len(failed)}件")
     
     return created_cases
 
-def migrate_parts_and_tools():
+def migrate_parts_and_tools(workers=None, sync=None):
     """部品・工具データを移行"""
     print("\n 部品・工具データの移行を開始...")
     
@@ -133,11 +113,9 @@ def migrate_parts_and_tools():
         {"name": "保護手袋", "category": "その他", "price": "300円", "supplier": "ホームセンター", "stock": "在庫あり"}
     ]
     
-    created_items = {}
+    records = []
     
     for item in parts_and_tools:
-        print(f" {item['name']} を追加中...")
-        
         properties = {
             "部品名": {"title": [{"text": {"content": item["name"]}}]},
             "カテゴリ": {"rich_text": [{"text": {"content": item["category"]}}]},
@@ -146,30 +124,31 @@ def migrate_parts_and_tools():
             "在庫状況": {"rich_text": [{"text": {"content": item["stock"]}}]},
             "メモ": {"rich_text": [{"text": {"content": f"{item['category']}カテゴリの{item['name']}"}}]}
         }
-        
-        try:
-            response = client.pages.create(
-                parent={"database_id": ITEM_DB},
-                properties=properties
-            )
-            created_items[item["name"]] = response["id"]
-            print(f"✅ {item['name']} を追加しました")
-            
-            # API制限を避けるため少し待機
-            time.sleep(0.1)
-            
-        except Exception as e:
-            print(f"❌ {item['name']} の追加に失敗: {e}")
+        records.append((item["name"], properties))
+    
+    created_items, failed = write_pages(ITEM_DB, records, "部品名", "部品・工具", "items", workers, sync)
     
     print(f"\n📊 部品・工具移行結果:")
     print(f"成功: {len(created_items)}件")
-    print(f"失敗: {len(parts_and_tools) - len(created_items)}件")
+    print(f"失敗: {len(failed)}件")
     
     return created_items
 
 def main():
     """メイン実行関数"""
+    parser = argparse.ArgumentParser(description="診断フロー・修理ケース・部品工具データをNotionに移行")
+    parser.add_argument("--workers", type=int, default=None, help="並列にページを作成するスレッド数")
+    parser.add_argument("--sync", action="store_true", help="既存ページとの差分だけを作成・更新する（同期モード）")
+    parser.add_argument("--dry-run", action="store_true", help="同期モードで書き込まずに差分だけを表示する")
+    parser.add_argument("--archive", action="store_true", help="同期モードで移行元にないページ・重複ページをアーカイブする")
+    args = parser.parse_args()
+    sync = {"dry_run": args.dry_run, "archive": args.archive} if args.sync or args.dry_run else None
+    
     print("   全データ移行を開始します...")
+    if sync is None:
+        print("   中断した場合は同じコマンドで再実行すると、作成済みのページを飛ばして再開します")
+    else:
+        print(f"   同期モード{'（ドライラン）' if args.dry_run else ''}: 既存ページとの差分だけを書き込みます")
     print(f"📋 使用するデータベース:")
     print(f"  診断フローDB: {NODE_DB}")
     print(f"  修理ケースDB: {CASE_DB}")
@@ -177,9 +156,9 @@ def main():
     print()
     
     # 各データベースへの移行
-    created_nodes = migrate_all_diagnostic_nodes()
-    created_cases = migrate_all_repair_cases()
-    created_items = migrate_parts_and_tools()
+    created_nodes = migrate_all_diagnostic_nodes(args.workers, sync)
+    created_cases = migrate_all_repair_cases(args.workers, sync)
+    created_items = migrate_parts_and_tools(args.workers, sync)
     
     # 総合結果
     print("\n" + "="*50)
@@ -0,0 +1,259 @@
+# keyword_matcher.py
+"""
+複数キーワードの一括照合（Aho–Corasick法）
+
+キーワードごとに `keyword in text` を繰り返す代わりに、全キーワードから
+オートマトンを一度だけ作り、入力テキストを1回走査するだけで一致した
+キーワードをすべて返す（計算量はテキスト長 + 一致数）。
+キーワード・テキストはどちらも text_normalizer.normalize_text() で正規化して照合する。
+"""
+
+from array import array
+from collections import deque
+from functools import lru_cache
+
+from text_normalizer import normalize_text
+
+
+class KeywordMatcher:
+    """Aho–Corasick法の照合器
+
+    entries: (キーワード, 値) の一覧。同じキーワードに複数の値を登録できる。
+    ignore_case: キーワード・テキストともに正規化（小文字化・全角半角・表記ゆれ）して照合する。
+    一致位置・返すキーワードは正規化後のテキスト・キーワードのもの。
+    """
+
+    def __init__(self, entries=(), ignore_case=True):
+        self.ignore_case = ignore_case
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]          # 状態 -> そこで一致するキーワード番号
+        self._keywords = []       # キーワード番号 -> (キーワード, [値, ...])
+        self._keyword_ids = {}
+        for keyword, value in entries:
+            self._add(keyword, value)
+        self._build()
+
+    def __len__(self):
+        return len(self._keywords)
+
+    def _add(self, keyword, value):
+        keyword = self._fold(keyword or "").strip()
+        if not keyword:
+            return
+        keyword_id = self._keyword_ids.get(keyword)
+        if keyword_id is not None:
+            self._keywords[keyword_id][1].append(value)
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        keyword_id = len(self._keywords)
+        self._keywords.append((keyword, [value]))
+        self._keyword_ids[keyword] = keyword_id
+        self._out[state].append(keyword_id)
+
+    def _build(self):
+        # 幅優先で失敗遷移を設定し、失敗先の出力を引き継ぐ
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def __getstate__(self):
+        # 遷移表は「親の状態・文字」から作り直せるため、平たい配列で保存する（読み込みが速い）
+        parents, chars = array("i", [0]) * len(self._goto), [""] * len(self._goto)
+        for state, edges in enumerate(self._goto):
+            for char, child in edges.items():
+                parents[child], chars[child] = state, char
+        return {"ignore_case": self.ignore_case, "parents": parents, "chars": "".join(chars),
+                "fail": array("i", self._fail), "keywords": self._keywords,
+                "out": {state: ids for state, ids in enumerate(self._out) if ids}}
+
+    def __setstate__(self, state):
+        self.ignore_case = state["ignore_case"]
+        parents, chars = state["parents"], state["chars"]
+        self._goto = [{} for _ in range(len(parents))]
+        for child in range(1, len(parents)):
+            self._goto[parents[child]][chars[child - 1]] = child
+        self._fail = list(state["fail"])
+        self._out = [[]] * len(parents)     # 一致のない状態は空のリストを共有する（構築後は変更しない）
+        for out_state, ids in state["out"].items():
+            self._out[out_state] = ids
+        self._keywords = state["keywords"]
+        self._keyword_ids = {keyword: i for i, (keyword, _) in enumerate(self._keywords)}
+
+    def _fold(self, text):
+        return normalize_text(text) if self.ignore_case else text
+
+    def iter_matches(self, text):
+        """一致を (開始位置, キーワード, 値の一覧) で出現順に返す"""
+        state = 0
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self._keywords
+        for position, char in enumerate(self._fold(text or "")):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword_id in out[state]:
+                keyword, values = keywords[keyword_id]
+                yield position - len(keyword) + 1, keyword, values
+
+    def find_keywords(self, text):
+        """一致したキーワードの一覧（重複なし・初出順）"""
+        return list(dict.fromkeys(keyword for _, keyword, _ in self.iter_matches(text)))
+
+    def find_values(self, text):
+        """一致したキーワードに登録された値 -> 一致したキーワードの一覧（初出順）"""
+        hits = {}
+        for _, keyword, values in self.iter_matches(text):
+            for value in values:
+                found = hits.setdefault(value, [])
+                if keyword not in found:
+                    found.append(keyword)
+        return hits
+
+
+class SymptomIndex:
+    """診断ノード・修理ケースの症状の索引（Notionデータの読み込み時に一度だけ作成）"""
+
+    def __init__(self, nodes, cases):
+        self.nodes = list(nodes)
+        self.cases = list(cases)
+        entries = [(symptom, ("node", i)) for i, node in enumerate(self.nodes) for symptom in node.get("symptoms", [])]
+        entries += [(symptom, ("case", i)) for i, case in enumerate(self.cases) for symptom in case.get("symptoms", [])]
+        self.matcher = KeywordMatcher(entries)
+
+    def search(self, text):
+        """入力文を1回走査して一致する診断ノード・修理ケースを返す
+
+        戻り値: {"nodes": [...], "cases": [...]}（一致した症状の種類が多い順、同数なら元の順）
+        """
+        ranked = {"node": [], "case": []}
+        for (kind, i), symptoms in self.matcher.find_values(text).items():
+            ranked[kind].append((-len(symptoms), i))
+        return {
+            "nodes": [self.nodes[i] for _, i in sorted(ranked["node"])],
+            "cases": [self.cases[i] for _, i in sorted(ranked["case"])],
+        }
+
+
+# === ブログ・カテゴリ判定で共有する語彙 ===
+DEFAULT_CATEGORY = "📚 その他関連記事"
+
+# (カテゴリ, 質問側のキーワード, ブログ側のキーワード)。上から順に優先する
+CATEGORY_RULES = [
+    ("🔌 インバーター関連", ['インバーター', 'inverter', 'dc-ac', '正弦波', '電源変換'],
+     ['インバーター', 'inverter', '正弦波', '矩形波', 'dc-ac']),
+    ("🔋 バッテリー関連", ['バッテリー', 'battery', '充電', '電圧'],
+     ['バッテリー', 'battery', '充電', '電圧', 'agm', 'リチウム']),
+    ("💧 水道・ポンプ関連", ['水道', 'ポンプ', 'water', 'pump', '給水'],
+     ['水道', 'ポンプ', 'water', 'pump', '給水']),
+    ("🌧️ 雨漏り・防水関連", ['雨漏り', 'rain', 'leak', '防水', 'シール'],
+     ['雨漏り', 'rain', 'leak', '防水', 'シール']),
+    ("⚡ 電気・電装系関連", ['電気', '電装', 'electrical', 'led', '照明'],
+     ['電気', '電装', 'electrical', 'led', '照明']),
+    ("❄️ 冷蔵庫・冷凍関連", ['冷蔵庫', '冷凍', 'コンプレッサー'],
+     ['冷蔵庫', '冷凍', 'コンプレッサー']),
+    ("🔥 ガス・ヒーター関連", ['ガス', 'gas', 'コンロ', 'ヒーター', 'ff'],
+     ['ガス', 'gas', 'コンロ', 'ヒーター', 'ff']),
+    ("🚽 トイレ関連", ['トイレ', 'toilet', 'カセット', 'マリン'],
+     ['トイレ', 'toilet', 'カセット', 'マリン']),
+    ("💨 ルーフベント・換気扇関連", ['ルーフベント', '換気扇', 'ファン', 'vent'],
+     ['ルーフベント', '換気扇', 'ファン', 'vent']),
+    ("🔊 異音・騒音関連", ['異音', '騒音', '音', '振動', 'noise'],
+     ['異音', '騒音', '音', '振動', 'noise']),
+    ("🔧 基本修理・メンテナンス関連", ['修理', 'メンテナンス', 'repair', 'maintenance'],
+     ['修理', 'メンテナンス', 'repair', 'maintenance']),
+]
+
+# 技術用語（知識ベースの本文と質問の両方に含まれるものを抽出する）
+TECH_KEYWORDS = [
+    "バッテリー", "インバーター", "ポンプ", "冷蔵庫", "ヒーター", "コンロ",
+    "トイレ", "ルーフベント", "換気扇", "水道", "給水", "排水", "雨漏り",
+    "防水", "シーリング", "配線", "電装", "LED", "ソーラーパネル",
+    "ガス", "電気", "異音", "振動", "故障", "修理", "メンテナンス"
+]
+
+# 質問から直接抽出する主要キーワード
+MAIN_KEYWORDS = TECH_KEYWORDS + ["シャワー", "水", "電圧", "充電", "出力", "電源", "音", "騒音"]
+
+# トラブル関連キーワード
+TROUBLE_KEYWORDS = [
+    "水が出ない", "圧力不足", "異音", "過熱", "電圧低下", "充電されない",
+    "電源入らない", "出力ゼロ", "水漏れ", "臭い", "ファン故障", "開閉不良",
+    "配管漏れ", "雨漏り", "防水", "シール", "音", "騒音", "振動"
+]
+
+# 知識ベースのカテゴリ（ファイル名）と、質問がそのカテゴリに関係するとみなすキーワード
+KNOWLEDGE_CATEGORY_KEYWORDS = [
+    ("インバーター", ["インバーター", "DC-AC", "正弦波", "電源変換"]),
+    ("バッテリー", ["バッテリー", "サブバッテリー", "充電", "電圧"]),
+    ("トイレ", ["トイレ", "カセット", "マリン", "フラッパー"]),
+    ("ルーフベント", ["ルーフベント", "換気扇", "マックスファン", "ファン"]),
+    ("水道", ["水道", "ポンプ", "給水", "水"]),
+    ("冷蔵庫", ["冷蔵庫", "冷凍", "コンプレッサー"]),
+    ("ガス", ["ガス", "コンロ", "ヒーター", "FF"]),
+    ("電気", ["電気", "LED", "照明", "電装"]),
+    ("雨漏り", ["雨漏り", "防水", "シール"]),
+    ("異音", ["異音", "音", "騒音", "振動"]),
+]
+
+# 全語彙をまとめた照合器（値は語彙の種類: "main" / "tech" / "trouble" / ("query", カテゴリ) /
+# ("blog", カテゴリ) / ("knowledge", 知識ベースのカテゴリ)）
+VOCABULARY_MATCHER = KeywordMatcher(
+    [(keyword, "main") for keyword in MAIN_KEYWORDS]
+    + [(keyword, "tech") for keyword in TECH_KEYWORDS]
+    + [(keyword, "trouble") for keyword in TROUBLE_KEYWORDS]
+    + [(keyword, ("query", label)) for label, keywords, _ in CATEGORY_RULES for keyword in keywords]
+    + [(keyword, ("blog", label)) for label, _, keywords in CATEGORY_RULES for keyword in keywords]
+    + [(keyword, ("knowledge", category)) for category, keywords in KNOWLEDGE_CATEGORY_KEYWORDS for keyword in keywords]
+)
+
+
+def match_vocabulary(text):
+    """テキストを1回走査し、語彙の種類 -> 一致したキーワードの一覧 を返す"""
+    return VOCABULARY_MATCHER.find_values(text)
+
+
+@lru_cache(maxsize=128)
+def content_terms(content):
+    """知識ベース本文に含まれる技術用語・トラブル用語（本文ごとに一度だけ走査）"""
+    hits = match_vocabulary(content)
+    return frozenset(hits.get("tech", []) + hits.get("trouble", []))
+
+
+def category_for_query(hits):
+    """質問のカテゴリ（hits: match_vocabulary() の結果）"""
+    for label, _, _ in CATEGORY_RULES:
+        if ("query", label) in hits:
+            return label
+    return DEFAULT_CATEGORY
+
+
+def blog_category_labels(blog):
+    """ブログ側のキーワードが当てはまるカテゴリー（CATEGORY_RULES の順。ブログごとに前計算できる）"""
+    blog_hits = match_vocabulary(blog["title"] + "\n" + blog["url"])
+    blog_keywords = {normalize_text(keyword) for keyword in blog["keywords"]}
+    return tuple(label for label, _, keywords in CATEGORY_RULES
+                 if ("blog", label) in blog_hits or blog_keywords.intersection(map(normalize_text, keywords)))
+
+
+def category_for_blog(blog, hits, labels=None):
+    """質問とブログの両方が当てはまる最初のカテゴリー（hits: 質問の match_vocabulary() の結果）"""
+    for label in (blog_category_labels(blog) if labels is None else labels):
+        if ("query", label) in hits:
+            return label
+    return DEFAULT_CATEGORY
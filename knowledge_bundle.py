@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# knowledge_bundle.py
+"""
+知識ベースのコンパイル（全ソースを1つのバンドルファイルにまとめる）
+
+テキスト（*.txt）・診断フロー（JSON/CSV）・修理ケースCSV・部品ブリッジ・
+ブログカタログ・PDFマニュアルをそれぞれの読み込み処理で検証・解析し、
+解析済みのオブジェクトを1つのファイルに保存する。アプリはソースを解析する
+代わりにバンドルを読み込み、ソースの更新時刻・サイズ（必要ならハッシュ）で
+古くなっていないかを確認する。
+
+使い方:
+  python knowledge_bundle.py compile               # 検証して knowledge.bundle を作成
+  python knowledge_bundle.py compile --embeddings  # ケースの埋め込みも含める（OPENAI_API_KEY が必要）
+  python knowledge_bundle.py verify                # ソースのハッシュと照合
+  python knowledge_bundle.py info
+
+ファイル形式:
+  b"KBBUNDLE" + ヘッダー長（4バイト・リトルエンディアン）+ ヘッダー（JSON）+ セクション
+  ヘッダーの sections に セクション名 -> {offset, length, codec} を記録する。
+  codec "pickle": pickle（自分で作成したバンドル以外は読み込まないこと）
+  codec "f32":    float32 の行列（mmap からコピーせずに参照できる）
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+
+BUNDLE_FORMAT = 3     # 照合用の正規化（text_normalizer.py）を変えたときも上げる
+MAGIC = b"KBBUNDLE"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KNOWLEDGE_BUNDLE = os.getenv("KNOWLEDGE_BUNDLE", "knowledge.bundle")
+
+GRAPH_FILES = ("mock_diagnostic_nodes.json", "diagnostic_nodes_fixed.json", "diag_nodes_linked_5nodes.csv")
+MANUAL_PDF = "キャンピングカー修理マニュアル.pdf"
+
+
+class BundleError(ValueError):
+    """ソースの検証・バンドルの作成に失敗"""
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("知識ベースをコンパイルできません: " + " / ".join(self.problems))
+
+
+def _source_files():
+    from knowledge_index import KNOWLEDGE_FILES
+    from repair_index import CASE_CSV_FILES, CASE_ITEMS_FILE
+    return list(KNOWLEDGE_FILES) + list(GRAPH_FILES) + list(CASE_CSV_FILES) + [CASE_ITEMS_FILE, "blog_links.json", MANUAL_PDF]
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_record(path):
+    stat = os.stat(path)
+    return {"sha1": _sha1(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_manual_pages(path):
+    # PyPDFLoader と同じく1ページ1要素のテキスト
+    from pypdf import PdfReader
+    return [page.extract_text() or "" for page in PdfReader(path).pages]
+
+
+def _embed_cases(cases):
+    from shared_clients import get_embeddings
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise BundleError(["--embeddings には OPENAI_API_KEY が必要です"])
+    vectors = get_embeddings(api_key).embed_documents([case.render() for case in cases])
+    dimension = len(vectors[0]) if vectors else 0
+    return array("f", (value for vector in vectors for value in vector)), dimension
+
+
+def compile_bundle(base_dir=None, output=None, embeddings=False):
+    """全ソースを検証して解析し、バンドルを書き出す
+
+    戻り値: (ヘッダー, 警告の一覧)。読み込めないソースがあればBundleError。
+    """
+    from blog_catalog import BlogCatalog
+    from diagnostic_engine import load_graph
+    from knowledge_index import KNOWLEDGE_FILES, KnowledgeBase
+    from repair_index import CASE_CSV_FILES, CASE_ITEMS_FILE, load_case_items, load_repair_cases_csv
+
+    base_dir = os.path.abspath(base_dir or BASE_DIR)
+    output = os.path.join(base_dir, output or KNOWLEDGE_BUNDLE)
+    errors, warnings, sections = [], [], {}
+
+    # 知識ベースのテキスト
+    contents = {}
+    for file_name in KNOWLEDGE_FILES:
+        path = os.path.join(base_dir, file_name)
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                contents[file_name.replace(".txt", "")] = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            errors.append(f"{file_name}: {e}")
+    knowledge_base = KnowledgeBase(contents)
+    for file in knowledge_base.files:
+        if not any(case.is_case for case in file.cases):
+            warnings.append(f"{file.category}.txt: ケースが見つかりません")
+    sections["knowledge_base"] = ("pickle", knowledge_base)
+
+    # 診断フロー（存在しない遷移先・循環はアプリと同じく除外して警告）
+    graphs = {}
+    for file_name in GRAPH_FILES:
+        path = os.path.join(base_dir, file_name)
+        if not os.path.exists(path):
+            continue
+        try:
+            graphs[file_name] = load_graph(path, strict=False)
+        except Exception as e:
+            errors.append(f"{file_name}: {e}")
+            continue
+        warnings += [f"{file_name}: {problem}" for problem in graphs[file_name].problems]
+    sections["diagnostic_graphs"] = ("pickle", graphs)
+
+    # 修理ケース・部品ブリッジ
+    case_rows = load_repair_cases_csv([os.path.join(base_dir, name) for name in CASE_CSV_FILES])
+    case_items = load_case_items(os.path.join(base_dir, CASE_ITEMS_FILE))
+    warnings += [f"{CASE_ITEMS_FILE}: 修理ケースがありません（{case_id}）" for case_id in case_items if case_id not in case_rows]
+    for file_name, graph in graphs.items():
+        missing = sorted({case_id for case_id in graph.terminal_case_ids if case_id and case_id not in case_rows})
+        warnings += [f"{file_name}: terminal_case_id の修理ケースがありません（{case_id}）" for case_id in missing]
+    sections["repair_cases"] = ("pickle", case_rows)
+    sections["case_items"] = ("pickle", case_items)
+
+    # ブログカタログ（キーワード索引を含む）
+    path = os.path.join(base_dir, "blog_links.json")
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                sections["blog_catalog"] = ("pickle", BlogCatalog(json.load(f)))
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append(f"blog_links.json: {e!r}")
+
+    # PDFマニュアル
+    path = os.path.join(base_dir, MANUAL_PDF)
+    if os.path.exists(path):
+        try:
+            sections["manual_pages"] = ("pickle", _read_manual_pages(path))
+        except ImportError:
+            warnings.append(f"{MANUAL_PDF}: pypdf がないため含めません")
+        except Exception as e:
+            errors.append(f"{MANUAL_PDF}: {e}")
+
+    if errors:
+        raise BundleError(errors)
+
+    extra = {}
+    if embeddings:
+        vectors, dimension = _embed_cases(knowledge_base.cases)
+        sections["case_embeddings"] = ("f32", vectors)
+        extra["case_embeddings"] = {"rows": len(knowledge_base.cases), "dimension": dimension}
+
+    sources = {name: _source_record(os.path.join(base_dir, name))
+               for name in _source_files() if os.path.exists(os.path.join(base_dir, name))}
+    header = {
+        "format": BUNDLE_FORMAT,
+        "version": hashlib.sha1(json.dumps({k: v["sha1"] for k, v in sources.items()}, sort_keys=True).encode()).hexdigest()[:12],
+        "knowledge_version": knowledge_base.version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "sources": sources,
+        "sections": {},
+        **extra,
+    }
+    _write_bundle(output, header, sections)
+    return header, warnings
+
+
+def _write_bundle(path, header, sections):
+    blobs, offset = [], 0
+    for name, (codec, value) in sections.items():
+        blob = value.tobytes() if codec == "f32" else pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        header["sections"][name] = {"offset": offset, "length": len(blob), "codec": codec}
+        blobs.append(blob)
+        offset += len(blob)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    # 書き込み途中で中断しても前回のバンドルが壊れないように置き換える
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class KnowledgeBundle:
+    """バンドルファイル（mmapで開き、セクションは最初に参照したときに読み込む）"""
+
+    def __init__(self, path, base_dir=None):
+        self.path = path
+        self.base_dir = os.path.abspath(base_dir or os.path.dirname(os.path.abspath(path)))
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise BundleError([f"{path}: バンドルではありません"])
+        (header_length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[header_start:header_start + header_length].decode("utf-8"))
+        if self.header.get("format") != BUNDLE_FORMAT:
+            raise BundleError([f"{path}: 形式が異なります（{self.header.get('format')}）"])
+        self._data_start = header_start + header_length
+        self._sections = {}
+
+    @property
+    def version(self):
+        return self.header["version"]
+
+    def __contains__(self, name):
+        return name in self.header["sections"]
+
+    def _view(self, name):
+        info = self.header["sections"][name]
+        start = self._data_start + info["offset"]
+        return memoryview(self._mmap)[start:start + info["length"]]
+
+    def section(self, name):
+        """pickleのセクション（一度だけ読み込む）"""
+        if name not in self._sections:
+            self._sections[name] = pickle.loads(self._view(name))
+        return self._sections[name]
+
+    def case_embeddings(self):
+        """ケースの埋め込み（knowledge_base.cases と同じ順の行）。含まれていなければNone"""
+        if "case_embeddings" not in self:
+            return None
+        dimension = self.header["case_embeddings"]["dimension"]
+        flat = self._view("case_embeddings").cast("f")
+        return [flat[i:i + dimension] for i in range(0, len(flat), dimension)]
+
+    def stale_sources(self, names=None, full=False):
+        """作成後に変更・削除・追加されたソース
+
+        更新時刻とサイズが同じなら変更なしとみなす。full=True のとき、
+        または更新時刻だけが変わったときはハッシュで比べる。
+        """
+        recorded = self.header["sources"]
+        stale = []
+        for name in (names if names is not None else _source_files()):
+            path = os.path.join(self.base_dir, name)
+            record = recorded.get(name)
+            if not os.path.exists(path):
+                if record:
+                    stale.append(name)
+                continue
+            if not record:
+                stale.append(name)
+                continue
+            stat = os.stat(path)
+            if stat.st_size != record["size"]:
+                stale.append(name)
+            elif (full or stat.st_mtime_ns != record["mtime_ns"]) and _sha1(path) != record["sha1"]:
+                stale.append(name)
+        return stale
+
+
+_bundles = {}   # パス -> (更新時刻, KnowledgeBundle)
+
+
+def load_bundle(base_dir=None, path=None):
+    """バンドルを開く（ない・形式が異なる場合はNone）。ファイルが変わるまで同じオブジェクトを返す"""
+    base_dir = os.path.abspath(base_dir or BASE_DIR)
+    path = os.path.join(base_dir, path or KNOWLEDGE_BUNDLE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _bundles.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        bundle = KnowledgeBundle(path, base_dir)
+    except (BundleError, ValueError, OSError):
+        return None
+    _bundles[path] = (mtime, bundle)
+    return bundle
+
+
+def bundled(name, sources, base_dir=None):
+    """バンドルのセクション（バンドルがない・sources のどれかが古い場合はNone）"""
+    bundle = load_bundle(base_dir)
+    if bundle is None or name not in bundle or bundle.stale_sources(sources):
+        return None
+    return bundle.section(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知識ベースのバンドル作成・検証")
+    parser.add_argument("command", choices=["compile", "verify", "info"])
+    parser.add_argument("--base-dir", default=BASE_DIR, help="ソースのあるディレクトリ")
+    parser.add_argument("--output", default=KNOWLEDGE_BUNDLE, help="バンドルのファイル名")
+    parser.add_argument("--embeddings", action="store_true", help="ケースの埋め込みを含める")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        try:
+            header, warnings = compile_bundle(args.base_dir, args.output, embeddings=args.embeddings)
+        except BundleError as e:
+            for problem in e.problems:
+                print(f"❌ {problem}")
+            sys.exit(1)
+        for warning in warnings[:10]:
+            print(f"⚠️ {warning}")
+        if len(warnings) > 10:
+            print(f"⚠️ ほか{len(warnings) - 10}件")
+        size = os.path.getsize(os.path.join(args.base_dir, args.output))
+        print(f"✅ {args.output} を作成しました（版 {header['version']}, ソース {len(header['sources'])}件, "
+              f"セクション {len(header['sections'])}件, {size / 1024:.0f}KB）")
+        return
+
+    path = os.path.join(args.base_dir, args.output)
+    if not os.path.exists(path):
+        print(f"❌ {args.output} がありません。python knowledge_bundle.py compile で作成してください")
+        sys.exit(1)
+    bundle = KnowledgeBundle(path, args.base_dir)
+    if args.command == "info":
+        print(f"版: {bundle.version}（作成 {bundle.header['created_at']}）")
+        for name, info in bundle.header["sections"].items():
+            print(f"  {name}: {info['length'] / 1024:.1f}KB ({info['codec']})")
+        return
+
+    stale = bundle.stale_sources(full=True)
+    if stale:
+        for name in stale:
+            print(f"⚠️ 変更されています: {name}")
+        sys.exit(1)
+    print(f"✅ {args.output}（版 {bundle.version}）はソースと一致しています")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# knowledge_cases.py
+"""
+知識ベースのテキスト（*.txt）を前処理したケースのモデル
+
+各ファイルを一度だけ解析し、ケース・テーマ・見出しごとの KnowledgeCase（__slots__）の
+タプルにする。カテゴリ・ケースコード・関連事項・URLは sys.intern() で共有するため、
+同じURLや関連事項がいくつのケースに現れても文字列は1つで済む。
+
+対応する書式:
+- ケース:   ## 【Case SB‑1】タイトル / 【Case‑1】タイトル
+- 会話:     **ユーザー** / **スタッフ**（** なしも可）の次の行から次の話者・見出しまで
+- テーマ:   【テーマ名】関連事項：A、B、C URL：https://...
+- 見出し:   # で始まるその他の行
+- 最初の見出しまでは、ファイル名（カテゴリ）をタイトルとするセクション
+"""
+
+import re
+import sys
+from itertools import zip_longest
+
+from text_normalizer import normalize_text
+
+# URLに使えるASCII文字だけを対象にする（「URL：https://...」」のような全角の閉じ括弧・句読点を含めない）
+URL_PATTERN = re.compile(r"https?://[A-Za-z0-9\-._~:/?#@!$&'+,;=%]+")
+_CASE = re.compile(r"^(?:#+\s*)?【(Case[^】]*)】\s*(.*)$")
+_THEME = re.compile(r"^【([^】]+)】\s*関連事項[：:](.*?)(?:\s*URL[：:].*)?$")
+_HEADING = re.compile(r"^#+\s*(.*)$")
+_SPEAKERS = {"ユーザー": "user", "スタッフ": "staff"}
+
+
+def split_urls(raw_url):
+    """カンマ区切りで書かれたURLを分割"""
+    return [url.strip() for url in raw_url.split(",") if url.strip()]
+
+
+class KnowledgeCase:
+    """知識ベースの1セクション（ケースのときは code が "Case ..."、それ以外は空）"""
+
+    __slots__ = ("category", "code", "title", "user_turns", "staff_turns", "urls", "keywords", "search_text")
+
+    def __init__(self, category, code, title, user_turns=(), staff_turns=(), urls=(), keywords=()):
+        self.category = sys.intern(category)
+        self.code = sys.intern(code)
+        self.title = title
+        self.user_turns = tuple(user_turns)
+        self.staff_turns = tuple(staff_turns)
+        self.urls = tuple(sys.intern(url) for url in dict.fromkeys(urls))
+        self.keywords = tuple(sys.intern(keyword) for keyword in keywords)
+        self.search_text = normalize_text(self.render()) if self.code else ""
+
+    def __repr__(self):
+        return f"KnowledgeCase({self.category!r}, {self.code!r}, {self.title!r})"
+
+    @property
+    def is_case(self):
+        return bool(self.code)
+
+    def render(self):
+        """元の書式のテキストにする（ケースは見出しと会話、テーマは関連事項）"""
+        if self.code:
+            lines = [f"## 【{self.code}】{self.title}"]
+        elif self.keywords:
+            lines = [f"【{self.title}】関連事項：{'、'.join(self.keywords)}"]
+        else:
+            lines = [self.title]
+        for user, staff in zip_longest(self.user_turns, self.staff_turns):
+            if user is not None:
+                lines += ["", "**ユーザー**", user]
+            if staff is not None:
+                lines += ["", "**スタッフ**", staff]
+        if self.urls:
+            lines.append("URL：" + ",".join(self.urls))
+        return "\n".join(lines)
+
+
+def parse_knowledge_file(category, content):
+    """1ファイル分の本文を KnowledgeCase のタプルにする（本文を1回走査するだけ）"""
+    sections = []
+    current = {"code": "", "title": category, "keywords": [category], "urls": [], "user": [], "staff": []}
+    turn = None     # (話者, 行の一覧)
+
+    def close_turn():
+        if turn and turn[1]:
+            current[turn[0]].append("\n".join(turn[1]))
+
+    def start(code, title, keywords=()):
+        nonlocal current, turn
+        close_turn()
+        turn = None
+        sections.append(current)
+        current = {"code": code, "title": title, "keywords": list(keywords), "urls": [], "user": [], "staff": []}
+
+    for line in content.splitlines():
+        stripped = line.strip()
+        case = _CASE.match(stripped)
+        theme = _THEME.match(stripped) if not case else None
+        heading = _HEADING.match(stripped) if not (case or theme) and stripped.startswith("#") else None
+        speaker = _SPEAKERS.get(stripped.strip("*").strip())
+
+        if case:
+            start(case.group(1).strip(), case.group(2).strip())
+        elif theme:
+            start("", theme.group(1), [kw.strip() for kw in re.split(r"[、,，]", theme.group(2)) if kw.strip()])
+        elif heading and heading.group(1):
+            start("", heading.group(1))
+        elif speaker and current["code"]:
+            close_turn()
+            turn = (speaker, [])
+        elif stripped == "---":
+            close_turn()
+            turn = None
+        elif stripped and turn is not None:
+            turn[1].append(stripped)
+
+        for raw_url in URL_PATTERN.findall(line):
+            current["urls"].extend(split_urls(raw_url))
+    start("", "")
+
+    return tuple(
+        KnowledgeCase(category, section["code"], section["title"], section["user"], section["staff"],
+                      section["urls"], section["keywords"])
+        for section in sections
+        if section["code"] or section["urls"] or section["keywords"]
+    )
@@ -0,0 +1,233 @@
+# knowledge_index.py
+"""
+知識ベース（カテゴリ -> テキスト）の読み込み時索引
+
+読み込み時に一度だけ、ファイルごとの技術用語・URLと、URLがどのケース・テーマ
+（セクション）に書かれていたかを求めておく。質問ごとの処理は辞書の参照と
+質問文の1回の走査だけになり、本文の正規表現・小文字化を繰り返さない。
+
+本文の解析（ケース・テーマ・URL）は knowledge_cases.py が行う。
+
+get_knowledge_base() は読み込んだ知識ベースをプロセス全体（全セッション）で共有し、
+TTLごとに stat() で変更を確認して、変わったファイルだけを読み直す。
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from keyword_matcher import KeywordMatcher, content_terms, match_vocabulary
+from knowledge_cases import parse_knowledge_file
+from text_normalizer import normalize_text
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 知識ベースのテキストファイル（ファイル名から .txt を除いたものがカテゴリ）
+KNOWLEDGE_FILES = [
+    "インバーター.txt", "バッテリー.txt", "水道ポンプ.txt", "冷蔵庫.txt",
+    "車体外装の破損.txt", "ウインドウ.txt", "排水タンク.txt", "雨漏り.txt",
+    "外部電源.txt", "家具.txt", "ルーフベント　換気扇.txt", "電装系.txt",
+    "FFヒーター.txt", "ガスコンロ.txt", "トイレ.txt", "室内LED.txt",
+    "ソーラーパネル.txt", "異音.txt"
+]
+
+# 変更確認（stat）の間隔（秒）
+KNOWLEDGE_BASE_TTL = float(os.getenv("KNOWLEDGE_BASE_TTL", "30"))
+
+
+def guess_blog_title(url):
+    """URLから記事の種類を推測"""
+    if "water-pump" in url or "水道" in url or "ポンプ" in url:
+        return "水道ポンプ関連記事"
+    if "battery" in url or "バッテリー" in url:
+        return "バッテリー関連記事"
+    if "inverter" in url or "インバーター" in url:
+        return "インバーター関連記事"
+    if "rain-leak" in url or "雨漏り" in url:
+        return "雨漏り関連記事"
+    if "electrical" in url or "電気" in url or "電装" in url:
+        return "電気・電装系関連記事"
+    if "shower" in url:
+        return "シャワー・給水関連記事"
+    if "repair" in url or "修理" in url:
+        return "修理関連記事"
+    return "キャンピングカー関連記事"
+
+
+class KnowledgeFile:
+    """知識ベースの1ファイル分の前計算結果"""
+
+    def __init__(self, category, content):
+        self.category = category
+        self.digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        self.category_normalized = normalize_text(category)    # 「ルーフベント　換気扇」-> 「ルーフベント換気扇」
+        self.terms = content_terms(content)     # 本文に含まれる技術用語・トラブル関連キーワード
+        self.cases = parse_knowledge_file(category, content)
+        self.sections = [(case.title, case.keywords, case.urls) for case in self.cases]
+        self.urls = list(dict.fromkeys(url for case in self.cases for url in case.urls))
+
+
+class KnowledgeBase(dict):
+    """カテゴリ -> 本文 の辞書（読み込み時にファイル・URLの索引を作成する）
+
+    previous: 前回の知識ベース。本文が同じオブジェクトのファイルは前計算結果を再利用する。
+    version: 全ファイルの内容から求めた版（下流のキャッシュのキーに使う）
+    """
+
+    def __init__(self, contents=(), previous=None, errors=()):
+        super().__init__(contents)
+        reused = previous._files_by_category if previous is not None else {}
+        self.files = [
+            reused[category] if category in reused and previous[category] is content else KnowledgeFile(category, content)
+            for category, content in self.items()
+        ]
+        self._files_by_category = {file.category: file for file in self.files}
+        self.cases = tuple(case for file in self.files for case in file.cases)
+        self.version = hashlib.sha1(
+            "\n".join(f"{file.category}:{file.digest}" for file in self.files).encode("utf-8")
+        ).hexdigest()[:12]
+        self.errors = list(errors)      # 読み込めなかったファイル: (ファイル名, エラー)
+        self.reloaded = []              # get_knowledge_base() が今回読み込んだファイル名
+        self.urls = list(dict.fromkeys(url for file in self.files for url in file.urls))
+        self.blog_titles = {url: guess_blog_title(url) for url in self.urls}
+
+        # セクションのタイトルに含まれる語彙・関連事項 -> URLを含むセクション
+        self._section_urls = []
+        entries = []
+        for file in self.files:
+            for title, keywords, urls in file.sections:
+                if not urls:
+                    continue
+                hits = match_vocabulary(title)
+                terms = set(keywords) | set(hits.get("main", []) + hits.get("trouble", []))
+                entries += [(term, len(self._section_urls)) for term in terms]
+                self._section_urls.append(urls)
+        self._section_matcher = KeywordMatcher(entries)
+
+    def extracted_keywords(self, normalized_query, query_terms):
+        """質問に含まれるカテゴリ名と、質問・本文の両方に含まれる技術用語（ファイルごと）
+
+        normalized_query: normalize_text() で正規化した質問
+        """
+        keywords = []
+        for file in self.files:
+            if file.category_normalized in normalized_query:
+                keywords.append(file.category_normalized)
+            keywords.extend(term for term in query_terms if term in file.terms)
+        return keywords
+
+    def cases_for(self, category):
+        """カテゴリ（ファイル）のケース（会話を含むセクション）"""
+        file = self._files_by_category.get(category)
+        return [case for case in file.cases if case.is_case] if file else []
+
+    def relevant_cases(self, analysis):
+        """質問の関連カテゴリのケースのうち、質問の語を本文に含むもの
+
+        analysis: analyze_query() の結果（関連カテゴリは KNOWLEDGE_CATEGORY_KEYWORDS で特定済み）
+        """
+        return [case for category in analysis.knowledge_categories
+                for case in self.cases_for(category)
+                if any(word in case.search_text for word in analysis.words)]
+
+    def matching_urls(self, query):
+        """質問と最も一致するケース・テーマ（一致した語の種類が最多のセクション）のURL
+
+        関連事項には「サブバッテリー」のように他ファイルのテーマにも現れる語が多いため、
+        1語でも一致したセクションすべてではなく、最も多く一致したセクションに絞る。
+        """
+        matched = self._section_matcher.find_values(query)
+        if not matched:
+            return []
+        best = max(len(terms) for terms in matched.values())
+        return list(dict.fromkeys(url for section, terms in matched.items() if len(terms) == best
+                                  for url in self._section_urls[section]))
+
+    def blog_links(self, keywords):
+        """本文中の全URLのブログリンク（タイトルはURLから推測）"""
+        return [{"title": self.blog_titles[url], "url": url, "keywords": list(keywords)} for url in self.urls]
+
+
+def as_knowledge_base(knowledge_base):
+    """索引付きの知識ベースにする（load_knowledge_base() の結果はそのまま返す）"""
+    if isinstance(knowledge_base, KnowledgeBase):
+        return knowledge_base
+    return KnowledgeBase(knowledge_base or {})
+
+
+_lock = threading.Lock()
+_knowledge_bases = {}   # ディレクトリ -> {"stats", "knowledge_base", "checked_at"}
+
+
+def _file_stats(base_dir):
+    # ファイル名 -> (更新時刻, サイズ)。存在しないファイルは含めない
+    stats = {}
+    for file_name in KNOWLEDGE_FILES:
+        try:
+            stat = os.stat(os.path.join(base_dir, file_name))
+        except OSError:
+            continue
+        stats[file_name] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+
+def get_knowledge_base(base_dir=None, force=False):
+    """知識ベースをプロセス全体で共有して返す
+
+    前回の確認から KNOWLEDGE_BASE_TTL 秒以内はそのまま返す。それ以降は stat() で
+    更新時刻・サイズを比べ、変わったファイルだけを読み直して索引を作り直す。
+    最初の読み込みでは、ソースと一致するバンドルがあれば解析せずにそれを使う。
+    読み込んだファイル名は knowledge_base.reloaded に入る。
+    """
+    base_dir = os.path.abspath(base_dir or BASE_DIR)
+    now = time.monotonic()
+    with _lock:
+        entry = _knowledge_bases.get(base_dir)
+        if entry and not force and now - entry["checked_at"] < KNOWLEDGE_BASE_TTL:
+            return entry["knowledge_base"]
+
+        stats = _file_stats(base_dir)
+        if entry and stats == entry["stats"]:
+            entry["checked_at"] = now
+            return entry["knowledge_base"]
+
+        # 初回はコンパイル済みのバンドル（knowledge_bundle.py）がソースと一致すれば使う
+        if entry is None:
+            from knowledge_bundle import bundled
+            knowledge_base = bundled("knowledge_base", KNOWLEDGE_FILES, base_dir)
+            if knowledge_base is not None:
+                _knowledge_bases[base_dir] = {"stats": stats, "knowledge_base": knowledge_base, "checked_at": now}
+                return knowledge_base
+
+        previous = entry["knowledge_base"] if entry else None
+        contents, errors, reloaded = {}, [], []
+        for file_name, stamp in stats.items():
+            category = file_name.replace(".txt", "")
+            if previous is not None and entry["stats"].get(file_name) == stamp and category in previous:
+                contents[category] = previous[category]
+                continue
+            try:
+                with open(os.path.join(base_dir, file_name), "r", encoding="utf-8") as f:
+                    content = f.read()
+            except Exception as e:
+                errors.append((file_name, str(e)))
+                continue
+            # 更新時刻だけが変わった場合は前回の本文（と前計算結果）を使う
+            if previous is not None and category in previous and previous[category] == content:
+                content = previous[category]
+            contents[category] = content
+            reloaded.append(file_name)
+
+        knowledge_base = KnowledgeBase(contents, previous=previous, errors=errors)
+        knowledge_base.reloaded = reloaded
+        _knowledge_bases[base_dir] = {"stats": stats, "knowledge_base": knowledge_base, "checked_at": now}
+        return knowledge_base
+
+
+def invalidate_knowledge_base(base_dir=None):
+    """次回の get_knowledge_base() で変更確認を強制する（変わっていないファイルは読み直さない）"""
+    with _lock:
+        entry = _knowledge_bases.get(os.path.abspath(base_dir or BASE_DIR))
+        if entry:
+            entry["checked_at"] = float("-inf")
@@ -1,5 +1,8 @@
 
-from notion_client import Client
+from shared_clients import get_notion_client, call_notion
+from notion_snapshot import refresh_snapshot, read_snapshot_pages
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
 import os, re, sys
 from typing import Dict, List, Any
 
@@ -9,12 +12,24 @@ NODE_DB   = os.getenv("NODE_DB_ID", "").strip()
 CASE_DB   = os.getenv("CASE_DB_ID", "").strip()
 ITEM_DB   = os.getenv("ITEM_DB_ID", "").strip()
 DRY_RUN   = os.getenv("DRY_RUN", "").strip().lower() in {"1","true","yes","y","on"}
-
-if not API_KEY or not NODE_DB or not CASE_DB or not ITEM_DB:
+LINK_WORKERS = int(os.getenv("LINK_WORKERS", "4"))   # リレーション更新の並列数
+
+parser = argparse.ArgumentParser(description="Notionのリレーション自動リンク")
+parser.add_argument("--from-snapshot", action="store_true",
+                    help="APIを呼ばずに保存済みスナップショットだけでリンク計画を表示する（DRY_RUN扱い）")
+parser.add_argument("--full-refresh", action="store_true",
+                    help="スナップショットの差分更新をせず全ページを取得し直す")
+args = parser.parse_args()
+FROM_SNAPSHOT = args.from_snapshot
+FULL_REFRESH  = args.full_refresh
+if FROM_SNAPSHOT:
+    DRY_RUN = True
+
+if (not API_KEY and not FROM_SNAPSHOT) or not NODE_DB or not CASE_DB or not ITEM_DB:
     print("環境変数 NOTION_API_KEY / NODE_DB_ID / CASE_DB_ID / ITEM_DB_ID を設定してください。")
     sys.exit(1)
 
-client = Client(auth=API_KEY)
+client = None if FROM_SNAPSHOT else get_notion_client(API_KEY)
 
 # ====== プロパティ名 ======
 # 修理ケースDB
@@ -45,13 +60,16 @@ def split_multi_text(s: str):
     return [w.strip() for w in s2.split("|") if w.strip()]
 
 def fetch_all_pages(db_id: str):
-    results, cursor = [], None
-    while True:
-        resp = client.databases.query(database_id=db_id, start_cursor=cursor) if cursor else client.databases.query(database_id=db_id)
-        results.extend(resp["results"])
-        if not resp.get("has_more"): break
-        cursor = resp.get("next_cursor")
-    return results
+    # ローカルスナップショットを last_edited_time で差分更新して使う
+    if FROM_SNAPSHOT:
+        try:
+            return read_snapshot_pages(db_id)
+        except FileNotFoundError as e:
+            print(f"[ERROR] {e}（先に --from-snapshot なしで一度実行してください）")
+            sys.exit(1)
+    pages, fetched = refresh_snapshot(client, db_id, full=FULL_REFRESH)
+    print(f"[INFO] {db_id}: 取得 {fetched}件 / スナップショット {len(pages)}件")
+    return pages
 
 def get_prop_text(prop: dict) -> str:
     t = prop.get("type")
@@ -75,10 +93,39 @@ def update_page_relation(page_id: str, rel_name: str, target_ids):
     if DRY_RUN:
         print(f"[DRY RUN] update relation {rel_name} -> {len(target_ids)}件 on page {page_id}")
         return
-    client.pages.update(page_id=page_id, properties={
+    call_notion(client.pages.update, page_id=page_id, properties={
         rel_name: {"type":"relation","relation":[{"id": rid} for rid in target_ids]}
     })
 
+def get_relation_ids(prop: dict):
+    # 25件を超えるリレーションはページ取得時に切り詰められる（has_more）ため比較できない
+    if not prop or prop.get("type") != "relation" or prop.get("has_more"):
+        return None
+    return [r.get("id","") for r in prop.get("relation",[])]
+
+def plan_relation_update(page: dict, rel_name: str, target_ids):
+    """現在のリレーションが目的のIDと同じならNone、違えば更新内容を返す"""
+    target_ids = list(dict.fromkeys(target_ids))
+    current = get_relation_ids(page["properties"].get(rel_name))
+    if current is not None and set(current) == set(target_ids):
+        return None
+    return (page["id"], rel_name, target_ids)
+
+def apply_relation_updates(updates):
+    """リレーション更新を共有レート制限の下で並列に実行（戻り値: 変更件数, 失敗件数）"""
+    changed = failed = 0
+    with ThreadPoolExecutor(max_workers=LINK_WORKERS) as executor:
+        futures = {executor.submit(update_page_relation, *u): u for u in updates}
+        for future in as_completed(futures):
+            page_id, rel_name, _ = futures[future]
+            try:
+                future.result()
+                changed += 1
+            except Exception as e:
+                failed += 1
+                print(f"[ERROR] {rel_name} の更新に失敗 (page {page_id}): {e}")
+    return changed, failed
+
 # ====== 2) マスター辞書の作成 ======
 # ケース：case_id -> page_id
 cases = fetch_all_pages(CASE_DB)
@@ -103,7 +150,8 @@ print(f"[INFO] 部品・工具件数: {len(items)} / 部品名あり: {len(item_
 
 # ====== 3) 診断→ケース のリンク（終端だけ） ======
 nodes = fetch_all_pages(NODE_DB)
-link_count = 0
+node_updates = []
+unchanged_nodes = 0
 skip_term_empty = 0
 skip_not_found = 0
 
@@ -119,14 +167,20 @@ for p in nodes:
     if term not in case_by_id:
         skip_not_found += 1
         continue
-    update_page_relation(p["id"], REL_NODE_TO_CASE, [case_by_id[term]])
-    link_count += 1
+    update = plan_relation_update(p, REL_NODE_TO_CASE, [case_by_id[term]])
+    if update:
+        node_updates.append(update)
+    else:
+        unchanged_nodes += 1
 
-print(f"[DONE] 診断→ケース: リンク {link_count}件 / terminal_case_id 空 {skip_term_empty} / case_id不明 {skip_not_found}")
+changed, failed = apply_relation_updates(node_updates)
+print(f"[DONE] 診断→ケース: 変更 {changed}件 / 変更なし {unchanged_nodes}件 / 失敗 {failed}件 / terminal_case_id 空 {skip_term_empty} / case_id不明 {skip_not_found}")
 
 # ====== 4) ケース→部品/工具 のリンク ======
 case_item_links = 0
 case_tool_links = 0
+case_updates = []
+unchanged_cases = 0
 
 for p in cases:
     props = p["properties"]
@@ -134,8 +188,12 @@ for p in cases:
     parts = get_prop_multi(props.get(P_HITSUYO_BUHIN, {"type":"multi_select","multi_select":[]}))
     part_ids = [item_map[n]["id"] for n in parts if n in item_map]
     if part_ids:
-        update_page_relation(p["id"], REL_CASE_TO_ITEMS, part_ids)
         case_item_links += 1
+        update = plan_relation_update(p, REL_CASE_TO_ITEMS, part_ids)
+        if update:
+            case_updates.append(update)
+        else:
+            unchanged_cases += 1
 
     # 必要な工具（multi-select or text）
     tools = get_prop_multi(props.get(P_HITSUYO_KOUGU, {"type":"multi_select","multi_select":[]}))
@@ -148,8 +206,13 @@ for p in cases:
             else:
                 tool_ids.append(item_map[n]["id"])
     if tool_ids:
-        update_page_relation(p["id"], REL_CASE_TO_TOOLS, tool_ids)
         case_tool_links += 1
-
-print(f"[DONE] ケース→部品/工具: 部品リンク {case_item_links}件 / 工具リンク {case_tool_links}件")
-print("完了。DRY_RUN=true で検証のみも可能です。")
+        update = plan_relation_update(p, REL_CASE_TO_TOOLS, tool_ids)
+        if update:
+            case_updates.append(update)
+        else:
+            unchanged_cases += 1
+
+changed, failed = apply_relation_updates(case_updates)
+print(f"[DONE] ケース→部品/工具: 部品リンク {case_item_links}件 / 工具リンク {case_tool_links}件 / 変更 {changed}件 / 変更なし {unchanged_cases}件 / 失敗 {failed}件")
+print("完了。DRY_RUN=true または --from-snapshot で検証のみも可能です。")
@@ -0,0 +1,59 @@
+# notion_loader.py
+"""
+Notionデータベースのページをカーソル単位でストリーミング読み込みするユーティリティ
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from shared_clients import call_notion
+
+# Notion APIの1リクエストあたりの最大取得件数
+PAGE_SIZE = 100
+
+
+def _query_page(client, database_id, cursor=None, filter=None, sorts=None, page_size=PAGE_SIZE):
+    """databases.queryを1回だけ実行（1ページ分・共有レート制限の下で429は再試行）"""
+    kwargs = {"database_id": database_id, "page_size": page_size}
+    if cursor:
+        kwargs["start_cursor"] = cursor
+    if filter:
+        kwargs["filter"] = filter
+    if sorts:
+        kwargs["sorts"] = sorts
+    return call_notion(client.databases.query, **kwargs)
+
+
+def iter_query_responses(client, database_id, filter=None, sorts=None, page_size=PAGE_SIZE, prefetch=True):
+    """has_more / next_cursor を辿ってクエリ結果を1レスポンスずつ返すジェネレーター
+
+    prefetch=True の場合、ページNを呼び出し側が処理している間に
+    ページN+1の取得をバックグラウンドスレッドで先行して行う。
+    保持するのは常に最大2ページ分のみ。
+    """
+    if not prefetch:
+        cursor = None
+        while True:
+            response = _query_page(client, database_id, cursor, filter, sorts, page_size)
+            yield response
+            if not response.get("has_more"):
+                break
+            cursor = response.get("next_cursor")
+        return
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notion-prefetch")
+    try:
+        future = executor.submit(_query_page, client, database_id, None, filter, sorts, page_size)
+        while future is not None:
+            response = future.result()
+            cursor = response.get("next_cursor") if response.get("has_more") else None
+            # 次ページの取得を先に投げてから、現在のページを返す
+            future = executor.submit(_query_page, client, database_id, cursor, filter, sorts, page_size) if cursor else None
+            yield response
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_database_pages(client, database_id, filter=None, sorts=None, page_size=PAGE_SIZE, prefetch=True):
+    """データベースの全ページ（行）を1件ずつ返すジェネレーター"""
+    for response in iter_query_responses(client, database_id, filter, sorts, page_size, prefetch):
+        yield from response.get("results", [])
@@ -0,0 +1,229 @@
+# notion_migration.py
+"""
+Notionへの一括移行エンジン
+
+- 移行モード: 移行元キー -> 作成したページID をジャーナル（JSON Lines）に1件ずつ
+  追記し、再実行時はジャーナルにあるキーを作成済みとして読み飛ばす。
+- 同期モード: 既存ページを1回だけ取得し、正規化したプロパティのハッシュを
+  比較して、必要な作成・更新・アーカイブだけを実行する。
+
+書き込みはどちらも共有レート制限（shared_clients.call_notion）の下で並列に行う。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from notion_loader import iter_database_pages
+from shared_clients import call_notion
+
+MIGRATION_WORKERS = int(os.getenv("MIGRATION_WORKERS", "4"))
+MIGRATION_JOURNAL_DIR = os.getenv("MIGRATION_JOURNAL_DIR", "migration_journal")
+
+
+class MigrationJournal:
+    """移行元キー -> 作成済みページID のチェックポイント（追記専用）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 書き込み途中で中断した最終行は無視する
+                        continue
+                    self.entries[entry["key"]] = entry["page_id"]
+
+    @classmethod
+    def for_database(cls, database_id, label):
+        os.makedirs(MIGRATION_JOURNAL_DIR, exist_ok=True)
+        return cls(os.path.join(MIGRATION_JOURNAL_DIR, f"{label}_{database_id}.jsonl"))
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def record(self, key, page_id):
+        with self.lock:
+            self.entries[key] = page_id
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "page_id": page_id}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}分{seconds:02d}秒" if minutes else f"{seconds}秒"
+
+
+def migrate_pages(client, database_id, records, journal, workers=None, label="ページ"):
+    """(移行元キー, properties) の一覧をNotionに作成する
+
+    ジャーナルに記録済みのキーは作成しない。
+    戻り値: (キー -> ページID の辞書（既存分を含む）, 失敗した (キー, エラー) の一覧)
+    """
+    records = list(records)
+    pending = [(key, properties) for key, properties in records if key not in journal]
+    skipped = len(records) - len(pending)
+    total = len(pending)
+    print(f"📋 {label}: 全{len(records)}件（作成済み {skipped}件・今回作成 {total}件）")
+
+    failed = []
+    if pending:
+        def create(key, properties):
+            response = call_notion(client.pages.create, parent={"database_id": database_id}, properties=properties,
+                                   idempotent=False)
+            journal.record(key, response["id"])
+            return key
+
+        start = time.monotonic()
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers or MIGRATION_WORKERS) as executor:
+            futures = {executor.submit(create, key, properties): key for key, properties in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                done += 1
+                elapsed = time.monotonic() - start
+                rate = done / elapsed if elapsed > 0 else 0.0
+                eta = (total - done) / rate if rate > 0 else 0.0
+                try:
+                    future.result()
+                    print(f"✅ [{done}/{total}] {key} | {rate:.1f}件/秒 | 残り約{_format_seconds(eta)}")
+                except Exception as e:
+                    failed.append((key, str(e)))
+                    print(f"❌ [{done}/{total}] {key} の追加に失敗: {e}")
+
+    created = {key: journal.entries[key] for key, _ in records if key in journal}
+    return created, failed
+
+
+# === 同期モード（差分だけを書き込む） ===
+SYNC_PROPERTY_TYPES = ("title", "rich_text", "checkbox", "select", "multi_select", "number", "relation", "url")
+
+
+def _property_value(value):
+    """リクエスト形式・応答形式どちらのプロパティ値も比較用の (型, 値) に正規化"""
+    prop_type = value.get("type") or next((t for t in SYNC_PROPERTY_TYPES if t in value), None)
+    raw = value.get(prop_type)
+    if prop_type in ("title", "rich_text"):
+        text = "".join(
+            segment["plain_text"] if "plain_text" in segment else segment.get("text", {}).get("content", "")
+            for segment in raw or []
+        )
+        return prop_type, text.replace("\r\n", "\n")
+    if prop_type == "select":
+        return prop_type, raw.get("name", "") if raw else ""
+    if prop_type == "multi_select":
+        return prop_type, sorted(option.get("name", "") for option in raw or [])
+    if prop_type == "relation":
+        return prop_type, sorted(relation.get("id", "") for relation in raw or [])
+    if prop_type == "checkbox":
+        return prop_type, bool(raw)
+    return prop_type, raw
+
+
+def normalize_properties(properties, names):
+    """指定したプロパティだけを正規化（移行元が管理していないプロパティは比較しない）"""
+    return {name: _property_value(properties[name]) if name in properties else None for name in names}
+
+
+def properties_hash(normalized):
+    data = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def _key_of(properties, key_property):
+    return _property_value(properties.get(key_property, {"type": "title", "title": []}))[1].strip()
+
+
+def sync_pages(client, database_id, desired, key_property, dry_run=False, archive=False, workers=None, label="ページ"):
+    """既存ページとの差分を取り、必要な作成・更新・アーカイブだけを実行する
+
+    desired: 移行元から作成した properties の一覧（key_propertyの値でページを対応付ける）
+    archive: 移行元に存在しないページと、同じキーの重複ページをアーカイブする
+    戻り値: (キー -> ページID の辞書, 失敗した (キー, エラー) の一覧)
+    """
+    existing = {}
+    duplicates = []
+    for page in iter_database_pages(client, database_id):
+        key = _key_of(page["properties"], key_property)
+        if key in existing:
+            duplicates.append((key, page["id"]))
+        else:
+            existing[key] = page
+
+    creates, updates, pages = [], [], {}
+    seen = set()
+    for properties in desired:
+        key = _key_of(properties, key_property)
+        if key in seen:
+            continue
+        seen.add(key)
+        page = existing.get(key)
+        if page is None:
+            creates.append((key, properties))
+            continue
+        pages[key] = page["id"]
+        want = normalize_properties(properties, properties)
+        have = normalize_properties(page["properties"], properties)
+        if properties_hash(want) != properties_hash(have):
+            changed = {name: properties[name] for name in properties if want[name] != have[name]}
+            updates.append((key, page["id"], changed))
+
+    missing = [(key, page["id"]) for key, page in existing.items() if key not in seen]
+    archives = missing + duplicates if archive else []
+
+    unchanged = len(seen) - len(creates) - len(updates)
+    print(f"📋 {label}: 作成 {len(creates)}件 / 更新 {len(updates)}件 / アーカイブ {len(archives)}件 / 変更なし {unchanged}件")
+    if not archive and (missing or duplicates):
+        print(f"  💡 移行元にないページ {len(missing)}件・重複 {len(duplicates)}件は --archive 指定時のみアーカイブします")
+
+    if dry_run:
+        for key, _ in creates:
+            print(f"  ＋ 作成: {key}")
+        for key, _, changed in updates:
+            print(f"  ～ 更新: {key} ({', '.join(changed)})")
+        for key, _ in archives:
+            print(f"  － アーカイブ: {key}")
+        return pages, []
+
+    def create(key, properties):
+        response = call_notion(client.pages.create, parent={"database_id": database_id}, properties=properties,
+                               idempotent=False)
+        return key, response["id"]
+
+    def update(key, page_id, changed):
+        call_notion(client.pages.update, page_id=page_id, properties=changed)
+        return key, page_id
+
+    def archive_page(key, page_id):
+        call_notion(client.pages.update, page_id=page_id, archived=True)
+        return None, page_id
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers or MIGRATION_WORKERS) as executor:
+        futures = {executor.submit(create, *args): ("作成", args[0]) for args in creates}
+        futures.update({executor.submit(update, *args): ("更新", args[0]) for args in updates})
+        futures.update({executor.submit(archive_page, *args): ("アーカイブ", args[0]) for args in archives})
+        for future in as_completed(futures):
+            action, key = futures[future]
+            try:
+                result_key, page_id = future.result()
+                if result_key is not None:
+                    pages[result_key] = page_id
+                print(f"✅ {action}: {key}")
+            except Exception as e:
+                failed.append((key, str(e)))
+                print(f"❌ {action}: {key} に失敗: {e}")
+
+    return pages, failed
@@ -0,0 +1,171 @@
+# notion_schema.py
+"""
+Notionプロパティの宣言的スキーマと、そこから生成する抽出関数
+
+スキーマは {フィールド名: (Notionプロパティ名, 型)} の辞書で定義する。
+compile_schema() で1回だけ抽出関数に変換し、ページの一括変換に使い回す。
+"""
+
+
+def _plain_text(segments):
+    # title/rich_textは装飾ごとにセグメントが分かれるため全セグメントを連結する
+    return "".join(segment.get("plain_text", "") for segment in segments)
+
+
+def _comma_list(segments):
+    return [value.strip() for value in _plain_text(segments).split(",") if value.strip()]
+
+
+def _select_name(option):
+    return option.get("name", "")
+
+
+def _multi_select_names(options):
+    return [option.get("name", "") for option in options]
+
+
+def _relation_ids(relations):
+    return [relation.get("id", "") for relation in relations]
+
+
+def _none():
+    return None
+
+
+# 型名 -> (Notion側のtype, 値の変換関数, 空のときの既定値を作る関数)
+PROPERTY_TYPES = {
+    "title": ("title", _plain_text, str),
+    "rich_text": ("rich_text", _plain_text, str),
+    "csv": ("rich_text", _comma_list, list),          # カンマ区切りのrich_text
+    "select": ("select", _select_name, str),
+    "multi_select": ("multi_select", _multi_select_names, list),
+    "relation": ("relation", _relation_ids, list),
+    "number": ("number", lambda value: value, _none),
+    "checkbox": ("checkbox", bool, bool),
+    "url": ("url", str, str),
+}
+
+
+def compile_schema(schema, required=()):
+    """スキーマから page -> レコード(dict) の抽出関数を生成
+
+    型に"id"を指定したフィールドにはページIDが入る（プロパティ名はNone）。
+    requiredのフィールドが空のページはNoneを返す（parse_pagesで読み飛ばす）。
+    """
+    fields = []
+    for field, (prop_name, type_name) in schema.items():
+        if type_name == "id":
+            fields.append((field, None, None, None, None))
+            continue
+        if type_name not in PROPERTY_TYPES:
+            raise ValueError(f"未対応のプロパティ型です: {field} ({type_name})")
+        notion_type, convert, default = PROPERTY_TYPES[type_name]
+        fields.append((field, prop_name, notion_type, convert, default))
+    fields = tuple(fields)
+    required = tuple(required)
+
+    def extract(page):
+        properties = page.get("properties") or {}
+        record = {}
+        for field, prop_name, notion_type, convert, default in fields:
+            if notion_type is None:
+                record[field] = page.get("id", "")
+                continue
+            prop = properties.get(prop_name)
+            value = prop.get(notion_type) if prop and prop.get("type") == notion_type else None
+            record[field] = default() if value is None else convert(value)
+        for field in required:
+            if not record[field]:
+                return None
+        return record
+
+    return extract
+
+
+def parse_pages(pages, extract):
+    """ページのイテラブルを一括でレコードに変換（必須項目が空のページは除外）"""
+    for page in pages:
+        record = extract(page)
+        if record is not None:
+            yield record
+
+
+# === 診断フロー・修理ケースDB（streamlit_app*.py） ===
+DIAGNOSTIC_NODE_SCHEMA = {
+    "node_id": ("ノードID", "title"),
+    "question": ("質問内容", "rich_text"),
+    "category": ("カテゴリ", "rich_text"),
+    "is_start": ("開始フラグ", "checkbox"),
+    "is_end": ("終端フラグ", "checkbox"),
+    "next_nodes": ("次のノード", "csv"),
+    "result": ("診断結果", "rich_text"),
+    "terminal_case_id": ("terminal_case_id", "rich_text"),
+    "related_repair_cases": ("修理ケース", "relation"),
+}
+
+REPAIR_CASE_SCHEMA = {
+    "case_id": ("ケースID", "title"),
+    "symptoms": ("症状", "rich_text"),
+    "repair_steps": ("修理手順", "rich_text"),
+    "parts": ("必要な部品", "rich_text"),
+    "tools": ("必要な工具", "rich_text"),
+    "difficulty": ("難易度", "rich_text"),
+    "related_diagnostic_nodes": ("診断ノード", "relation"),
+    "related_parts": ("必要部品", "relation"),
+}
+
+parse_diagnostic_node = compile_schema(DIAGNOSTIC_NODE_SCHEMA, required=("node_id",))
+parse_repair_case = compile_schema(REPAIR_CASE_SCHEMA, required=("case_id",))
+
+
+# === ナレッジベース用DB（enhanced_knowledge_base_app.py） ===
+KB_NODE_SCHEMA = {
+    "id": (None, "id"),
+    "title": ("タイトル", "title"),
+    "category": ("カテゴリ", "select"),
+    "symptoms": ("症状", "multi_select"),
+    "related_case_ids": ("関連修理ケース", "relation"),
+    "related_item_ids": ("関連部品・工具", "relation"),
+}
+
+KB_CASE_SCHEMA = {
+    "id": (None, "id"),
+    "title": ("タイトル", "title"),
+    "category": ("カテゴリ", "select"),
+    "symptoms": ("症状", "multi_select"),
+    "solution": ("解決方法", "rich_text"),
+    # 必要な部品・工具はリレーション形式と従来のmulti_select形式の両方に対応
+    "parts": ("必要な部品", "multi_select"),
+    "part_ids": ("必要な部品", "relation"),
+    "tools": ("必要な工具", "multi_select"),
+    "tool_ids": ("必要な工具", "relation"),
+    "related_node_ids": ("関連診断ノード", "relation"),
+}
+
+KB_CASE_SUMMARY_SCHEMA = {
+    "id": (None, "id"),
+    "title": ("タイトル", "title"),
+    "category": ("カテゴリ", "select"),
+    "solution": ("解決方法", "rich_text"),
+}
+
+KB_NODE_SUMMARY_SCHEMA = {
+    "id": (None, "id"),
+    "title": ("タイトル", "title"),
+    "category": ("カテゴリ", "select"),
+    "symptoms": ("症状", "multi_select"),
+}
+
+KB_ITEM_SCHEMA = {
+    "id": (None, "id"),
+    "name": ("名前", "title"),
+    "category": ("カテゴリ", "select"),
+    "price": ("価格", "number"),
+    "supplier": ("サプライヤー", "rich_text"),
+}
+
+parse_kb_node = compile_schema(KB_NODE_SCHEMA)
+parse_kb_case = compile_schema(KB_CASE_SCHEMA)
+parse_kb_case_summary = compile_schema(KB_CASE_SUMMARY_SCHEMA)
+parse_kb_node_summary = compile_schema(KB_NODE_SUMMARY_SCHEMA)
+parse_kb_item = compile_schema(KB_ITEM_SCHEMA)
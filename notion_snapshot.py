@@ -0,0 +1,80 @@
+# notion_snapshot.py
+"""
+Notionデータベースのローカルスナップショットキャッシュ
+
+データベースごとに全ページをJSONファイルに保存し、次回以降は
+last_edited_time が前回の最新時刻以降のページだけを取得して差し替える。
+Notionの last_edited_time は分単位に丸められるため、最新時刻と同じ時刻の
+ページも取り直す（on_or_after）。
+
+注意: アーカイブ・削除されたページはクエリ結果に現れないため差分更新では
+検出できない。定期的に full=True で取り直すこと。
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+from notion_loader import iter_database_pages
+
+NOTION_SNAPSHOT_DIR = os.getenv("NOTION_SNAPSHOT_DIR", "notion_snapshot")
+
+
+def snapshot_path(database_id):
+    return os.path.join(NOTION_SNAPSHOT_DIR, f"{database_id}.json")
+
+
+def load_snapshot(database_id):
+    """保存済みのスナップショット（なければNone）"""
+    path = snapshot_path(database_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_snapshot(snapshot):
+    # 書き込み途中で中断しても前回のファイルが壊れないように置き換える
+    os.makedirs(NOTION_SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(snapshot["database_id"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def refresh_snapshot(client, database_id, full=False):
+    """スナップショットを差分更新して保存し、ページの一覧を返す
+
+    戻り値: (ページの一覧, 今回取得したページ数)
+    """
+    snapshot = None if full else load_snapshot(database_id)
+    if snapshot is None:
+        pages = {page["id"]: page for page in iter_database_pages(client, database_id)}
+        fetched = len(pages)
+    else:
+        pages = snapshot["pages"]
+        notion_filter = None
+        if snapshot.get("cursor"):
+            notion_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": snapshot["cursor"]}}
+        fetched = 0
+        for page in iter_database_pages(client, database_id, filter=notion_filter):
+            pages[page["id"]] = page
+            fetched += 1
+
+    cursor = max((page.get("last_edited_time", "") for page in pages.values()), default="")
+    save_snapshot({
+        "database_id": database_id,
+        "synced_at": datetime.now(timezone.utc).isoformat(),
+        "cursor": cursor,
+        "pages": pages,
+    })
+    return list(pages.values()), fetched
+
+
+def read_snapshot_pages(database_id):
+    """保存済みスナップショットのページ一覧（オフライン用・なければFileNotFoundError）"""
+    snapshot = load_snapshot(database_id)
+    if snapshot is None:
+        raise FileNotFoundError(f"スナップショットがありません: {snapshot_path(database_id)}")
+    return list(snapshot["pages"].values())
@@ -0,0 +1,52 @@
+# query_analysis.py
+"""
+質問文の解析結果（1回の回答につき一度だけ作成する）
+
+正規化（text_normalizer.py）・語彙の照合（主要キーワード・技術用語・トラブル用語・カテゴリ）を
+質問ごとに一度だけ行い、関連知識の抽出・関連ブログの採点・ブログの分類は
+すべてこの結果を参照する。関数は質問文の代わりに QueryAnalysis を受け取れる。
+"""
+
+from functools import lru_cache
+
+from keyword_matcher import KNOWLEDGE_CATEGORY_KEYWORDS, category_for_blog, category_for_query, match_vocabulary
+from text_normalizer import normalize_text
+
+
+class QueryAnalysis:
+    """質問文1件の解析結果"""
+
+    __slots__ = ("text", "normalized", "words", "hits", "keywords", "terms", "trouble", "category", "knowledge_categories")
+
+    def __init__(self, text):
+        self.text = text
+        self.normalized = normalize_text(text)
+        # 空白で区切った語（日本語の間の空白は正規化で除かれるため、区切ってから正規化する）
+        self.words = tuple(normalize_text(word) for word in text.split())
+        self.hits = match_vocabulary(text)      # 語彙の種類 -> 一致したキーワード
+        self.trouble = tuple(self.hits.get("trouble", []))
+        # 主要キーワード（ブログの採点用）と、知識ベース本文と照合する技術用語
+        self.keywords = tuple(self.hits.get("main", [])) + self.trouble
+        self.terms = tuple(self.hits.get("tech", [])) + self.trouble
+        self.category = category_for_query(self.hits)
+        self.knowledge_categories = tuple(category for category, _ in KNOWLEDGE_CATEGORY_KEYWORDS
+                                          if ("knowledge", category) in self.hits)
+
+    def __repr__(self):
+        return f"QueryAnalysis({self.text!r}, category={self.category!r})"
+
+    def blog_category(self, blog, labels=None):
+        """質問とブログの両方が当てはまる最初のカテゴリー"""
+        return category_for_blog(blog, self.hits, labels)
+
+
+@lru_cache(maxsize=64)
+def _analyze(text):
+    return QueryAnalysis(text)
+
+
+def analyze_query(query):
+    """質問文を解析する（QueryAnalysis はそのまま返す。同じ質問文は再解析しない）"""
+    if isinstance(query, QueryAnalysis):
+        return query
+    return _analyze(query or "")
@@ -0,0 +1,108 @@
+# repair_index.py
+"""
+終端ノード -> 修理ケース・部品・工具・費用・作業時間 の索引
+
+診断データの読み込み時に一度だけ作成し、診断結果の表示時は辞書を引くだけにする
+（終端ノードごとに修理ケースを取得・絞り込む必要がなくなる）。
+
+対応付けには既存データの明示的なキーを使う:
+- 診断ノードの terminal_case_id -> 修理ケースCSVの terminal_case_id / case_id
+- case_items_bridge.csv の case_id -> 部品・工具名
+"""
+
+import csv
+import os
+import re
+
+CASE_CSV_FILES = ("修理ケースDB 24d709bb38f18039a8b3e0bec10bb7eb.csv", "battery_cases_with_keys.csv")
+CASE_ITEMS_FILE = "case_items_bridge.csv"
+
+
+def _read_csv(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _to_int(value):
+    digits = re.sub(r"[^\d]", "", str(value or ""))
+    return int(digits) if digits else None
+
+
+def _split_names(text):
+    return [name.strip() for name in re.split(r"[,、，/・]", text or "") if name.strip()]
+
+
+def load_repair_cases_csv(paths):
+    """修理ケースCSVを case_id -> 行 に変換（同じIDは先に読んだファイルを優先）"""
+    rows = {}
+    for path in paths:
+        for row in _read_csv(path):
+            case_id = (row.get("terminal_case_id") or row.get("case_id") or row.get("対象名称") or "").strip()
+            if case_id:
+                rows.setdefault(case_id, row)
+    return rows
+
+
+def load_case_items(path):
+    """case_items_bridge.csv を case_id -> {"部品": [...], "工具": [...]} に変換"""
+    items = {}
+    for row in _read_csv(path):
+        case_id = (row.get("case_id") or "").strip()
+        name = (row.get("name") or "").strip()
+        if case_id and name:
+            items.setdefault(case_id, {"部品": [], "工具": []}).setdefault(row.get("role", "部品"), []).append(name)
+    return items
+
+
+def repair_info_from_row(case_id, row, case_items=None):
+    """修理ケースCSVの1行を表示用の辞書にする（キーはNotionの修理ケースと同じ）"""
+    bridged = (case_items or {}).get(case_id, {})
+    part_list = tuple(bridged.get("部品") or _split_names(row.get("必要な部品")))
+    tool_list = tuple(bridged.get("工具") or _split_names(row.get("必要な工具")))
+    return {
+        "case_id": case_id,
+        "symptoms": row.get("症状", ""),
+        "cause": row.get("原因", ""),
+        "repair_steps": (row.get("修理手順", "") or "").replace("<br>", "\n"),
+        "parts": ", ".join(part_list),
+        "tools": ", ".join(tool_list),
+        "part_list": part_list,
+        "tool_list": tool_list,
+        "difficulty": row.get("難易度", ""),
+        "cost": _to_int(row.get("推定コスト") or row.get("推定コスト（円）")),
+        "minutes": _to_int(row.get("作業時間") or row.get("作業時間（分）")),
+        "notes": row.get("注意事項", ""),
+    }
+
+
+def build_terminal_index(graph, case_rows, case_items=None):
+    """コンパイル済み診断グラフの終端ノード番号 -> 修理情報 の辞書を作成
+
+    terminal_case_id が空、または修理ケースが見つからない終端ノードは含めない。
+    """
+    infos = {}
+    index = {}
+    for node in graph.terminals:
+        case_id = graph.terminal_case_ids[node]
+        if not case_id or case_id not in case_rows:
+            continue
+        if case_id not in infos:
+            infos[case_id] = repair_info_from_row(case_id, case_rows[case_id], case_items)
+        index[node] = infos[case_id]
+    return index
+
+
+def load_terminal_index(graph, base_dir=None):
+    """リポジトリの修理ケースCSV・部品ブリッジから終端ノードの索引を作成"""
+    from knowledge_bundle import bundled
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    # ソースと一致するバンドル（knowledge_bundle.py）があればCSVを解析しない
+    sources = list(CASE_CSV_FILES) + [CASE_ITEMS_FILE]
+    case_rows = bundled("repair_cases", sources, base_dir)
+    case_items = bundled("case_items", sources, base_dir)
+    if case_rows is None or case_items is None:
+        case_rows = load_repair_cases_csv([os.path.join(base_dir, name) for name in CASE_CSV_FILES])
+        case_items = load_case_items(os.path.join(base_dir, CASE_ITEMS_FILE))
+    return build_terminal_index(graph, case_rows, case_items)
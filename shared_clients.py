@@ -0,0 +1,276 @@
+# shared_clients.py
+"""
+プロセス全体で共有するAPIクライアントと接続チェックのキャッシュ
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+
+import httpx
+
+# 接続チェック結果の有効期間（秒）
+NOTION_HEALTH_TTL = float(os.getenv("NOTION_HEALTH_TTL", "300"))
+
+# HTTPコネクションプールの設定（接続数の上限・keep-alive・タイムアウト）
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# 非同期（asgi_app.py）で同時に待てるOpenAI呼び出しの上限（イベントループごと）
+HTTP_ASYNC_POOL_SIZE = int(os.getenv("HTTP_ASYNC_POOL_SIZE", "200"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+NOTION_TIMEOUT = float(os.getenv("NOTION_TIMEOUT", "60"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+
+# Notion APIのレート制限（プロセス全体の平均リクエスト数/秒、0で無効）と再試行回数
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+NOTION_MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))
+
+# 接続先の切り替え（ローカルの疑似サーバー fake_notion_server.py で計測する場合など）
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "").rstrip("/")
+
+# 埋め込みの前に tiktoken でトークン長を確認するか（tiktoken は初回に辞書をダウンロードする。
+# オフラインの疑似OpenAIサーバー fake_openai_server.py で計測する場合は 0）
+EMBEDDING_CHECK_CTX_LENGTH = os.getenv("EMBEDDING_CHECK_CTX_LENGTH", "1") != "0"
+
+_lock = threading.Lock()
+_notion_clients = {}   # APIキー -> Client
+_notion_health = {}    # APIキー -> 最後に接続チェックが成功した時刻
+_openai_http = {}      # "sync" / "async" -> OpenAI用のhttpxクライアント（async はループごとにプールを持つ）
+_chat_models = {}      # (APIキー, モデル名, オプション) -> ChatOpenAI
+_embeddings = {}       # (APIキー, モデル名) -> OpenAIEmbeddings
+_notion_limiter = None
+
+
+def _pool_limits(size=None):
+    size = HTTP_POOL_SIZE if size is None else size
+    return httpx.Limits(
+        max_connections=size,
+        max_keepalive_connections=size,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout(read_timeout):
+    return httpx.Timeout(read_timeout, connect=HTTP_CONNECT_TIMEOUT)
+
+
+class LoopLocalAsyncClient(httpx.AsyncClient):
+    """送信時のイベントループごとに別のコネクションプールを使う httpx.AsyncClient
+
+    httpx のプールは最初に使ったイベントループに結び付くため、モデルに渡す1つの
+    クライアントから、ループごとに作ったプールへ送信する（asyncio.run を繰り返しても使える）。
+    1ループのプールは shard_size 接続ずつのプールに分けて順番に使う。httpcore のプールは
+    送信のたびに 接続数×待ち数 の割り当て処理をするため、大きな1つのプールでは遅くなる。
+    """
+
+    def __init__(self, pool_size, shard_size=10, **kwargs):
+        # 証明書の読み込みは重いため、SSLコンテキストは全プールで共有する
+        kwargs.setdefault("verify", httpx.create_ssl_context())
+        super().__init__(**kwargs)
+        self._pool_options = kwargs
+        self._shard_count = max(1, -(-pool_size // shard_size))
+        self._shard_limits = _pool_limits(-(-pool_size // self._shard_count))
+        self._pools = {}    # イベントループ -> (プールの一覧, 順番)
+        self._pools_lock = threading.Lock()
+
+    def _pool(self):
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            clients = [httpx.AsyncClient(limits=self._shard_limits, **self._pool_options)
+                       for _ in range(self._shard_count)]
+            with self._pools_lock:
+                # 終了したループのプールは閉じられないため、参照を外すだけにする
+                for closed in [other for other in self._pools if other.is_closed()]:
+                    del self._pools[closed]
+                pool = self._pools.setdefault(loop, (clients, itertools.cycle(clients)))
+        return pool
+
+    async def send(self, request, **kwargs):
+        return await next(self._pool()[1]).send(request, **kwargs)
+
+    async def aclose(self):
+        """実行中のイベントループのプールを閉じる（他のループからは引き続き使える）"""
+        with self._pools_lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        for client in pool[0] if pool else ():
+            await client.aclose()
+
+
+def get_notion_client(api_key):
+    """APIキーごとに1つだけNotionクライアントを生成して使い回す
+
+    notion-clientは渡されたhttpxクライアントのヘッダー（認証）とタイムアウトを
+    書き換えるため、プールはAPIキーごとに1つ持つ。
+    """
+    with _lock:
+        client = _notion_clients.get(api_key)
+        if client is None:
+            from notion_client import Client
+            http_client = httpx.Client(limits=_pool_limits())
+            options = {"auth": api_key, "timeout_ms": int(NOTION_TIMEOUT * 1000)}
+            if NOTION_BASE_URL:
+                options["base_url"] = NOTION_BASE_URL
+            client = Client(client=http_client, **options)
+            _notion_clients[api_key] = client
+        return client
+
+
+def get_openai_http_client(asynchronous=False):
+    """OpenAI呼び出しで共有するkeep-alive付きhttpxクライアント
+
+    asynchronous=True のときはイベントループごとにプール（HTTP_ASYNC_POOL_SIZE 接続）を持つ。
+    """
+    kind = "async" if asynchronous else "sync"
+    with _lock:
+        http_client = _openai_http.get(kind)
+        if http_client is None:
+            if asynchronous:
+                http_client = LoopLocalAsyncClient(HTTP_ASYNC_POOL_SIZE, timeout=_timeout(OPENAI_TIMEOUT))
+            else:
+                http_client = httpx.Client(limits=_pool_limits(), timeout=_timeout(OPENAI_TIMEOUT))
+            _openai_http[kind] = http_client
+        return http_client
+
+
+def get_chat_model(api_key, model="gpt-4o-mini", **kwargs):
+    """同じ設定のChatOpenAIを使い回す（HTTPプールは全モデルで共有）"""
+    key = (api_key, model, tuple(sorted(kwargs.items())))
+    with _lock:
+        llm = _chat_models.get(key)
+    if llm is not None:
+        return llm
+
+    from langchain_openai import ChatOpenAI
+    llm = ChatOpenAI(
+        model=model,
+        api_key=api_key,
+        http_client=get_openai_http_client(),
+        http_async_client=get_openai_http_client(asynchronous=True),
+        **kwargs
+    )
+    with _lock:
+        return _chat_models.setdefault(key, llm)
+
+
+def get_embeddings(api_key, model="text-embedding-ada-002"):
+    """同じ設定のOpenAIEmbeddingsを使い回す（HTTPプールは共有）"""
+    key = (api_key, model)
+    with _lock:
+        embeddings = _embeddings.get(key)
+    if embeddings is not None:
+        return embeddings
+
+    from langchain_openai import OpenAIEmbeddings
+    embeddings = OpenAIEmbeddings(
+        model=model,
+        api_key=api_key,
+        http_client=get_openai_http_client(),
+        http_async_client=get_openai_http_client(asynchronous=True),
+        check_embedding_ctx_length=EMBEDDING_CHECK_CTX_LENGTH,
+    )
+    with _lock:
+        return _embeddings.setdefault(key, embeddings)
+
+
+def check_notion_health(api_key, force=False):
+    """users.me による接続・権限チェック（成功結果をTTLの間キャッシュ）
+
+    戻り値: (成否, エラーメッセージ)
+    """
+    now = time.monotonic()
+    with _lock:
+        checked_at = _notion_health.get(api_key)
+    if checked_at is not None and not force and now - checked_at < NOTION_HEALTH_TTL:
+        return True, ""
+
+    try:
+        get_notion_client(api_key).users.me()
+    except Exception as e:
+        # 失敗はキャッシュせず、次回呼び出し時に再チェックする
+        invalidate_notion_health(api_key)
+        return False, str(e)
+
+    with _lock:
+        _notion_health[api_key] = now
+    return True, ""
+
+
+def invalidate_notion_health(api_key):
+    """API呼び出しが失敗したときに呼び、次回の接続チェックを強制する"""
+    with _lock:
+        _notion_health.pop(api_key, None)
+
+
+class RateLimiter:
+    """トークンバケット方式のレート制限（スレッド間で共有）"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_notion_rate_limiter():
+    """Notion API呼び出しで共有するレート制限"""
+    global _notion_limiter
+    with _lock:
+        if _notion_limiter is None:
+            _notion_limiter = RateLimiter(NOTION_RATE_LIMIT)
+        return _notion_limiter
+
+
+def _is_retryable(error, idempotent=True):
+    status = getattr(error, "status", None)
+    if not idempotent:
+        # 429 は処理前に拒否されたことが確実。409・5xx・タイムアウトは作成済みの可能性がある
+        return status == 429
+    if status is not None:
+        return status in (409, 429) or status >= 500
+    return getattr(error, "code", "") == "notionhq_client_request_timeout"
+
+
+def _retry_delay(error, attempt):
+    headers = getattr(error, "headers", None) or {}
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(0.5 * 2 ** attempt, 30.0)
+
+
+def call_notion(func, *args, idempotent=True, **kwargs):
+    """共有レート制限の下でNotion APIを呼び出す（429・5xx・タイムアウトは待って再試行）
+
+    idempotent=False（pages.create など）のときは 429 だけを再試行する。
+    タイムアウト・5xx の後に再試行すると、作成済みのページを重複して作成しかねないため。
+    """
+    limiter = get_notion_rate_limiter()
+    for attempt in itertools.count():
+        limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= NOTION_MAX_RETRIES or not _is_retryable(e, idempotent):
+                raise
+            time.sleep(_retry_delay(e, attempt))
@@ -4,10 +4,14 @@ import os
 import uuid
 import re
 import json
-from notion_client import Client
+from shared_clients import get_notion_client, get_chat_model, get_embeddings
+from answer_stream import iter_text_chunks
+from notion_loader import iter_database_pages
+from notion_schema import parse_pages, parse_diagnostic_node, parse_repair_case
+from diagnostic_engine import compile_graph
+from repair_index import load_terminal_index
 import time
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.messages import BaseMessage
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
@@ -48,7 +52,7 @@ def initialize_database():
             st.error("OpenAI APIキーが設定されていません")
             return None
             
-        embeddings_model = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        embeddings_model = get_embeddings(openai_api_key)
         
         # ドキュメントの前処理
         for doc in documents:
@@ -88,11 +92,7 @@ def generate_ai_response_with_rag(prompt):
             return
         
         # LLMの初期化
-        llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.7,
-            openai_api_key=openai_api_key
-        )
+        llm = get_chat_model(openai_api_key, model="gpt-3.5-turbo", temperature=0.7)
         
         # データベースから関連ドキュメントを検索
         db = initialize_database()
@@ -126,12 +126,11 @@ def generate_ai_response_with_rag(prompt):
             HumanMessage(content=prompt)
         ]
         
-        # AIの回答を生成
-        with st.spinner("AIが回答を生成中..."):
-            response = llm.invoke(messages)
+        # AIの回答を生成（トークンが届くたびに表示する）
+        answer = st.write_stream(iter_text_chunks(llm, messages))
             
         # 回答をセッションに追加
-        st.session_state.messages.append({"role": "assistant", "content": response.content})
+        st.session_state.messages.append({"role": "assistant", "content": answer})
         
         # 関連ドキュメントの情報を表示
         if relevant_docs:
@@ -159,7 +158,7 @@ def initialize_notion_client():
             st.warning("⚠️ NOTION_API_KEYが設定されていません")
             return None
         
-        client = Client(auth=api_key)
+        client = get_notion_client(api_key)
         return client
     except Exception as e:
         st.error(f"❌ Notionクライアントの初期化に失敗: {e}")
@@ -178,79 +177,31 @@ def load_notion_diagnostic_data():
             return None
         
         # Notionから診断ノードを取得
-        response = client.databases.query(database_id=node_db_id)
-        nodes = response.get("results", [])
+        nodes = iter_database_pages(client, node_db_id)  # 全ページをカーソルで辿りながら逐次取得
         
         # データを変換
         diagnostic_nodes = {}
         start_nodes = {}
         
-        for node in nodes:
-            properties = node.get("properties", {})
-            
-            # ノードIDを取得
-            node_id_prop = properties.get("ノードID", {})
-            node_id = ""
-            if node_id_prop.get("type") == "title":
-                title_content = node_id_prop.get("title", [])
-                if title_content:
-                    node_id = title_content[0].get("plain_text", "")
-            
-            if not node_id:
-                continue
-            
-            # 各プロパティを取得
-            question_prop = properties.get("質問内容", {})
-            question = ""
-            if question_prop.get("type") == "rich_text":
-                rich_text_content = question_prop.get("rich_text", [])
-                if rich_text_content:
-                    question = rich_text_content[0].get("plain_text", "")
-            
-            result_prop = properties.get("診断結果", {})
-            result = ""
-            if result_prop.get("type") == "rich_text":
-                rich_text_content = result_prop.get("rich_text", [])
-                if rich_text_content:
-                    result = rich_text_content[0].get("plain_text", "")
-            
-            category_prop = properties.get("カテゴリ", {})
-            category = ""
-            if category_prop.get("type") == "rich_text":
-                rich_text_content = category_prop.get("rich_text", [])
-                if rich_text_content:
-                    category = rich_text_content[0].get("plain_text", "")
-            
-            is_start = properties.get("開始フラグ", {}).get("checkbox", False)
-            is_end = properties.get("終端フラグ", {}).get("checkbox", False)
-            
-            next_nodes_prop = properties.get("次のノード", {})
-            next_nodes = []
-            if next_nodes_prop.get("type") == "rich_text":
-                rich_text_content = next_nodes_prop.get("rich_text", [])
-                if rich_text_content:
-                    next_nodes_text = rich_text_content[0].get("plain_text", "")
-                    next_nodes = [node.strip() for node in next_nodes_text.split(",") if node.strip()]
-            
-            # ノードデータを作成
-            node_data = {
-                "question": question,
-                "category": category,
-                "is_start": is_start,
-                "is_end": is_end,
-                "next_nodes": next_nodes,
-                "result": result
-            }
-            
+        for node_data in parse_pages(nodes, parse_diagnostic_node):
+            node_id = node_data.pop("node_id")
             diagnostic_nodes[node_id] = node_data
             
             # 開始ノードを記録
-            if is_start:
-                start_nodes[category] = node_id
+            if node_data["is_start"]:
+                start_nodes[node_data["category"]] = node_id
+        
+        # 遷移は整数IDにコンパイルしたグラフで行う（不整合な遷移は除外して警告）
+        graph = compile_graph(diagnostic_nodes, strict=False)
+        if graph.problems:
+            print(f"⚠️ 診断フローの不整合 {len(graph.problems)}件: {graph.problems[:3]}")
         
         return {
             "diagnostic_nodes": diagnostic_nodes,
-            "start_nodes": start_nodes
+            "start_nodes": start_nodes,
+            "graph": graph,
+            # 終端ノード -> 修理ケース・部品・費用・作業時間（診断結果の表示は辞書を引くだけ）
+            "terminal_index": load_terminal_index(graph)
         }
         
     except Exception as e:
@@ -270,72 +221,9 @@ def load_notion_repair_cases():
             return []
         
         # Notionから修理ケースを取得
-        response = client.databases.query(database_id=case_db_id)
-        cases = response.get("results", [])
+        cases = iter_database_pages(client, case_db_id)  # 全ページをカーソルで辿りながら逐次取得
         
-        repair_cases = []
-        
-        for case in cases:
-            properties = case.get("properties", {})
-            
-            # ケースIDを取得
-            case_id_prop = properties.get("ケースID", {})
-            case_id = ""
-            if case_id_prop.get("type") == "title":
-                title_content = case_id_prop.get("title", [])
-                if title_content:
-                    case_id = title_content[0].get("plain_text", "")
-            
-            if not case_id:
-                continue
-            
-            # 各プロパティを取得
-            symptoms_prop = properties.get("症状", {})
-            symptoms = ""
-            if symptoms_prop.get("type") == "rich_text":
-                rich_text_content = symptoms_prop.get("rich_text", [])
-                if rich_text_content:
-                    symptoms = rich_text_content[0].get("plain_text", "")
-            
-            repair_steps_prop = properties.get("修理手順", {})
-            repair_steps = ""
-            if repair_steps_prop.get("type") == "rich_text":
-                rich_text_content = repair_steps_prop.get("rich_text", [])
-                if rich_text_content:
-                    repair_steps = rich_text_content[0].get("plain_text", "")
-            
-            parts_prop = properties.get("必要な部品", {})
-            parts = ""
-            if parts_prop.get("type") == "rich_text":
-                rich_text_content = parts_prop.get("rich_text", [])
-                if rich_text_content:
-                    parts = rich_text_content[0].get("plain_text", "")
-            
-            tools_prop = properties.get("必要な工具", {})
-            tools = ""
-            if tools_prop.get("type") == "rich_text":
-                rich_text_content = tools_prop.get("rich_text", [])
-                if rich_text_content:
-                    tools = rich_text_content[0].get("plain_text", "")
-            
-            difficulty_prop = properties.get("難易度", {})
-            difficulty = ""
-            if difficulty_prop.get("type") == "rich_text":
-                rich_text_content = difficulty_prop.get("rich_text", [])
-                if rich_text_content:
-                    difficulty = rich_text_content[0].get("plain_text", "")
-            
-            # ケースデータを作成
-            case_data = {
-                "case_id": case_id,
-                "symptoms": symptoms,
-                "repair_steps": repair_steps,
-                "parts": parts,
-                "tools": tools,
-                "difficulty": difficulty
-            }
-            
-            repair_cases.append(case_data)
+        repair_cases = list(parse_pages(cases, parse_repair_case))
         
         return repair_cases
         
@@ -343,14 +231,29 @@ def load_notion_repair_cases():
         st.error(f"❌ Notionからの修理ケース読み込みに失敗: {e}")
         return []
 
+def show_terminal_repair_info(repair_info):
+    """終端ノードの修理ケース・部品・工具・費用・作業時間を表示（索引を引くだけでI/Oなし）"""
+    with st.expander(f"📋 {repair_info['case_id']}: {repair_info['symptoms'][:50]}", expanded=True):
+        if repair_info["cause"]:
+            st.markdown(f"**原因:** {repair_info['cause']}")
+        st.markdown(f"**修理手順:**\n\n{repair_info['repair_steps']}")
+        st.markdown(f"**必要な部品:** {repair_info['parts']}")
+        st.markdown(f"**必要な工具:** {repair_info['tools']}")
+        st.markdown(f"**難易度:** {repair_info['difficulty']}")
+        if repair_info["cost"] is not None:
+            st.markdown(f"**推定コスト:** 約{repair_info['cost']:,}円")
+        if repair_info["minutes"] is not None:
+            st.markdown(f"**作業時間:** 約{repair_info['minutes']}分")
+        if repair_info["notes"]:
+            st.warning(f"⚠️ {repair_info['notes']}")
+
 def run_diagnostic_flow(diagnostic_data, current_node_id=None):
     """症状診断フローを実行"""
     if not diagnostic_data:
         st.error("診断データが読み込めませんでした。")
         return
 
-    diagnostic_nodes = diagnostic_data["diagnostic_nodes"]
-    start_nodes = diagnostic_data["start_nodes"]
+    graph = diagnostic_data["graph"]
 
     # セッション状態の初期化
     if "diagnostic_current_node" not in st.session_state:
@@ -363,7 +266,7 @@ def run_diagnostic_flow(diagnostic_data, current_node_id=None):
         st.markdown("**症状のカテゴリを選択してください：**")
         
         # 利用可能なカテゴリを表示
-        available_categories = list(start_nodes.keys())
+        available_categories = graph.categories_with_start()
         
         if not available_categories:
             st.warning("⚠️ 利用可能な診断カテゴリがありません")
@@ -376,7 +279,7 @@ def run_diagnostic_flow(diagnostic_data, current_node_id=None):
         )
         
         if st.button("診断開始", key="start_diagnosis"):
-            start_node_id = start_nodes[selected_category]
+            start_node_id = graph.key(graph.start(selected_category))
             st.session_state.diagnostic_current_node = start_node_id
             st.session_state.diagnostic_history = [start_node_id]
             st.rerun()
@@ -384,10 +287,11 @@ def run_diagnostic_flow(diagnostic_data, current_node_id=None):
         return
 
     # 現在のノードを取得
-    current_node = diagnostic_nodes.get(st.session_state.diagnostic_current_node)
-    if not current_node:
+    node = graph.lookup(st.session_state.diagnostic_current_node)
+    if node is None:
         st.error("診断ノードが見つかりませんでした。")
         return
+    current_node = graph.node(node)
 
     # 質問の表示
     question = current_node.get("question", "")
@@ -403,9 +307,12 @@ def run_diagnostic_flow(diagnostic_data, current_node_id=None):
         
         # 関連する修理ケースを表示
         st.markdown("### 📋 関連する修理ケース")
-        repair_cases = load_notion_repair_cases()
+        repair_info = diagnostic_data["terminal_index"].get(node)
+        repair_cases = [] if repair_info else load_notion_repair_cases()
         
-        if repair_cases:
+        if repair_info:
+            show_terminal_repair_info(repair_info)
+        elif repair_cases:
             # 症状に基づいて関連ケースをフィルタリング
             category = current_node.get("category", "")
             related_cases = [case for case in repair_cases if category.lower() in case.get("symptoms", "").lower()]
@@ -432,37 +339,49 @@ def run_diagnostic_flow(diagnostic_data, current_node_id=None):
         return
 
     # 次のノードへの選択肢
-    next_nodes = current_node.get("next_nodes", [])
-    if len(next_nodes) >= 2:
+    next_count = len(graph.edges[node])
+    if next_count >= 2:
         col1, col2 = st.columns(2)
         
         with col1:
             if st.button("はい", key=f"yes_{current_node_id}"):
-                next_node_id = next_nodes[0]
-                st.session_state.diagnostic_current_node = next_node_id
-                st.session_state.diagnostic_history.append(next_node_id)
-                st.rerun()
+                next_node = graph.step(node, 0)
+                if next_node is None:
+                    st.warning("⚠️ この選択肢の遷移先が診断データにありません。")
+                else:
+                    next_node_id = graph.key(next_node)
+                    st.session_state.diagnostic_current_node = next_node_id
+                    st.session_state.diagnostic_history.append(next_node_id)
+                    st.rerun()
         
         with col2:
             if st.button("いいえ", key=f"no_{current_node_id}"):
-                next_node_id = next_nodes[1] if len(next_nodes) > 1 else next_nodes[0]
+                next_node = graph.step(node, 1)
+                if next_node is None:
+                    st.warning("⚠️ この選択肢の遷移先が診断データにありません。")
+                else:
+                    next_node_id = graph.key(next_node)
+                    st.session_state.diagnostic_current_node = next_node_id
+                    st.session_state.diagnostic_history.append(next_node_id)
+                    st.rerun()
+    elif next_count == 1:
+        if st.button("次へ", key=f"next_{current_node_id}"):
+            next_node = graph.step(node)
+            if next_node is None:
+                st.warning("⚠️ この選択肢の遷移先が診断データにありません。")
+            else:
+                next_node_id = graph.key(next_node)
                 st.session_state.diagnostic_current_node = next_node_id
                 st.session_state.diagnostic_history.append(next_node_id)
                 st.rerun()
-    elif len(next_nodes) == 1:
-        if st.button("次へ", key=f"next_{current_node_id}"):
-            next_node_id = next_nodes[0]
-            st.session_state.diagnostic_current_node = next_node_id
-            st.session_state.diagnostic_history.append(next_node_id)
-            st.rerun()
 
     # 診断履歴の表示
     if st.session_state.diagnostic_history:
         st.markdown("---")
         st.markdown("**📝 診断履歴**")
         for i, node_id in enumerate(st.session_state.diagnostic_history):
-            node = diagnostic_nodes.get(node_id, {})
-            question = node.get("question", "")
+            history_node = graph.lookup(node_id)
+            question = graph.questions[history_node] if history_node is not None else ""
             if question:
                 st.markdown(f"{i+1}. {question}")
 
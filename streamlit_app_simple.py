@@ -1,6 +1,7 @@
 import streamlit as st
 import os
-from langchain_openai import ChatOpenAI
+from shared_clients import get_chat_model
+from answer_stream import iter_text_chunks
 from langchain_core.messages import HumanMessage, AIMessage
 from dotenv import load_dotenv
 
@@ -50,11 +51,7 @@ def generate_ai_response(prompt):
             st.error("OpenAI APIキーが設定されていません")
             return
         
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7,
-            openai_api_key=openai_api_key
-        )
+        llm = get_chat_model(openai_api_key, model="gpt-4o-mini", temperature=0.7)
         
         blog_links = get_relevant_blog_links(prompt)
         
@@ -74,14 +71,15 @@ def generate_ai_response(prompt):
             HumanMessage(content=prompt)
         ]
         
-        with st.spinner("AIが回答を生成中..."):
-            response = llm.invoke(messages)
+        # AIの回答を生成（トークンが届くたびに表示し、関連ブログは生成後に追加する）
+        ai_response = st.write_stream(iter_text_chunks(llm, messages))
             
-        ai_response = response.content
         if blog_links:
-            ai_response += "\n\n🔗 関連ブログ\n"
+            blog_section = "\n\n🔗 関連ブログ\n"
             for blog in blog_links:
-                ai_response += f"• {blog['title']}: {blog['url']}\n"
+                blog_section += f"• {blog['title']}: {blog['url']}\n"
+            st.markdown(blog_section)
+            ai_response += blog_section
         
         st.session_state.messages.append({"role": "assistant", "content": ai_response})
         
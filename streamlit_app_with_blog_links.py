@@ -13,7 +13,13 @@ except ImportError:
     st.error("notion-client モジュールが見つかりません。requirements.txtに notion-client==2.2.1 を追加してください。")
     Client = None
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from notion_loader import iter_database_pages
+from notion_schema import parse_pages, parse_diagnostic_node, parse_repair_case
+from diagnostic_engine import compile_graph
+from repair_index import load_terminal_index
+
+from shared_clients import get_notion_client, get_chat_model
+from answer_stream import iter_text_chunks
 from langchain_core.messages import BaseMessage
 from langchain_core.messages import HumanMessage, AIMessage
 
@@ -169,11 +175,7 @@ def generate_ai_response_with_rag(prompt):
             return
         
         # LLMの初期化
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7,
-            openai_api_key=openai_api_key
-        )
+        llm = get_chat_model(openai_api_key, model="gpt-4o-mini", temperature=0.7)
         
         # データベースから関連ドキュメントとブログリンクを検索
         if "database" not in st.session_state:
@@ -257,22 +259,21 @@ def generate_ai_response_with_rag(prompt):
             HumanMessage(content=prompt)
         ]
         
-        # AIの回答を生成
-        with st.spinner("AIが回答を生成中..."):
-            response = llm.invoke(messages)
+        # AIの回答を生成（トークンが届くたびに表示する）
+        ai_response = st.write_stream(iter_text_chunks(llm, messages))
             
-        # 関連ブログを回答に追加
-        ai_response = response.content
+        # 関連ブログは回答の生成後に追加
+        blog_section = "\n\n🔗 関連ブログ\n"
         if blog_links:
-            ai_response += "\n\n🔗 関連ブログ\n"
             for blog in blog_links[:3]:  # 最大3件
-                ai_response += f"• {blog['title']}: {blog['url']}\n"
+                blog_section += f"• {blog['title']}: {blog['url']}\n"
         else:
             # デフォルトの関連ブログ
-            ai_response += "\n\n🔗 関連ブログ\n"
-            ai_response += "• バッテリー・バッテリーの故障と修理方法: https://camper-repair.net/blog/repair1/\n"
-            ai_response += "• 基本修理・キャンピングカー修理の基本: https://camper-repair.net/blog/risk1/\n"
-            ai_response += "• 定期点検・定期点検とメンテナンス: https://camper-repair.net/battery-selection/\n"
+            blog_section += "• バッテリー・バッテリーの故障と修理方法: https://camper-repair.net/blog/repair1/\n"
+            blog_section += "• 基本修理・キャンピングカー修理の基本: https://camper-repair.net/blog/risk1/\n"
+            blog_section += "• 定期点検・定期点検とメンテナンス: https://camper-repair.net/battery-selection/\n"
+        st.markdown(blog_section)
+        ai_response += blog_section
         
         # 回答をセッションに追加
         st.session_state.messages.append({"role": "assistant", "content": ai_response})
@@ -327,7 +328,7 @@ def initialize_notion_client():
             st.warning("⚠️ NOTION_API_KEYまたはNOTION_TOKENが設定されていません")
             return None
         
-        client = Client(auth=api_key)
+        client = get_notion_client(api_key)
         return client
     except Exception as e:
         st.error(f"❌ Notionクライアントの初期化に失敗: {e}")
@@ -351,89 +352,32 @@ def load_notion_diagnostic_data():
             return None
         
         # Notionから診断ノードを取得
-        response = client.databases.query(database_id=node_db_id)
-        nodes = response.get("results", [])
+        nodes = iter_database_pages(client, node_db_id)  # 全ページをカーソルで辿りながら逐次取得
         
         # データを変換
         diagnostic_nodes = {}
         start_nodes = {}
         
-        for node in nodes:
-            properties = node.get("properties", {})
-            
-            # ノードIDを取得
-            node_id_prop = properties.get("ノードID", {})
-            node_id = ""
-            if node_id_prop.get("type") == "title":
-                title_content = node_id_prop.get("title", [])
-                if title_content:
-                    node_id = title_content[0].get("plain_text", "")
-            
-            if not node_id:
-                continue
-            
-            # 各プロパティを取得
-            question_prop = properties.get("質問内容", {})
-            question = ""
-            if question_prop.get("type") == "rich_text":
-                rich_text_content = question_prop.get("rich_text", [])
-                if rich_text_content:
-                    question = rich_text_content[0].get("plain_text", "")
-            
-            result_prop = properties.get("診断結果", {})
-            result = ""
-            if result_prop.get("type") == "rich_text":
-                rich_text_content = result_prop.get("rich_text", [])
-                if rich_text_content:
-                    result = rich_text_content[0].get("plain_text", "")
-            
-            category_prop = properties.get("カテゴリ", {})
-            category = ""
-            if category_prop.get("type") == "rich_text":
-                rich_text_content = category_prop.get("rich_text", [])
-                if rich_text_content:
-                    category = rich_text_content[0].get("plain_text", "")
-            
-            is_start = properties.get("開始フラグ", {}).get("checkbox", False)
-            is_end = properties.get("終端フラグ", {}).get("checkbox", False)
-            
-            next_nodes_prop = properties.get("次のノード", {})
-            next_nodes = []
-            if next_nodes_prop.get("type") == "rich_text":
-                rich_text_content = next_nodes_prop.get("rich_text", [])
-                if rich_text_content:
-                    next_nodes_text = rich_text_content[0].get("plain_text", "")
-                    next_nodes = [node.strip() for node in next_nodes_text.split(",") if node.strip()]
-            
-            # 修理ケースの関連付けを取得
-            repair_cases_relation = properties.get("修理ケース", {})
-            related_repair_cases = []
-            if repair_cases_relation.get("type") == "relation":
-                relation_data = repair_cases_relation.get("relation", [])
-                for relation in relation_data:
-                    related_repair_cases.append(relation.get("id", ""))
-            
-            # ノードデータを作成
-            node_data = {
-                "question": question,
-                "category": category,
-                "is_start": is_start,
-                "is_end": is_end,
-                "next_nodes": next_nodes,
-                "result": result,
-                "related_repair_cases": related_repair_cases
-            }
-            
+        for node_data in parse_pages(nodes, parse_diagnostic_node):
+            node_id = node_data.pop("node_id")
             diagnostic_nodes[node_id] = node_data
             
             # 開始ノードを記録
-            if is_start:
-                start_nodes[category] = node_id
+            if node_data["is_start"]:
+                start_nodes[node_data["category"]] = node_id
+        
+        # 遷移は整数IDにコンパイルしたグラフで行う（不整合な遷移は除外して警告）
+        graph = compile_graph(diagnostic_nodes, strict=False)
+        if graph.problems:
+            print(f"⚠️ 診断フローの不整合 {len(graph.problems)}件: {graph.problems[:3]}")
         
         # セッション状態にキャッシュ
         result_data = {
             "diagnostic_nodes": diagnostic_nodes,
-            "start_nodes": start_nodes
+            "start_nodes": start_nodes,
+            "graph": graph,
+            # 終端ノード -> 修理ケース・部品・費用・作業時間（診断結果の表示は辞書を引くだけ）
+            "terminal_index": load_terminal_index(graph)
         }
         st.session_state.notion_diagnostic_data = result_data
         
@@ -461,90 +405,9 @@ def load_notion_repair_cases():
             return []
         
         # Notionから修理ケースを取得
-        response = client.databases.query(database_id=case_db_id)
-        cases = response.get("results", [])
+        cases = iter_database_pages(client, case_db_id)  # 全ページをカーソルで辿りながら逐次取得
         
-        repair_cases = []
-        
-        for case in cases:
-            properties = case.get("properties", {})
-            
-            # ケースIDを取得
-            case_id_prop = properties.get("ケースID", {})
-            case_id = ""
-            if case_id_prop.get("type") == "title":
-                title_content = case_id_prop.get("title", [])
-                if title_content:
-                    case_id = title_content[0].get("plain_text", "")
-            
-            if not case_id:
-                continue
-            
-            # 各プロパティを取得
-            symptoms_prop = properties.get("症状", {})
-            symptoms = ""
-            if symptoms_prop.get("type") == "rich_text":
-                rich_text_content = symptoms_prop.get("rich_text", [])
-                if rich_text_content:
-                    symptoms = rich_text_content[0].get("plain_text", "")
-            
-            repair_steps_prop = properties.get("修理手順", {})
-            repair_steps = ""
-            if repair_steps_prop.get("type") == "rich_text":
-                rich_text_content = repair_steps_prop.get("rich_text", [])
-                if rich_text_content:
-                    repair_steps = rich_text_content[0].get("plain_text", "")
-            
-            parts_prop = properties.get("必要な部品", {})
-            parts = ""
-            if parts_prop.get("type") == "rich_text":
-                rich_text_content = parts_prop.get("rich_text", [])
-                if rich_text_content:
-                    parts = rich_text_content[0].get("plain_text", "")
-            
-            tools_prop = properties.get("必要な工具", {})
-            tools = ""
-            if tools_prop.get("type") == "rich_text":
-                rich_text_content = tools_prop.get("rich_text", [])
-                if rich_text_content:
-                    tools = rich_text_content[0].get("plain_text", "")
-            
-            difficulty_prop = properties.get("難易度", {})
-            difficulty = ""
-            if difficulty_prop.get("type") == "rich_text":
-                rich_text_content = difficulty_prop.get("rich_text", [])
-                if rich_text_content:
-                    difficulty = rich_text_content[0].get("plain_text", "")
-            
-            # 診断ノードの関連付けを取得
-            diagnostic_nodes_relation = properties.get("診断ノード", {})
-            related_diagnostic_nodes = []
-            if diagnostic_nodes_relation.get("type") == "relation":
-                relation_data = diagnostic_nodes_relation.get("relation", [])
-                for relation in relation_data:
-                    related_diagnostic_nodes.append(relation.get("id", ""))
-            
-            # 必要部品の関連付けを取得
-            required_parts_relation = properties.get("必要部品", {})
-            related_parts = []
-            if required_parts_relation.get("type") == "relation":
-                relation_data = required_parts_relation.get("relation", [])
-                for relation in relation_data:
-                    related_parts.append(relation.get("id", ""))
-            
-            # ケースデータを作成
-            case_data = {
-                "case_id": case_id,
-                "symptoms": symptoms,
-                "repair_steps": repair_steps,
-                "parts": parts,
-                "tools": tools,
-                "difficulty": difficulty,
-                "related_diagnostic_nodes": related_diagnostic_nodes,
-                "related_parts": related_parts
-            }
-            
-            repair_cases.append(case_data)
+        repair_cases = list(parse_pages(cases, parse_repair_case))
         
         # セッション状態にキャッシュ
         st.session_state.notion_repair_cases = repair_cases
@@ -567,14 +430,29 @@ def clear_notion_cache():
         del st.session_state.notion_diagnostic_history
 
 # === 対話式症状診断機能（Notion連携版） ===
+def show_terminal_repair_info(repair_info):
+    """終端ノードの修理ケース・部品・工具・費用・作業時間を表示（索引を引くだけでI/Oなし）"""
+    with st.expander(f"📋 {repair_info['case_id']}: {repair_info['symptoms'][:50]}", expanded=True):
+        if repair_info["cause"]:
+            st.markdown(f"**原因:** {repair_info['cause']}")
+        st.markdown(f"**修理手順:**\n\n{repair_info['repair_steps']}")
+        st.markdown(f"**必要な部品:** {repair_info['parts']}")
+        st.markdown(f"**必要な工具:** {repair_info['tools']}")
+        st.markdown(f"**難易度:** {repair_info['difficulty']}")
+        if repair_info["cost"] is not None:
+            st.markdown(f"**推定コスト:** 約{repair_info['cost']:,}円")
+        if repair_info["minutes"] is not None:
+            st.markdown(f"**作業時間:** 約{repair_info['minutes']}分")
+        if repair_info["notes"]:
+            st.warning(f"⚠️ {repair_info['notes']}")
+
 def run_notion_diagnostic_flow(diagnostic_data, current_node_id=None):
     """Notionデータを使用した診断フローを実行"""
     if not diagnostic_data:
         st.error("Notion診断データが読み込めませんでした。")
         return
 
-    diagnostic_nodes = diagnostic_data["diagnostic_nodes"]
-    start_nodes = diagnostic_data["start_nodes"]
+    graph = diagnostic_data["graph"]
 
     # セッション状態の初期化
     if "notion_diagnostic_current_node" not in st.session_state:
@@ -586,7 +464,7 @@ def run_notion_diagnostic_flow(diagnostic_data, current_node_id=None):
         st.markdown("**症状のカテゴリを選択してください：**")
         
         # 利用可能なカテゴリを表示
-        available_categories = list(start_nodes.keys())
+        available_categories = graph.categories_with_start()
         
         if not available_categories:
             st.warning("⚠️ 利用可能な診断カテゴリがありません")
@@ -599,7 +477,7 @@ def run_notion_diagnostic_flow(diagnostic_data, current_node_id=None):
         )
         
         if st.button("診断開始", key="notion_start_diagnosis"):
-            start_node_id = start_nodes[selected_category]
+            start_node_id = graph.key(graph.start(selected_category))
             st.session_state.notion_diagnostic_current_node = start_node_id
             st.session_state.notion_diagnostic_history = [start_node_id]
             st.rerun()
@@ -607,10 +485,11 @@ def run_notion_diagnostic_flow(diagnostic_data, current_node_id=None):
         return
 
     # 現在のノードを取得
-    current_node = diagnostic_nodes.get(st.session_state.notion_diagnostic_current_node)
-    if not current_node:
+    node = graph.lookup(st.session_state.notion_diagnostic_current_node)
+    if node is None:
         st.error("診断ノードが見つかりませんでした。")
         return
+    current_node = graph.node(node)
 
     # 質問の表示
     question = current_node.get("question", "")
@@ -626,9 +505,12 @@ def run_notion_diagnostic_flow(diagnostic_data, current_node_id=None):
         
         # 関連する修理ケースを表示
         st.markdown("### 📋 関連する修理ケース")
-        repair_cases = load_notion_repair_cases()
+        repair_info = diagnostic_data["terminal_index"].get(node)
+        repair_cases = [] if repair_info else load_notion_repair_cases()
         
-        if repair_cases:
+        if repair_info:
+            show_terminal_repair_info(repair_info)
+        elif repair_cases:
             # リレーションに基づく関連ケースフィルタリング（優先）
             current_node_id = st.session_state.notion_diagnostic_current_node
             related_cases = []
@@ -700,37 +582,49 @@ def run_notion_diagnostic_flow(diagnostic_data, current_node_id=None):
         return
 
     # 次のノードへの選択肢
-    next_nodes = current_node.get("next_nodes", [])
-    if len(next_nodes) >= 2:
+    next_count = len(graph.edges[node])
+    if next_count >= 2:
         col1, col2 = st.columns(2)
         
         with col1:
             if st.button("はい", key=f"notion_yes_{current_node_id}"):
-                next_node_id = next_nodes[0]
-                st.session_state.notion_diagnostic_current_node = next_node_id
-                st.session_state.notion_diagnostic_history.append(next_node_id)
-                st.rerun()
+                next_node = graph.step(node, 0)
+                if next_node is None:
+                    st.warning("⚠️ この選択肢の遷移先が診断データにありません。")
+                else:
+                    next_node_id = graph.key(next_node)
+                    st.session_state.notion_diagnostic_current_node = next_node_id
+                    st.session_state.notion_diagnostic_history.append(next_node_id)
+                    st.rerun()
         
         with col2:
             if st.button("いいえ", key=f"notion_no_{current_node_id}"):
-                next_node_id = next_nodes[1] if len(next_nodes) > 1 else next_nodes[0]
+                next_node = graph.step(node, 1)
+                if next_node is None:
+                    st.warning("⚠️ この選択肢の遷移先が診断データにありません。")
+                else:
+                    next_node_id = graph.key(next_node)
+                    st.session_state.notion_diagnostic_current_node = next_node_id
+                    st.session_state.notion_diagnostic_history.append(next_node_id)
+                    st.rerun()
+    elif next_count == 1:
+        if st.button("次へ", key=f"notion_next_{current_node_id}"):
+            next_node = graph.step(node)
+            if next_node is None:
+                st.warning("⚠️ この選択肢の遷移先が診断データにありません。")
+            else:
+                next_node_id = graph.key(next_node)
                 st.session_state.notion_diagnostic_current_node = next_node_id
                 st.session_state.notion_diagnostic_history.append(next_node_id)
                 st.rerun()
-    elif len(next_nodes) == 1:
-        if st.button("次へ", key=f"notion_next_{current_node_id}"):
-            next_node_id = next_nodes[0]
-            st.session_state.notion_diagnostic_current_node = next_node_id
-            st.session_state.notion_diagnostic_history.append(next_node_id)
-            st.rerun()
 
     # 診断履歴の表示
     if st.session_state.notion_diagnostic_history:
         st.markdown("---")
         st.markdown("**📝 診断履歴**")
         for i, node_id in enumerate(st.session_state.notion_diagnostic_history):
-            node = diagnostic_nodes.get(node_id, {})
-            question = node.get("question", "")
+            history_node = graph.lookup(node_id)
+            question = graph.questions[history_node] if history_node is not None else ""
             if question:
                 st.markdown(f"{i+1}. {question}")
 
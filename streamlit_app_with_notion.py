@@ -4,7 +4,9 @@ import os
 import uuid
 import re
 import json
-from notion_client import Client
+from shared_clients import get_notion_client
+from notion_loader import iter_database_pages
+from notion_schema import parse_pages, parse_diagnostic_node, parse_repair_case
 import time
 
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
@@ -37,7 +39,7 @@ def initialize_notion_client():
             st.warning("⚠️ NOTION_API_KEYまたはNOTION_TOKENが設定されていません")
             return None
         
-        client = Client(auth=api_key)
+        client = get_notion_client(api_key)
         return client
     except Exception as e:
         st.error(f"❌ Notionクライアントの初期化に失敗: {e}")
@@ -65,86 +67,19 @@ def load_notion_diagnostic_data():
         st.info(f"🔍 データベースID: {node_db_id}")
         
         # Notionから診断ノードを取得
-        response = client.databases.query(database_id=node_db_id)
-        nodes = response.get("results", [])
-        
-        st.info(f"📊 取得したノード数: {len(nodes)}")
+        nodes = iter_database_pages(client, node_db_id)  # 全ページをカーソルで辿りながら逐次取得
         
         # データを変換
         diagnostic_nodes = {}
         start_nodes = {}
         
-        for node in nodes:
-            properties = node.get("properties", {})
-            
-            # ノードIDを取得
-            node_id_prop = properties.get("ノードID", {})
-            node_id = ""
-            if node_id_prop.get("type") == "title":
-                title_content = node_id_prop.get("title", [])
-                if title_content:
-                    node_id = title_content[0].get("plain_text", "")
-            
-            if not node_id:
-                continue
-            
-            # 各プロパティを取得
-            question_prop = properties.get("質問内容", {})
-            question = ""
-            if question_prop.get("type") == "rich_text":
-                rich_text_content = question_prop.get("rich_text", [])
-                if rich_text_content:
-                    question = rich_text_content[0].get("plain_text", "")
-            
-            result_prop = properties.get("診断結果", {})
-            result = ""
-            if result_prop.get("type") == "rich_text":
-                rich_text_content = result_prop.get("rich_text", [])
-                if rich_text_content:
-                    result = rich_text_content[0].get("plain_text", "")
-            
-            category_prop = properties.get("カテゴリ", {})
-            category = ""
-            if category_prop.get("type") == "rich_text":
-                rich_text_content = category_prop.get("rich_text", [])
-                if rich_text_content:
-                    category = rich_text_content[0].get("plain_text", "")
-            
-            is_start = properties.get("開始フラグ", {}).get("checkbox", False)
-            is_end = properties.get("終端フラグ", {}).get("checkbox", False)
-            
-            next_nodes_prop = properties.get("次のノード", {})
-            next_nodes = []
-            if next_nodes_prop.get("type") == "rich_text":
-                rich_text_content = next_nodes_prop.get("rich_text", [])
-                if rich_text_content:
-                    next_nodes_text = rich_text_content[0].get("plain_text", "")
-                    next_nodes = [node.strip() for node in next_nodes_text.split(",") if node.strip()]
-            
-            # 修理ケースの関連付けを取得
-            repair_cases_relation = properties.get("修理ケース", {})
-            related_repair_cases = []
-            if repair_cases_relation.get("type") == "relation":
-                relation_data = repair_cases_relation.get("relation", [])
-                for relation in relation_data:
-                    related_repair_cases.append(relation.get("id", ""))
-            
-            # ノードデータを作成
-            node_data = {
-                "question": question,
-                "category": category,
-                "is_start": is_start,
-                "is_end": is_end,
-                "next_nodes": next_nodes,
-                "result": result,
-                "related_repair_cases": related_repair_cases
-            }
-            
+        for node_data in parse_pages(nodes, parse_diagnostic_node):
+            node_id = node_data.pop("node_id")
             diagnostic_nodes[node_id] = node_data
             
             # 開始ノードを記録
-            if is_start:
-                start_nodes[category] = node_id
+            if node_data["is_start"]:
+                start_nodes[node_data["category"]] = node_id
         
         st.success(f"✅ 診断ノード: {len(diagnostic_nodes)}件, 開始ノード: {len(start_nodes)}件")
         
@@ -180,90 +115,9 @@ def load_notion_repair_cases():
             return []
         
         # Notionから修理ケースを取得
-        response = client.databases.query(database_id=case_db_id)
-        cases = response.get("results", [])
-        
-        repair_cases = []
+        cases = iter_database_pages(client, case_db_id)  # 全ページをカーソルで辿りながら逐次取得
         
-        for case in cases:
-            properties = case.get("properties", {})
-            
-            # ケースIDを取得
-            case_id_prop = properties.get("ケースID", {})
-            case_id = ""
-            if case_id_prop.get("type") == "title":
-                title_content = case_id_prop.get("title", [])
-                if title_content:
-                    case_id = title_content[0].get("plain_text", "")
-            
-            if not case_id:
-                continue
-            
-            # 各プロパティを取得
-            symptoms_prop = properties.get("症状", {})
-            symptoms = ""
-            if symptoms_prop.get("type") == "rich_text":
-                rich_text_content = symptoms_prop.get("rich_text", [])
-                if rich_text_content:
-                    symptoms = rich_text_content[0].get("plain_text", "")
-            
-            repair_steps_prop = properties.get("修理手順", {})
-            repair_steps = ""
-            if repair_steps_prop.get("type") == "rich_text":
-                rich_text_content = repair_steps_prop.get("rich_text", [])
-                if rich_text_content:
-                    repair_steps = rich_text_content[0].get("plain_text", "")
-            
-            parts_prop = properties.get("必要な部品", {})
-            parts = ""
-            if parts_prop.get("type") == "rich_text":
-                rich_text_content = parts_prop.get("rich_text", [])
-                if rich_text_content:
-                    parts = rich_text_content[0].get("plain_text", "")
-            
-            tools_prop = properties.get("必要な工具", {})
-            tools = ""
-            if tools_prop.get("type") == "rich_text":
-                rich_text_content = tools_prop.get("rich_text", [])
-                if rich_text_content:
-                    tools = rich_text_content[0].get("plain_text", "")
-            
-            difficulty_prop = properties.get("難易度", {})
-            difficulty = ""
-            if difficulty_prop.get("type") == "rich_text":
-                rich_text_content = difficulty_prop.get("rich_text", [])
-                if rich_text_content:
-                    difficulty = rich_text_content[0].get("plain_text", "")
-            
-            # 診断ノードの関連付けを取得
-            diagnostic_nodes_relation = properties.get("診断ノード", {})
-            related_diagnostic_nodes = []
-            if diagnostic_nodes_relation.get("type") == "relation":
-                relation_data = diagnostic_nodes_relation.get("relation", [])
-                for relation in relation_data:
-                    related_diagnostic_nodes.append(relation.get("id", ""))
-            
-            # 必要部品の関連付けを取得
-            required_parts_relation = properties.get("必要部品", {})
-            related_parts = []
-            if required_parts_relation.get("type") == "relation":
-                relation_data = required_parts_relation.get("relation", [])
-                for relation in relation_data:
-                    related_parts.append(relation.get("id", ""))
-            
-            # ケースデータを作成
-            case_data = {
-                "case_id": case_id,
-                "symptoms": symptoms,
-                "repair_steps": repair_steps,
-                "parts": parts,
-                "tools": tools,
-                "difficulty": difficulty,
-                "related_diagnostic_nodes": related_diagnostic_nodes,
-                "related_parts": related_parts
-            }
-            
-            repair_cases.append(case_data)
+        repair_cases = list(parse_pages(cases, parse_repair_case))
         
         # セッション状態にキャッシュ
         st.session_state.notion_repair_cases = repair_cases
@@ -4,16 +4,20 @@ import os
 import uuid
 import re
 import json
-from notion_client import Client
+from shared_clients import get_notion_client, get_chat_model, get_embeddings
+from answer_stream import iter_text_chunks
+from notion_loader import iter_database_pages
+from notion_schema import parse_pages, parse_diagnostic_node, parse_repair_case
+from knowledge_bundle import MANUAL_PDF, bundled
+from knowledge_index import get_knowledge_base
 import time
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.messages import BaseMessage
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_chroma import Chroma
 
-import glob
 import config
 
 # === RAG機能付きAI相談機能 ===
@@ -23,20 +27,30 @@ def initialize_database():
         main_path = os.path.dirname(os.path.abspath(__file__))
         documents = []
         
-        # PDFファイルの読み込み
-        pdf_path = os.path.join(main_path, "キャンピングカー修理マニュアル.pdf")
-        if os.path.exists(pdf_path):
+        # PDFファイルの読み込み（ソースと一致するバンドルがあれば抽出済みのページを使う）
+        pdf_path = os.path.join(main_path, MANUAL_PDF)
+        manual_pages = bundled("manual_pages", [MANUAL_PDF], main_path)
+        if manual_pages is not None:
+            documents.extend(Document(page_content=text, metadata={"source": pdf_path, "page": page})
+                             for page, text in enumerate(manual_pages))
+        elif os.path.exists(pdf_path):
             loader = PyPDFLoader(pdf_path)
             documents.extend(loader.load())
         
-        # テキストファイルの読み込み
-        txt_files = glob.glob(os.path.join(main_path, "*.txt"))
-        for txt_file in txt_files:
-            try:
-                loader = TextLoader(txt_file, encoding='utf-8')
-                documents.extend(loader.load())
-            except Exception as e:
-                st.warning(f"テキストファイル {txt_file} の読み込みに失敗: {e}")
+        # 知識ベースのテキストは解析済みのケース・テーマ単位で読み込む
+        knowledge_base = get_knowledge_base(main_path)
+        for file_name, error in knowledge_base.errors:
+            st.warning(f"テキストファイル {file_name} の読み込みに失敗: {error}")
+        for case in knowledge_base.cases:
+            documents.append(Document(
+                page_content=case.render(),
+                metadata={
+                    "source": os.path.join(main_path, f"{case.category}.txt"),
+                    "category": case.category,
+                    "case_code": case.code,
+                    "urls": ",".join(case.urls),
+                },
+            ))
         
         if not documents:
             st.warning("ドキュメントが見つかりません")
@@ -48,7 +62,7 @@ def initialize_database():
             st.error("OpenAI APIキーが設定されていません")
             return None
             
-        embeddings_model = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        embeddings_model = get_embeddings(openai_api_key)
         
         # ドキュメントの前処理
         for doc in documents:
@@ -88,11 +102,7 @@ def generate_ai_response_with_rag(prompt):
             return
         
         # LLMの初期化
-        llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.7,
-            openai_api_key=openai_api_key
-        )
+        llm = get_chat_model(openai_api_key, model="gpt-3.5-turbo", temperature=0.7)
         
         # データベースから関連ドキュメントを検索
         db = initialize_database()
@@ -126,12 +136,16 @@ def generate_ai_response_with_rag(prompt):
             HumanMessage(content=prompt)
         ]
         
-        # AIの回答を生成
-        with st.spinner("AIが回答を生成中..."):
-            response = llm.invoke(messages)
+        # 参考ドキュメントは回答の生成を待たずに先に表示する
+        if relevant_docs:
+            show_relevant_documents(relevant_docs)
+            st.session_state.relevant_docs_shown = True
+        
+        # AIの回答を生成（トークンが届くたびに表示する）
+        answer = st.write_stream(iter_text_chunks(llm, messages))
             
         # 回答をセッションに追加
-        st.session_state.messages.append({"role": "assistant", "content": response.content})
+        st.session_state.messages.append({"role": "assistant", "content": answer})
         
         # 関連ドキュメントの情報を表示
         if relevant_docs:
@@ -140,11 +154,16 @@ def generate_ai_response_with_rag(prompt):
     except Exception as e:
         st.error(f"AI回答生成エラー: {e}")
 
-def show_relevant_documents():
-    """関連ドキュメントを表示"""
-    if "last_relevant_docs" in st.session_state and st.session_state.last_relevant_docs:
+def show_relevant_documents(docs=None):
+    """関連ドキュメントを表示（docs を省略したときは直前の回答の参考ドキュメント）"""
+    if docs is None:
+        # 回答の生成中に表示済みなら、同じ実行の中では繰り返さない
+        if st.session_state.pop("relevant_docs_shown", False):
+            return
+        docs = st.session_state.get("last_relevant_docs")
+    if docs:
         st.markdown("###    参考ドキュメント")
-        for i, doc in enumerate(st.session_state.last_relevant_docs, 1):
+        for i, doc in enumerate(docs, 1):
             source = doc.metadata.get('source', 'unknown')
             filename = os.path.basename(source)
             with st.expander(f"📄 {filename}"):
@@ -159,7 +178,7 @@ def initialize_notion_client():
             st.warning("⚠️ NOTION_API_KEYが設定されていません")
             return None
         
-        client = Client(auth=api_key)
+        client = get_notion_client(api_key)
         return client
     except Exception as e:
         st.error(f"❌ Notionクライアントの初期化に失敗: {e}")
@@ -178,75 +197,19 @@ def load_notion_diagnostic_data():
             return None
         
         # Notionから診断ノードを取得
-        response = client.databases.query(database_id=node_db_id)
-        nodes = response.get("results", [])
+        nodes = iter_database_pages(client, node_db_id)  # 全ページをカーソルで辿りながら逐次取得
         
         # データを変換
         diagnostic_nodes = {}
         start_nodes = {}
         
-        for node in nodes:
-            properties = node.get("properties", {})
-            
-            # ノードIDを取得
-            node_id_prop = properties.get("ノードID", {})
-            node_id = ""
-            if node_id_prop.get("type") == "title":
-                title_content = node_id_prop.get("title", [])
-                if title_content:
-                    node_id = title_content[0].get("plain_text", "")
-            
-            if not node_id:
-                continue
-            
-            # 各プロパティを取得
-            question_prop = properties.get("質問内容", {})
-            question = ""
-            if question_prop.get("type") == "rich_text":
-                rich_text_content = question_prop.get("rich_text", [])
-                if rich_text_content:
-                    question = rich_text_content[0].get("plain_text", "")
-            
-            result_prop = properties.get("診断結果", {})
-            result = ""
-            if result_prop.get("type") == "rich_text":
-                rich_text_content = result_prop.get("rich_text", [])
-                if rich_text_content:
-                    result = rich_text_content[0].get("plain_text", "")
-            
-            category_prop = properties.get("カテゴリ", {})
-            category = ""
-            if category_prop.get("type") == "rich_text":
-                rich_text_content = category_prop.get("rich_text", [])
-                if rich_text_content:
-                    category = rich_text_content[0].get("plain_text", "")
-            
-            is_start = properties.get("開始フラグ", {}).get("checkbox", False)
-            is_end = properties.get("終端フラグ", {}).get("checkbox", False)
-            
-            next_nodes_prop = properties.get("次のノード", {})
-            next_nodes = []
-            if next_nodes_prop.get("type") == "rich_text":
-                rich_text_content = next_nodes_prop.get("rich_text", [])
-                if rich_text_content:
-                    next_nodes_text = rich_text_content[0].get("plain_text", "")
-                    next_nodes = [node.strip() for node in next_nodes_text.split(",") if node.strip()]
-            
-            # ノードデータを作成
-            node_data = {
-                "question": question,
-                "category": category,
-                "is_start": is_start,
-                "is_end": is_end,
-                "next_nodes": next_nodes,
-                "result": result
-            }
-            
+        for node_data in parse_pages(nodes, parse_diagnostic_node):
+            node_id = node_data.pop("node_id")
             diagnostic_nodes[node_id] = node_data
             
             # 開始ノードを記録
-            if is_start:
-                start_nodes[category] = node_id
+            if node_data["is_start"]:
+                start_nodes[node_data["category"]] = node_id
         
         return {
             "diagnostic_nodes": diagnostic_nodes,
@@ -270,72 +233,9 @@ def load_notion_repair_cases():
             return []
         
         # Notionから修理ケースを取得
-        response = client.databases.query(database_id=case_db_id)
-        cases = response.get("results", [])
-        
-        repair_cases = []
+        cases = iter_database_pages(client, case_db_id)  # 全ページをカーソルで辿りながら逐次取得
         
-        for case in cases:
-            properties = case.get("properties", {})
-            
-            # ケースIDを取得
-            case_id_prop = properties.get("ケースID", {})
-            case_id = ""
-            if case_id_prop.get("type") == "title":
-                title_content = case_id_prop.get("title", [])
-                if title_content:
-                    case_id = title_content[0].get("plain_text", "")
-            
-            if not case_id:
-                continue
-            
-            # 各プロパティを取得
-            symptoms_prop = properties.get("症状", {})
-            symptoms = ""
-            if symptoms_prop.get("type") == "rich_text":
-                rich_text_content = symptoms_prop.get("rich_text", [])
-                if rich_text_content:
-                    symptoms = rich_text_content[0].get("plain_text", "")
-            
-            repair_steps_prop = properties.get("修理手順", {})
-            repair_steps = ""
-            if repair_steps_prop.get("type") == "rich_text":
-                rich_text_content = repair_steps_prop.get("rich_text", [])
-                if rich_text_content:
-                    repair_steps = rich_text_content[0].get("plain_text", "")
-            
-            parts_prop = properties.get("必要な部品", {})
-            parts = ""
-            if parts_prop.get("type") == "rich_text":
-                rich_text_content = parts_prop.get("rich_text", [])
-                if rich_text_content:
-                    parts = rich_text_content[0].get("plain_text", "")
-            
-            tools_prop = properties.get("必要な工具", {})
-            tools = ""
-            if tools_prop.get("type") == "rich_text":
-                rich_text_content = tools_prop.get("rich_text", [])
-                if rich_text_content:
-                    tools = rich_text_content[0].get("plain_text", "")
-            
-            difficulty_prop = properties.get("難易度", {})
-            difficulty = ""
-            if difficulty_prop.get("type") == "rich_text":
-                rich_text_content = difficulty_prop.get("rich_text", [])
-                if rich_text_content:
-                    difficulty = rich_text_content[0].get("plain_text", "")
-            
-            # ケースデータを作成
-            case_data = {
-                "case_id": case_id,
-                "symptoms": symptoms,
-                "repair_steps": repair_steps,
-                "parts": parts,
-                "tools": tools,
-                "difficulty": difficulty
-            }
-            
-            repair_cases.append(case_data)
+        repair_cases = list(parse_pages(cases, parse_repair_case))
         
         return repair_cases
         
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+回答のストリーミング（answer_stream.py）のテストスクリプト
+"""
+
+import json
+from types import SimpleNamespace
+
+from answer_stream import (
+    blog_summaries, case_summaries, iter_answer_tokens, iter_text_chunks, source_summaries, sse_event,
+    stream_answer,
+)
+from knowledge_cases import KnowledgeCase
+
+
+def _chunk(content, node="agent", step=1):
+    return SimpleNamespace(content=content), {"langgraph_node": node, "langgraph_step": step}
+
+
+def _run(messages):
+    """stream_answer() のイベントと戻り値（回答の全文）"""
+    frames = []
+    stream = stream_answer(iter(messages))
+    while True:
+        try:
+            frames.append(next(stream))
+        except StopIteration as stop:
+            return frames, stop.value
+
+
+def _parse(frames):
+    events = []
+    for frame in frames:
+        lines = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_tokens_become_sse_events():
+    """エージェントの断片だけが token イベントになり、最後に全文が返ることを確認"""
+    print("=== トークンのSSEのテスト ===")
+    messages = [
+        _chunk("", step=1),                         # ツール呼び出しだけの断片
+        _chunk("検索結果", node="tools", step=2),
+        _chunk("バッテリーの", step=3),
+        _chunk([{"type": "text", "text": "端子を\n確認"}], step=3),
+    ]
+    frames, answer = _run(messages)
+    print(f"イベント: {frames}")
+    assert _parse(frames) == [("token", {"text": "バッテリーの"}), ("token", {"text": "端子を\n確認"})]
+    assert answer == "バッテリーの端子を\n確認"
+    assert sse_event("done", {"answer": "a\nb"}) == 'event: done\ndata: {"answer": "a\\nb"}\n\n'
+
+
+def test_reset_when_agent_answers_again():
+    """ツールの後に回答を生成し直すと reset が送られ、最後の回答だけが全文になることを確認"""
+    print("=== 回答の生成し直しのテスト ===")
+    messages = [_chunk("調べます", step=1), _chunk("結果", node="tools", step=2), _chunk("回答", step=3)]
+    assert list(iter_answer_tokens(iter(messages))) == [(1, "調べます"), (3, "回答")]
+    frames, answer = _run(messages)
+    assert [event for event, _ in _parse(frames)] == ["token", "reset", "token"]
+    assert answer == "回答"
+
+
+def test_text_chunks_for_write_stream():
+    """llm.stream() の断片からテキストだけが順に返ることを確認（st.write_stream() 用）"""
+    print("=== st.write_stream 用の断片のテスト ===")
+
+    class FakeLLM:
+        def stream(self, messages):
+            assert messages == ["質問"]
+            for content in ["", "電圧を", [{"type": "text", "text": "確認"}], None]:
+                yield SimpleNamespace(content=content)
+
+    assert list(iter_text_chunks(FakeLLM(), ["質問"])) == ["電圧を", "確認"]
+
+
+def test_retrieval_summaries():
+    """回答より先に送る検索結果（ドキュメント・修理事例・ブログ）がJSONにできる形になることを確認"""
+    print("=== 検索結果の要約のテスト ===")
+    doc = SimpleNamespace(page_content="端子の\n  緩みを確認" + "あ" * 300,
+                          metadata={"source": "/data/キャンピングカー修理マニュアル.pdf", "page": 4})
+    [source] = source_summaries([doc])
+    print(f"参考ドキュメント: {source}")
+    assert source["source"] == "キャンピングカー修理マニュアル.pdf"
+    assert source["page"] == 4
+    assert source["excerpt"].startswith("端子の 緩みを確認") and len(source["excerpt"]) == 203
+
+    case = KnowledgeCase("バッテリー", "Case BAT-001", "充電されない", urls=["https://example.com/bat/"])
+    assert case_summaries([case]) == [{"category": "バッテリー", "code": "Case BAT-001",
+                                       "title": "充電されない", "urls": ["https://example.com/bat/"]}]
+    blogs = blog_summaries([{"title": "バッテリーの点検", "url": "https://example.com/b/", "keywords": ("端子",)}])
+    assert blogs == [{"title": "バッテリーの点検", "url": "https://example.com/b/", "keywords": ["端子"]}]
+    json.dumps({"sources": [source], "cases": case_summaries([case]), "blogs": blogs}, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    test_tokens_become_sse_events()
+    test_reset_when_agent_answers_again()
+    test_text_chunks_for_write_stream()
+    test_retrieval_summaries()
+    print("✅ すべてのテストに成功しました")
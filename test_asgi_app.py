@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+非同期（ASGI）サーバー（asgi_app.py）のテストスクリプト
+
+疑似OpenAIサーバー（fake_openai_server.py）に接続し、app.py（Flask）と同じ応答になることを確認する。
+"""
+
+import asyncio
+import json
+import os
+
+from fake_openai_server import ANSWER, start_fake_server
+
+_server = start_fake_server()
+os.environ.update({"OPENAI_API_KEY": "sk-fake", "OPENAI_BASE_URL": _server.url})
+
+import config  # noqa: E402
+import shared_clients  # noqa: E402
+
+# 他のテストで先に読み込まれていても、疑似サーバーに接続する（tiktoken の辞書はダウンロードしない）
+config.OPENAI_API_KEY = "sk-fake"
+shared_clients.EMBEDDING_CHECK_CTX_LENGTH = False
+
+import app  # noqa: E402
+import asgi_app  # noqa: E402
+from starlette.testclient import TestClient  # noqa: E402
+
+
+def _events(text):
+    events = []
+    for frame in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_ask_matches_flask():
+    """/ask の応答（回答・リンク・検索結果）が Flask 版と同じ形になることを確認"""
+    print("=== /ask のテスト ===")
+    question = "サブバッテリーが充電されない"
+    with TestClient(asgi_app.app) as client:
+        assert client.get("/").status_code == 200
+        conversation_id = client.post("/start_conversation").json()["conversation_id"]
+        data = client.post("/ask", data={"question": question}).json()
+    print(f"回答: {data['answer'][:20]}... / 参考ドキュメント {len(data['sources'])}件 / ブログ {len(data['blogs'])}件")
+    assert conversation_id and data["answer"] == ANSWER
+    assert len(data["sources"]) == 3 and data["blogs"]
+
+    flask_data = app.app.test_client().post("/ask", data={"question": question}).json
+    assert flask_data.keys() == data.keys()
+    assert flask_data["answer"] == data["answer"] and flask_data["blogs"] == data["blogs"]
+
+
+def test_ask_stream_sends_results_first():
+    """/ask/stream が検索結果 -> トークン -> リンク -> 全文 の順にイベントを送ることを確認"""
+    print("=== /ask/stream のテスト ===")
+    with TestClient(asgi_app.app) as client:
+        response = client.post("/ask/stream", data={"question": "FFヒーターから異音がする"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    names = [name for name, _ in events]
+    print(f"イベント: {names[:4]} ... {names[-2:]}")
+    assert names[:3] == ["sources", "cases", "blogs"] and names[-2:] == ["links", "done"]
+    assert set(names[3:-2]) == {"token"}
+    assert "".join(data["text"] for name, data in events if name == "token") == ANSWER
+    assert events[-1][1]["answer"] == ANSWER
+
+
+def test_search_tool_async():
+    """検索ツールを非同期で呼び出しても、リクエストごとのリンクに記録されることを確認"""
+    print("=== 検索ツール（非同期）のテスト ===")
+
+    async def run():
+        app.search_results.set([])
+        links = await app.search.ainvoke({"query": "インバーター"})
+        return links, app.search_results.get()
+
+    links, recorded = asyncio.run(run())
+    assert links == recorded and len(links) == 4
+    assert app.search.invoke({"query": "インバーター"}) == links
+
+
+def test_async_client_works_across_event_loops():
+    """共有のOpenAIクライアントを、別のイベントループ（asyncio.run の繰り返し）からも使えることを確認"""
+    print("=== イベントループごとのHTTPプールのテスト ===")
+    model = shared_clients.get_chat_model("sk-fake", model="gpt-4o-mini")
+    embeddings = shared_clients.get_embeddings("sk-fake")
+
+    async def run():
+        answer = await model.ainvoke("バッテリーの点検")
+        vector = await embeddings.aembed_query("バッテリーの点検")
+        return answer.content, len(vector)
+
+    for _ in range(3):
+        assert asyncio.run(run())[0] == ANSWER
+    http_client = shared_clients.get_openai_http_client(asynchronous=True)
+    # 終了したループのプールは次のループで作るときに外される
+    assert len(http_client._pools) <= 1
+
+
+if __name__ == "__main__":
+    test_ask_matches_flask()
+    test_ask_stream_sends_results_first()
+    test_search_tool_async()
+    test_async_client_works_across_event_loops()
+    print("✅ すべてのテストに成功しました")
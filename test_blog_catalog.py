@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+関連ブログのカタログ（blog_catalog.py）のテストスクリプト
+"""
+
+import json
+
+from blog_catalog import BLOG_LINKS_FILE, BlogCatalog, knowledge_base_catalog, load_blog_catalog, relevant_blog_links
+from bench_blog_links import QUERIES, scaled_blogs
+from keyword_matcher import match_vocabulary
+from knowledge_index import as_knowledge_base
+from query_analysis import analyze_query
+
+
+def _top(catalog, query, use_index, **kwargs):
+    hits = match_vocabulary(query)
+    return catalog.top(query, hits.get("main", []) + hits.get("trouble", []), query_hits=hits,
+                       use_index=use_index, **kwargs)
+
+
+def test_index_returns_same_blogs_as_full_scan():
+    """転置索引で候補を絞っても全件採点と同じ結果になることを確認"""
+    print("=== ブログカタログの索引のテスト ===")
+    catalog = load_blog_catalog()
+    assert len(catalog) > 0
+    with open(BLOG_LINKS_FILE, "r", encoding="utf-8") as f:
+        scaled = BlogCatalog(scaled_blogs(json.load(f), 500))
+    for query in QUERIES + ["AGMバッテリーの寿命", "ルーフベントのファン故障", ""]:
+        for target in (catalog, scaled):
+            assert _top(target, query, True) == _top(target, query, False), query
+        print(f"{query}: {[blog['title'] for blog in _top(catalog, query, True)][:2]}")
+
+    top = _top(catalog, "サブバッテリーが充電されない", True)
+    assert len(top) == 5 and len({blog["url"] for blog in top}) == 5
+    assert "バッテリー" in top[0]["title"]
+
+
+def test_extracted_urls_come_first():
+    """テキストデータから抽出したURLのブログが最優先で返ることを確認"""
+    catalog = BlogCatalog([
+        {"title": "バッテリー充電のコツ", "url": "https://example.com/a", "keywords": ["バッテリー", "充電"]},
+        {"title": "雑記", "url": "https://example.com/b", "keywords": ["旅"]},
+    ])
+    top = _top(catalog, "バッテリーが充電されない", True, extracted_urls=["https://example.com/b"])
+    assert [blog["url"] for blog in top] == ["https://example.com/b", "https://example.com/a"]
+
+
+def test_knowledge_base_catalog_is_reused():
+    """知識ベースのURLのカタログを版ごとに使い回しても、質問ごとに作る場合と同じ結果になることを確認"""
+    print("=== 知識ベースのURLのカタログのテスト ===")
+    knowledge_base = as_knowledge_base({
+        "バッテリー": "サブバッテリーが充電されない場合 https://camper-repair.net/blog/battery/\n"
+                      "走行充電 https://camper-repair.net/blog/charge/",
+        "FFヒーター": "FFヒーターの異音 https://camper-repair.net/ff/",
+    })
+    assert knowledge_base_catalog(knowledge_base) is knowledge_base_catalog(as_knowledge_base(dict(knowledge_base)))
+
+    for query in QUERIES + ["FFヒーターから異音がする", ""]:
+        analysis = analyze_query(query)
+        extracted_keywords = knowledge_base.extracted_keywords(analysis.normalized, analysis.terms)
+        all_keywords = list(set(analysis.keywords + tuple(extracted_keywords)))
+        # 質問ごとにキーワードを設定したカタログ（従来の作り方）
+        expected = BlogCatalog(knowledge_base.blog_links(all_keywords)).top(
+            analysis.text, analysis.keywords, list(set(extracted_keywords)),
+            knowledge_base.matching_urls(analysis.text), query_hits=analysis.hits)
+        assert relevant_blog_links(query, knowledge_base) == expected, query
+
+
+if __name__ == "__main__":
+    test_index_returns_same_blogs_as_full_scan()
+    test_extracted_urls_come_first()
+    test_knowledge_base_catalog_is_reused()
+    print("✅ すべてのテストに成功しました")
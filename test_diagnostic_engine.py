@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+診断グラフエンジン（diagnostic_engine.py）のテストスクリプト
+"""
+
+from diagnostic_engine import compile_graph, load_graph, DiagnosticGraphError
+
+
+def test_compile_repository_flows():
+    """リポジトリの3形式の診断データがコンパイルでき、終端まで遷移できることを確認"""
+    print("=== 診断データのコンパイルテスト ===")
+    graph = load_graph("mock_diagnostic_nodes.json")
+    print(f"mock_diagnostic_nodes.json: {len(graph)}ノード / 開始 {len(graph.starts)} / 終端 {len(graph.terminals)}")
+    node = graph.start("サブバッテリー")
+    assert graph.key(node) == "start_subbattery"
+    while not graph.is_end[node]:
+        node = graph.step(node, 1)
+    assert graph.results[node]
+
+    graph = load_graph("diag_nodes_linked_5nodes.csv")
+    assert [graph.key(n) for n in graph.starts_by_category["バッテリー"]][0] == "NODE-4001"
+    node = graph.start("バッテリー")
+    while not graph.is_end[node]:
+        node = graph.step(node)
+    assert graph.key(node) == "NODE-4005" and graph.terminal_case_ids[node] == "CASE-2001"
+
+    # 遷移先が欠けているデータは strict=False で読み込み、不整合として記録する
+    graph = load_graph("diagnostic_nodes_fixed.json", strict=False)
+    assert graph.problems and graph.labels[graph.lookup("rain_leak_001")][0] == "ルーフ（天井）"
+
+
+def test_dangling_edges_and_cycles():
+    """存在しない遷移先と循環がコンパイル時に検出されることを確認"""
+    nodes = {
+        "a": {"is_start": True, "next_nodes": ["b", "missing"]},
+        "b": {"next_nodes": ["c"]},
+        "c": {"next_nodes": ["a"]},
+    }
+    try:
+        compile_graph(nodes)
+    except DiagnosticGraphError as e:
+        print(f"検出: {e.problems}")
+        assert any("missing" in p for p in e.problems)
+        assert any("循環" in p for p in e.problems)
+    else:
+        raise AssertionError("不整合が検出されませんでした")
+
+    # strict=False では記録するだけで、遷移の位置も循環（やり直し）もそのまま残す
+    graph = compile_graph(nodes, strict=False)
+    assert graph.node(graph.lookup("a"))["next_nodes"] == ["b", None]
+    assert not graph.is_end[graph.lookup("c")]
+    assert graph.key(graph.step(graph.lookup("c"))) == "a"
+    assert any("循環" in p for p in graph.problems)
+
+
+def test_missing_target_keeps_choice_positions():
+    """はい の遷移先がなくても はい/いいえ の2択のまま、いいえ は元の遷移先に進むことを確認"""
+    print("=== 選択肢の位置のテスト ===")
+    nodes = {
+        "q": {"is_start": True, "next_nodes": ["missing", "retry"], "labels": ["はい", "いいえ"]},
+        "retry": {"next_nodes": ["q", "done"], "labels": ["もう一度", "終了"]},
+        "done": {"is_end": True, "result": "完了"},
+    }
+    graph = compile_graph(nodes, strict=False)
+    q = graph.lookup("q")
+    assert len(graph.edges[q]) == 2 and graph.labels[q] == ("はい", "いいえ")
+    assert graph.step(q, 0) is None
+    retry = graph.step(q, 1)
+    assert graph.key(retry) == "retry"
+    # 「いいえ -> 最初からやり直す」の遷移も残り、文言と遷移先の対応も変わらない
+    assert [graph.key(n) for n in graph.edges[retry]] == ["q", "done"]
+    assert graph.labels[retry] == ("もう一度", "終了")
+    print(f"不整合: {graph.problems}")
+    assert len(graph.problems) == 2
+
+
+if __name__ == "__main__":
+    test_compile_repository_flows()
+    test_dangling_edges_and_cycles()
+    test_missing_target_keeps_choice_positions()
+    print("✅ すべてのテストに成功しました")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+疑似Notionサーバーのテストスクリプト（notion-clientから実際にHTTPで呼び出す）
+"""
+
+from notion_client import Client, APIResponseError
+
+from fake_notion_server import start_fake_server, NODE_DB_ID, CASE_DB_ID
+from notion_loader import iter_database_pages
+from notion_schema import parse_pages, parse_diagnostic_node
+
+
+def _client(server):
+    return Client(auth="secret_fake", base_url=server.url)
+
+
+def test_query_pages_and_filters():
+    """フィクスチャのページがカーソルで全件取得でき、filterで絞り込めることを確認"""
+    print("=== 疑似Notionサーバーの読み込みテスト ===")
+    server = start_fake_server(scale=2)
+    try:
+        client = _client(server)
+        assert client.users.me()["type"] == "bot"
+
+        nodes = list(parse_pages(iter_database_pages(client, NODE_DB_ID), parse_diagnostic_node))
+        stats = server.stats()
+        print(f"診断ノード {len(nodes)}件 / API呼び出し {stats['calls']}回")
+        assert len(nodes) > 100 and stats["by_endpoint"]["databases.query"] >= 2
+        assert any(node["is_start"] for node in nodes)
+
+        response = client.databases.query(database_id=CASE_DB_ID, filter={"and": [
+            {"property": "ケースID", "title": {"is_not_empty": True}},
+            {"property": "ケースID", "title": {"equals": "case-2001"}},
+        ]})
+        assert [p["properties"]["ケースID"]["title"][0]["plain_text"] for p in response["results"]] == ["CASE-2001"]
+    finally:
+        server.shutdown()
+
+
+def test_page_writes_and_rate_limit():
+    """ページの作成・更新・アーカイブと429の注入を確認"""
+    server = start_fake_server(seed=False)
+    try:
+        server.store.add_database("db", "テストDB")
+        client = _client(server)
+        page = client.pages.create(parent={"database_id": "db"}, properties={
+            "名前": {"title": [{"text": {"content": "ヒューズ"}}]},
+        })
+        client.pages.update(page_id=page["id"], properties={"価格": {"number": 300}})
+        retrieved = client.pages.retrieve(page_id=page["id"])
+        assert retrieved["properties"]["名前"]["title"][0]["plain_text"] == "ヒューズ"
+        assert retrieved["properties"]["価格"]["number"] == 300
+
+        client.pages.update(page_id=page["id"], archived=True)
+        assert client.databases.query(database_id="db")["results"] == []
+
+        server.rate_limit_every = 1
+        try:
+            client.users.me()
+        except APIResponseError as e:
+            assert e.code == "rate_limited"
+        else:
+            raise AssertionError("429が返されませんでした")
+        assert server.stats()["rate_limited"] == 1
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_query_pages_and_filters()
+    test_page_writes_and_rate_limit()
+    print("✅ すべてのテストに成功しました")
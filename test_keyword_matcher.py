@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+複数キーワード照合（keyword_matcher.py）のテストスクリプト
+"""
+
+import random
+
+from keyword_matcher import (
+    CATEGORY_RULES, DEFAULT_CATEGORY, KeywordMatcher, SymptomIndex,
+    category_for_blog, category_for_query, content_terms, match_vocabulary,
+)
+
+
+def test_matcher_finds_same_hits_as_substring_search():
+    """重なり合うキーワードを含め、`in` の総当たりと同じ一致が得られることを確認"""
+    print("=== Aho–Corasick照合のテスト ===")
+    matcher = KeywordMatcher([("バッテリー", "電装"), ("サブバッテリー", "電装"), ("ー上", "x"), ("FF", "暖房")])
+    assert set(matcher.find_keywords("サブバッテリー上がりでFFヒーターも止まる")) == {"バッテリー", "サブバッテリー", "ー上", "ff"}
+    assert matcher.find_values("ffヒーター") == {"暖房": ["ff"]}
+
+    rng = random.Random(0)
+    for _ in range(200):
+        keywords = {"".join(rng.choice("abあ") for _ in range(rng.randint(1, 4))) for _ in range(6)}
+        text = "".join(rng.choice("abあ") for _ in range(40))
+        matcher = KeywordMatcher((k, k) for k in keywords)
+        expected = sorted((i, k) for k in keywords for i in range(len(text)) if text.startswith(k, i))
+        assert sorted((start, k) for start, k, _ in matcher.iter_matches(text)) == expected
+
+
+def test_symptom_index_ranks_matches():
+    """一致した症状の種類が多いノード・ケースが先に返ることを確認"""
+    nodes = [
+        {"title": "充電系", "symptoms": ["充電されない"]},
+        {"title": "バッテリー", "symptoms": ["電圧低下", "充電されない"]},
+        {"title": "水回り", "symptoms": ["水漏れ"]},
+    ]
+    cases = [{"title": "インバーター故障", "symptoms": ["インバーター"]}]
+    matches = SymptomIndex(nodes, cases).search("電圧低下で充電されない。インバーターも止まる")
+    print(f"ノード: {[n['title'] for n in matches['nodes']]}")
+    assert [n["title"] for n in matches["nodes"]] == ["バッテリー", "充電系"]
+    assert [c["title"] for c in matches["cases"]] == ["インバーター故障"]
+
+
+def _category_by_if_chain(blog, query):
+    """従来の determine_blog_category() と同じ判定（キーワードごとに `in` を繰り返す）"""
+    query_lower = query.lower()
+    title_lower, url_lower = blog["title"].lower(), blog["url"].lower()
+    keywords_lower = [kw.lower() for kw in blog["keywords"]]
+    for label, query_keywords, blog_keywords in CATEGORY_RULES:
+        if any(keyword in query_lower for keyword in query_keywords):
+            if any(keyword in title_lower or keyword in url_lower or keyword in keywords_lower for keyword in blog_keywords):
+                return label
+    return DEFAULT_CATEGORY
+
+
+def test_vocabulary_categories_match_if_chain():
+    """1回の走査によるカテゴリー判定が従来の if の連鎖と同じ結果になることを確認"""
+    print("=== 語彙照合によるカテゴリー判定のテスト ===")
+    blogs = [
+        {"title": "サブバッテリーの充電方法", "url": "https://example.com/battery-charge", "keywords": ["AGM"]},
+        {"title": "水道ポンプの交換", "url": "https://example.com/water-pump", "keywords": ["ポンプ"]},
+        {"title": "FFヒーターの異音対策", "url": "https://example.com/ff-heater", "keywords": ["騒音"]},
+        {"title": "キャンピングカーの基礎", "url": "https://example.com/basic", "keywords": ["修理"]},
+    ]
+    queries = ["バッテリーが充電されない", "ポンプから水が出ない", "FFヒーターから異音がする",
+               "Inverter の出力がゼロ", "雨漏りの修理方法", "冷蔵庫が冷えない", "こんにちは"]
+    for query in queries:
+        hits = match_vocabulary(query)
+        for blog in blogs:
+            assert category_for_blog(blog, hits) == _category_by_if_chain(blog, query), (query, blog["title"])
+    assert category_for_query(match_vocabulary("バッテリーから異音")) == "🔋 バッテリー関連"
+    assert category_for_query(match_vocabulary("こんにちは")) == DEFAULT_CATEGORY
+
+    hits = match_vocabulary("ポンプから水が出ない")
+    assert set(hits["main"]) == {"ポンプ", "水"}
+    assert hits["trouble"] == ["水が出ない"]
+    assert content_terms("ポンプの水が出ない場合は配線を確認") == {"ポンプ", "水が出ない", "配線"}
+
+
+if __name__ == "__main__":
+    test_matcher_finds_same_hits_as_substring_search()
+    test_symptom_index_ranks_matches()
+    test_vocabulary_categories_match_if_chain()
+    print("✅ すべてのテストに成功しました")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+知識ベースのバンドル（knowledge_bundle.py）のテストスクリプト
+"""
+
+import json
+import os
+import tempfile
+
+import knowledge_index
+from knowledge_bundle import BundleError, bundled, compile_bundle, load_bundle
+
+BATTERY_TEXT = """## 【Case SB‑2】走行中に充電されない
+
+**ユーザー**
+走行中にサブバッテリーが充電されません。
+
+**スタッフ**
+走行充電器のヒューズを確認してください。URL：https://example.com/blog/charge/
+"""
+
+BLOG_LINKS = [
+    {"title": "サブバッテリーの充電", "url": "https://example.com/blog/charge/", "keywords": ["バッテリー", "充電"]},
+]
+
+
+def _write_sources(base_dir):
+    with open(os.path.join(base_dir, "バッテリー.txt"), "w", encoding="utf-8") as f:
+        f.write(BATTERY_TEXT)
+    with open(os.path.join(base_dir, "blog_links.json"), "w", encoding="utf-8") as f:
+        json.dump(BLOG_LINKS, f, ensure_ascii=False)
+
+
+def test_bundle_round_trip():
+    """コンパイルしたバンドルから解析済みの知識ベース・カタログが読み込めることを確認"""
+    print("=== バンドルの作成・読み込みのテスト ===")
+    base_dir = tempfile.mkdtemp(prefix="bundle_test_")
+    _write_sources(base_dir)
+    header, warnings = compile_bundle(base_dir)
+    print(f"版: {header['version']} / セクション: {list(header['sections'])} / 警告: {warnings}")
+    assert set(header["sources"]) == {"バッテリー.txt", "blog_links.json"}
+
+    bundle = load_bundle(base_dir)
+    assert bundle is load_bundle(base_dir)
+    assert bundle.stale_sources(full=True) == []
+    kb = bundled("knowledge_base", knowledge_index.KNOWLEDGE_FILES, base_dir)
+    assert kb.version == header["knowledge_version"]
+    assert [case.code for case in kb.cases_for("バッテリー")] == ["Case SB‑2"]
+    assert kb.matching_urls("走行中に充電されない") == ["https://example.com/blog/charge/"]
+    catalog = bundled("blog_catalog", ["blog_links.json"], base_dir)
+    assert catalog.top("充電できない", ["充電"])[0]["url"] == "https://example.com/blog/charge/"
+    assert bundle.case_embeddings() is None
+
+    # 初回の get_knowledge_base() はテキストを解析せずバンドルを使う
+    shared = knowledge_index.get_knowledge_base(base_dir)
+    assert shared.reloaded == [] and shared.version == kb.version
+
+
+def test_stale_sources_are_not_used():
+    """ソースの変更・追加・壊れたソースを検出することを確認"""
+    print("=== 古いバンドルの検出のテスト ===")
+    base_dir = tempfile.mkdtemp(prefix="bundle_test_")
+    _write_sources(base_dir)
+    compile_bundle(base_dir)
+
+    with open(os.path.join(base_dir, "バッテリー.txt"), "a", encoding="utf-8") as f:
+        f.write("【寿命】関連事項：寿命 URL：https://example.com/life/\n")
+    with open(os.path.join(base_dir, "ウインドウ.txt"), "w", encoding="utf-8") as f:
+        f.write("## 【Case W‑1】窓から雨漏りする\n")
+    stale = load_bundle(base_dir).stale_sources(knowledge_index.KNOWLEDGE_FILES)
+    print(f"変更されたソース: {stale}")
+    assert stale == ["バッテリー.txt", "ウインドウ.txt"]
+    assert bundled("knowledge_base", knowledge_index.KNOWLEDGE_FILES, base_dir) is None
+    # 変わっていないソースのセクションはそのまま使える
+    assert bundled("blog_catalog", ["blog_links.json"], base_dir) is not None
+
+    with open(os.path.join(base_dir, "blog_links.json"), "w", encoding="utf-8") as f:
+        f.write("[{\"title\": ")
+    try:
+        compile_bundle(base_dir)
+    except BundleError as e:
+        print(f"検出: {e}")
+        assert e.problems[0].startswith("blog_links.json")
+    else:
+        raise AssertionError("壊れたカタログがコンパイルされました")
+
+
+if __name__ == "__main__":
+    test_bundle_round_trip()
+    test_stale_sources_are_not_used()
+    print("✅ すべてのテストに成功しました")
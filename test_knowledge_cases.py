@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+知識ベースのケースモデル（knowledge_cases.py）のテストスクリプト
+"""
+
+import sys
+
+from knowledge_cases import KnowledgeCase, parse_knowledge_file
+
+MARKDOWN_TEXT = """### 🔊 異音トラブル知識ベース
+
+---
+
+## 【Case NI‑1】走行中に「キュルキュル」高音
+
+**ユーザー**
+走り始めると前の方からキュルキュル音がします。
+
+**スタッフ**
+ファンベルトの滑り音が典型です。
+ベルト交換（30 分）で音は止まります。
+
+---
+
+【ファンベルト】関連事項：ベルト、異音、張力 URL：https://example.com/belt/,https://example.com/blog/repair1/
+"""
+
+PLAIN_TEXT = """水道ポンプ
+
+関連ブログ　https://example.com/water1/
+
+【Case‑1】ポンプがまったく動かない
+
+ユーザー
+音すらしないんですが…。
+
+スタッフ
+ヒューズをご確認ください。
+"""
+
+
+def test_parse_both_case_formats():
+    """見出し・** 付きの書式と、装飾なしの書式の両方がケースに分かれることを確認"""
+    print("=== ケースモデルの解析テスト ===")
+    cases = parse_knowledge_file("異音", MARKDOWN_TEXT)
+    case = next(c for c in cases if c.is_case)
+    assert (case.code, case.title) == ("Case NI‑1", "走行中に「キュルキュル」高音")
+    assert case.user_turns == ("走り始めると前の方からキュルキュル音がします。",)
+    assert case.staff_turns == ("ファンベルトの滑り音が典型です。\nベルト交換（30 分）で音は止まります。",)
+    assert "キュルキュル" in case.search_text
+
+    theme = cases[-1]
+    assert theme.keywords == ("ベルト", "異音", "張力")
+    assert theme.urls == ("https://example.com/belt/", "https://example.com/blog/repair1/")
+
+    plain = parse_knowledge_file("水道ポンプ", PLAIN_TEXT)
+    assert plain[0].urls == ("https://example.com/water1/",) and plain[0].keywords == ("水道ポンプ",)
+    assert [(c.code, c.user_turns, c.staff_turns) for c in plain if c.is_case] == [
+        ("Case‑1", ("音すらしないんですが…。",), ("ヒューズをご確認ください。",))]
+    print(plain[1].render())
+    assert plain[1].render().startswith("## 【Case‑1】ポンプがまったく動かない\n\n**ユーザー**\n音すらしないんですが")
+
+
+def test_records_are_compact():
+    """レコードが __slots__ で、URLなどの文字列が共有されることを確認"""
+    first = parse_knowledge_file("異音", MARKDOWN_TEXT)[-1]
+    second = parse_knowledge_file("異音", MARKDOWN_TEXT)[-1]
+    assert not hasattr(first, "__dict__")
+    assert first.urls[1] is second.urls[1] is sys.intern("https://example.com/blog/repair1/")
+    assert isinstance(first, KnowledgeCase)
+
+
+if __name__ == "__main__":
+    test_parse_both_case_formats()
+    test_records_are_compact()
+    print("✅ すべてのテストに成功しました")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+知識ベースの読み込み時索引（knowledge_index.py）のテストスクリプト
+"""
+
+import os
+import tempfile
+
+import knowledge_index
+from knowledge_index import KnowledgeBase, as_knowledge_base, get_knowledge_base, invalidate_knowledge_base
+
+BATTERY_TEXT = """関連ブログ　https://example.com/battery-top/
+
+## 【Case SB‑2】走行中に充電されない
+走行充電器のヒューズを確認してください。URL：https://example.com/blog/charge/
+
+【サブバッテリー寿命】関連事項：サブバッテリー、寿命、交換目安 URL：https://example.com/life/,https://example.com/blog/repair1/」
+"""
+
+WINDOW_TEXT = """## 【Case W‑1】窓から雨漏りする
+【ウインドウ修理】関連事項：ウインドウ、パッキン、サブバッテリー URL：https://example.com/window/
+"""
+
+
+def test_sections_and_urls_are_indexed_at_load():
+    """URLがセクションごとに抽出され、質問と最も一致するセクションのURLだけが返ることを確認"""
+    print("=== 知識ベース索引のテスト ===")
+    kb = KnowledgeBase({"バッテリー": BATTERY_TEXT, "ウインドウ": WINDOW_TEXT})
+    assert kb["バッテリー"] == BATTERY_TEXT
+    assert kb.urls == [
+        "https://example.com/battery-top/", "https://example.com/blog/charge/", "https://example.com/life/",
+        "https://example.com/blog/repair1/", "https://example.com/window/",
+    ]
+    assert kb.blog_titles["https://example.com/blog/repair1/"] == "修理関連記事"
+
+    assert kb.matching_urls("走行中に充電されない") == ["https://example.com/blog/charge/"]
+    # 一致した語の数が同じならどちらのテーマも対象、多い方があればそちらに絞られる
+    assert set(kb.matching_urls("交換目安とパッキン")) == {
+        "https://example.com/life/", "https://example.com/blog/repair1/", "https://example.com/window/"}
+    assert kb.matching_urls("サブバッテリーの寿命") == ["https://example.com/life/", "https://example.com/blog/repair1/"]
+    # 見出しより前のURLはファイル名（カテゴリ）で一致する
+    assert "https://example.com/battery-top/" in kb.matching_urls("バッテリーの相談")
+    assert kb.matching_urls("こんにちは") == []
+
+    keywords = kb.extracted_keywords("ウインドウとバッテリー", ["バッテリー"])
+    print(f"抽出キーワード: {keywords}")
+    assert "ウインドウ" in keywords and "バッテリー" in keywords
+    assert as_knowledge_base(kb) is kb
+    assert as_knowledge_base(None).urls == []
+
+
+def test_shared_knowledge_base_reloads_only_changed_files():
+    """共有の知識ベースがTTL内は再利用され、変更されたファイルだけ読み直されることを確認"""
+    print("=== 知識ベースの共有キャッシュのテスト ===")
+    base_dir = tempfile.mkdtemp(prefix="kb_test_")
+    for file_name, text in (("バッテリー.txt", BATTERY_TEXT), ("ウインドウ.txt", WINDOW_TEXT)):
+        with open(os.path.join(base_dir, file_name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    first = get_knowledge_base(base_dir)
+    assert sorted(first.reloaded) == ["ウインドウ.txt", "バッテリー.txt"]
+    assert get_knowledge_base(base_dir) is first
+
+    # 更新時刻だけ変わった場合は同じ版のまま
+    path = os.path.join(base_dir, "ウインドウ.txt")
+    os.utime(path, ns=(0, 0))
+    invalidate_knowledge_base(base_dir)
+    touched = get_knowledge_base(base_dir)
+    assert touched.version == first.version
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("【網戸】関連事項：網戸 URL：https://example.com/screen/\n")
+    invalidate_knowledge_base(base_dir)
+    second = get_knowledge_base(base_dir)
+    print(f"版: {first.version} -> {second.version} / 読み直し: {second.reloaded}")
+    assert second.reloaded == ["ウインドウ.txt"]
+    assert second.version != first.version
+    assert second["バッテリー"] is first["バッテリー"]
+    assert second.matching_urls("網戸") == ["https://example.com/screen/"]
+
+    # TTL内は stat() もしない（ファイルを消しても前回の内容を返す）
+    os.remove(path)
+    assert get_knowledge_base(base_dir) is second
+    assert knowledge_index.KNOWLEDGE_BASE_TTL > 0
+
+
+if __name__ == "__main__":
+    test_sections_and_urls_are_indexed_at_load()
+    test_shared_knowledge_base_reloads_only_changed_files()
+    print("✅ すべてのテストに成功しました")
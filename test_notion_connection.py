@@ -5,7 +5,7 @@ Notion接続テストスクリプト
 
 import os
 import streamlit as st
-from notion_client import Client
+from shared_clients import get_notion_client
 from dotenv import load_dotenv
 
 # .envファイルを読み込み
@@ -41,7 +41,7 @@ def test_notion_connection():
     st.header("🔌 Notion接続テスト")
     
     try:
-        client = Client(auth=api_key)
+        client = get_notion_client(api_key)
         st.success("✅ Notionクライアントの初期化に成功しました")
         
         # データベースアクセステスト
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Notionページネーション読み込みのテストスクリプト（オフライン）
+"""
+
+from notion_loader import iter_database_pages, iter_query_responses
+
+
+class FakeDatabases:
+    """databases.queryだけを持つダミー（250件を100件ずつ返す）"""
+
+    def __init__(self, total=250):
+        self.rows = [{"id": f"page-{i}", "properties": {}} for i in range(total)]
+        self.calls = []
+
+    def query(self, database_id, start_cursor=None, page_size=100, **kwargs):
+        self.calls.append(start_cursor)
+        start = int(start_cursor) if start_cursor else 0
+        end = start + page_size
+        has_more = end < len(self.rows)
+        return {
+            "results": self.rows[start:end],
+            "has_more": has_more,
+            "next_cursor": str(end) if has_more else None,
+        }
+
+
+class FakeClient:
+    def __init__(self, total=250):
+        self.databases = FakeDatabases(total)
+
+
+def test_iter_database_pages_follows_cursors():
+    """has_moreを辿って全件取得できることを確認"""
+    print("=== ページネーション読み込みテスト ===")
+    for prefetch in (True, False):
+        client = FakeClient(250)
+        pages = list(iter_database_pages(client, "db", prefetch=prefetch))
+        print(f"prefetch={prefetch}: {len(pages)}件 / API呼び出し {len(client.databases.calls)}回")
+        assert [p["id"] for p in pages] == [f"page-{i}" for i in range(250)]
+        assert client.databases.calls == [None, "100", "200"]
+
+
+def test_iter_query_responses_empty_database():
+    """空のデータベースでも1回のクエリで終了することを確認"""
+    client = FakeClient(0)
+    responses = list(iter_query_responses(client, "db"))
+    assert len(responses) == 1
+    assert responses[0]["results"] == []
+
+
+if __name__ == "__main__":
+    test_iter_database_pages_follows_cursors()
+    test_iter_query_responses_empty_database()
+    print("✅ すべてのテストに成功しました")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+一括移行エンジン（チェックポイント再開・並列作成）のテストスクリプト（疑似Notionサーバー使用）
+"""
+
+import os
+import tempfile
+
+from notion_client import Client
+
+import shared_clients
+from fake_notion_server import start_fake_server
+from notion_migration import MigrationJournal, migrate_pages, sync_pages
+
+
+def _records(count):
+    return [(f"N{i:03d}", {"ノードID": {"title": [{"text": {"content": f"N{i:03d}"}}]}}) for i in range(count)]
+
+
+def test_migration_resumes_from_journal():
+    """ジャーナルに記録済みのキーは再作成せず、429は再試行して全件作成されることを確認"""
+    print("=== 一括移行の再開テスト ===")
+    shared_clients._notion_limiter = shared_clients.RateLimiter(0)  # テストではレート制限なし
+    server = start_fake_server(seed=False, rate_limit_every=4)
+    try:
+        server.store.add_database("db", "テストDB")
+        client = Client(auth="secret_fake", base_url=server.url)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "nodes.jsonl")
+
+            # 途中で中断した状態を再現（最初の5件だけ作成済み）
+            journal = MigrationJournal(path)
+            first, failed = migrate_pages(client, "db", _records(5), journal, workers=2)
+            assert len(first) == 5 and not failed
+
+            journal = MigrationJournal(path)
+            created, failed = migrate_pages(client, "db", _records(20), journal, workers=4)
+            print(f"作成 {len(created)}件 / 429 {server.stats()['rate_limited']}回")
+            assert len(created) == 20 and not failed
+            assert all(created[key] == page_id for key, page_id in first.items())
+            assert len(server.store.databases["db"]["pages"]) == 20
+            assert server.stats()["rate_limited"] > 0
+
+            # 再実行しても新規作成は発生しない
+            server.reset_stats()
+            created, failed = migrate_pages(client, "db", _records(20), MigrationJournal(path))
+            assert server.stats()["calls"] == 0 and len(created) == 20
+    finally:
+        server.shutdown()
+        shared_clients._notion_limiter = None
+
+
+def _node(node_id, question):
+    return {
+        "ノードID": {"title": [{"text": {"content": node_id}}]},
+        "質問内容": {"rich_text": [{"text": {"content": question}}]},
+        "開始フラグ": {"checkbox": False},
+    }
+
+
+def test_sync_writes_only_differences():
+    """同期モードで必要な作成・更新・アーカイブだけが実行され、再実行では書き込みがないことを確認"""
+    print("=== 同期モードのテスト ===")
+    shared_clients._notion_limiter = shared_clients.RateLimiter(0)
+    server = start_fake_server(seed=False)
+    try:
+        server.store.add_database("db", "テストDB")
+        for node_id in ("N1", "N2", "N3"):
+            server.store.create_page({"database_id": "db"}, _node(node_id, "質問"))
+        server.store.create_page({"database_id": "db"}, _node("N1", "重複"))
+        client = Client(auth="secret_fake", base_url=server.url)
+
+        desired = [_node("N1", "質問"), _node("N2", "変更後の質問"), _node("N4", "質問")]
+
+        server.reset_stats()
+        sync_pages(client, "db", desired, "ノードID", dry_run=True, archive=True)
+        assert server.stats()["by_endpoint"] == {"databases.query": 1}
+
+        server.reset_stats()
+        pages, failed = sync_pages(client, "db", desired, "ノードID", archive=True)
+        calls = server.stats()["by_endpoint"]
+        print(f"書き込み: {calls}")
+        assert not failed and sorted(pages) == ["N1", "N2", "N4"]
+        # 作成1件（N4）・更新1件（N2）・アーカイブ2件（N3と重複したN1）
+        assert calls == {"databases.query": 1, "pages.create": 1, "pages.update": 3}
+
+        server.reset_stats()
+        sync_pages(client, "db", desired, "ノードID", archive=True)
+        assert server.stats()["by_endpoint"] == {"databases.query": 1}
+    finally:
+        server.shutdown()
+        shared_clients._notion_limiter = None
+
+
+if __name__ == "__main__":
+    test_migration_resumes_from_journal()
+    test_sync_writes_only_differences()
+    print("✅ すべてのテストに成功しました")
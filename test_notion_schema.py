@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Notionプロパティスキーマ（抽出関数）のテストスクリプト（オフライン）
+"""
+
+from notion_schema import (
+    compile_schema, parse_pages, parse_diagnostic_node, parse_kb_case, parse_kb_item
+)
+
+
+def rich_text(*segments):
+    return {"type": "rich_text", "rich_text": [{"plain_text": s} for s in segments]}
+
+
+def title(*segments):
+    return {"type": "title", "title": [{"plain_text": s} for s in segments]}
+
+
+def test_diagnostic_node_joins_all_segments():
+    """rich_textの全セグメントを連結し、型付きのレコードになることを確認"""
+    print("=== 診断ノードの変換テスト ===")
+    page = {
+        "id": "page-1",
+        "properties": {
+            "ノードID": title("N", "001"),
+            "質問内容": rich_text("バッテリーは", "充電されていますか？"),
+            "カテゴリ": rich_text("バッテリー"),
+            "開始フラグ": {"type": "checkbox", "checkbox": True},
+            "次のノード": rich_text("N002, ", "N003,"),
+            "修理ケース": {"type": "relation", "relation": [{"id": "case-1"}]},
+        },
+    }
+    record = parse_diagnostic_node(page)
+    print(record)
+    assert record["node_id"] == "N001"
+    assert record["question"] == "バッテリーは充電されていますか？"
+    assert record["is_start"] is True and record["is_end"] is False
+    assert record["next_nodes"] == ["N002", "N003"]
+    assert record["related_repair_cases"] == ["case-1"]
+    assert record["result"] == ""
+
+
+def test_required_fields_and_type_mismatch():
+    """必須項目が空のページは除外され、型が異なるプロパティは既定値になることを確認"""
+    pages = [
+        {"id": "a", "properties": {"ノードID": title("")}},
+        {"id": "b", "properties": {"ノードID": title("N009"), "カテゴリ": {"type": "select", "select": {"name": "x"}}}},
+    ]
+    records = list(parse_pages(pages, parse_diagnostic_node))
+    assert [r["node_id"] for r in records] == ["N009"]
+    assert records[0]["category"] == ""
+
+    # 部品はリレーション形式・multi_select形式のどちらかだけが埋まる
+    case = parse_kb_case({"id": "c", "properties": {
+        "必要な部品": {"type": "multi_select", "multi_select": [{"name": "ヒューズ"}]},
+    }})
+    assert case["id"] == "c" and case["parts"] == ["ヒューズ"] and case["part_ids"] == []
+
+    item = parse_kb_item({"id": "i", "properties": {"価格": {"type": "number", "number": None}}})
+    assert item["price"] is None
+
+
+def test_unknown_type_is_rejected():
+    """未対応の型はスキーマのコンパイル時にエラーになることを確認"""
+    try:
+        compile_schema({"x": ("X", "formula")})
+    except ValueError as e:
+        print(f"想定どおりのエラー: {e}")
+    else:
+        raise AssertionError("ValueErrorが発生しませんでした")
+
+
+if __name__ == "__main__":
+    test_diagnostic_node_joins_all_segments()
+    test_required_fields_and_type_mismatch()
+    test_unknown_type_is_rejected()
+    print("✅ すべてのテストに成功しました")
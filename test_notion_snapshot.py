@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Notionスナップショットキャッシュ（差分更新）のテストスクリプト（疑似Notionサーバー使用）
+"""
+
+import tempfile
+
+from notion_client import Client
+
+import notion_snapshot
+from fake_notion_server import start_fake_server
+
+
+def _item(name):
+    return {"部品名": {"title": [{"text": {"content": name}}]}}
+
+
+def test_snapshot_refreshes_only_edited_pages():
+    """2回目以降は前回以降に編集されたページだけを取得し、オフラインでも読めることを確認"""
+    print("=== スナップショット差分更新のテスト ===")
+    server = start_fake_server(seed=False)
+    original_dir = notion_snapshot.NOTION_SNAPSHOT_DIR
+    try:
+        server.store.add_database("db", "テストDB")
+        page_ids = [server.store.create_page({"database_id": "db"}, _item(f"部品{i}"))["id"] for i in range(10)]
+        for i, page_id in enumerate(page_ids):
+            server.store.pages[page_id]["last_edited_time"] = f"2024-01-01T00:00:0{i}.000Z"
+        client = Client(auth="secret_fake", base_url=server.url)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            notion_snapshot.NOTION_SNAPSHOT_DIR = tmp
+            pages, fetched = notion_snapshot.refresh_snapshot(client, "db")
+            assert len(pages) == 10 and fetched == 10
+
+            server.store.update_page(page_ids[3], _item("ヒューズ"))
+            server.store.create_page({"database_id": "db"}, _item("リレー"))
+
+            pages, fetched = notion_snapshot.refresh_snapshot(client, "db")
+            print(f"差分取得 {fetched}件 / スナップショット {len(pages)}件")
+            # 編集・追加した2件と、前回の最新時刻と同じ時刻のページ（部品9）だけを取り直す
+            assert len(pages) == 11 and fetched == 3
+            names = {p["properties"]["部品名"]["title"][0]["plain_text"] for p in pages}
+            assert {"ヒューズ", "リレー"} <= names and "部品3" not in names
+
+            server.reset_stats()
+            assert len(notion_snapshot.read_snapshot_pages("db")) == 11
+            assert server.stats()["calls"] == 0
+    finally:
+        notion_snapshot.NOTION_SNAPSHOT_DIR = original_dir
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_snapshot_refreshes_only_edited_pages()
+    print("✅ すべてのテストに成功しました")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+質問文の解析（query_analysis.py）のテストスクリプト
+"""
+
+from keyword_matcher import KNOWLEDGE_CATEGORY_KEYWORDS, category_for_blog, category_for_query, match_vocabulary
+from query_analysis import QueryAnalysis, analyze_query
+
+QUERIES = [
+    "サブバッテリーが充電されない",
+    "インバーターから異音がして過熱する",
+    "ルーフベントの換気扇が回らない、雨漏りもある",
+    "トイレのフラッパーから水漏れ",
+    "こんにちは",
+]
+
+
+def _legacy_knowledge_categories(query):
+    """従来の extract_relevant_knowledge() と同じ判定（カテゴリごとに `in` を繰り返す）"""
+    query_lower = query.lower()
+    return [category for category, keywords in KNOWLEDGE_CATEGORY_KEYWORDS
+            if any(keyword in query_lower for keyword in keywords)]
+
+
+def test_analysis_matches_per_call_scans():
+    """一度の解析結果が、関数ごとに走査していた従来の結果と一致することを確認"""
+    print("=== 質問文の解析のテスト ===")
+    blog = {"title": "インバーターの選び方", "url": "https://example.com/inverter/", "keywords": ["正弦波"]}
+    for query in QUERIES:
+        analysis = analyze_query(query)
+        hits = match_vocabulary(query)
+        print(f"{query} -> {analysis.category} / {analysis.knowledge_categories}")
+        assert analysis.normalized == query.lower()
+        assert list(analysis.keywords) == hits.get("main", []) + hits.get("trouble", [])
+        assert list(analysis.terms) == hits.get("tech", []) + hits.get("trouble", [])
+        assert analysis.category == category_for_query(hits)
+        assert list(analysis.knowledge_categories) == _legacy_knowledge_categories(query)
+        assert analysis.blog_category(blog) == category_for_blog(blog, hits)
+
+
+def test_analysis_is_shared():
+    """同じ質問文・解析結果を渡したときに再解析しないことを確認"""
+    print("=== 解析結果の共有のテスト ===")
+    analysis = analyze_query(QUERIES[0])
+    assert analyze_query(analysis) is analysis
+    assert analyze_query(QUERIES[0]) is analysis
+    assert isinstance(analyze_query(None), QueryAnalysis)
+    # 英字のキーワードは大文字・小文字を区別しない
+    assert "電気" in analyze_query("LEDが点かない").knowledge_categories
+
+
+if __name__ == "__main__":
+    test_analysis_matches_per_call_scans()
+    test_analysis_is_shared()
+    print("✅ すべてのテストに成功しました")
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+終端ノード -> 修理ケース索引（repair_index.py）のテストスクリプト
+"""
+
+from diagnostic_engine import load_graph
+from repair_index import load_terminal_index
+
+
+def test_terminal_index_from_repository_data():
+    """終端ノードから修理ケース・部品・工具・費用・作業時間が引けることを確認"""
+    print("=== 終端ノード索引のテスト ===")
+    graph = load_graph("diag_nodes_linked_5nodes.csv")
+    index = load_terminal_index(graph)
+    print(f"終端ノード {len(graph.terminals)}件 / 索引 {len(index)}件")
+    assert set(index) == set(graph.terminals)
+
+    info = index[graph.lookup("NODE-4005")]
+    assert info["case_id"] == "CASE-2001"
+    assert info["part_list"] == ("バッテリー", "ブースターケーブル", "バッテリー端子")
+    assert "テスター" in info["tool_list"]
+    assert info["cost"] == 8000 and info["minutes"] == 30
+    assert "<br>" not in info["repair_steps"]
+
+    # terminal_case_id を持たない診断データでは索引は空になる
+    assert load_terminal_index(load_graph("mock_diagnostic_nodes.json")) == {}
+
+
+if __name__ == "__main__":
+    test_terminal_index_from_repository_data()
+    print("✅ すべてのテストに成功しました")
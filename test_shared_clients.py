@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+共有クライアントと接続チェックキャッシュのテストスクリプト（オフライン）
+"""
+
+import shared_clients
+
+
+class FakeUsers:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def me(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("401 unauthorized")
+        return {"name": "bot"}
+
+
+class FakeNotion:
+    def __init__(self):
+        self.users = FakeUsers()
+
+
+def test_health_check_is_cached_until_error():
+    """接続チェックはTTL内で再利用され、失敗時はキャッシュされないことを確認"""
+    print("=== Notion接続チェックのキャッシュテスト ===")
+    fake = FakeNotion()
+    shared_clients._notion_clients["test-key"] = fake
+    shared_clients.invalidate_notion_health("test-key")
+
+    assert shared_clients.get_notion_client("test-key") is fake
+    assert shared_clients.check_notion_health("test-key") == (True, "")
+    assert shared_clients.check_notion_health("test-key") == (True, "")
+    print(f"2回チェック -> users.me 呼び出し {fake.users.calls}回")
+    assert fake.users.calls == 1
+
+    # 強制チェックで失敗した場合は次回も再チェックされる
+    fake.users.fail = True
+    ok, message = shared_clients.check_notion_health("test-key", force=True)
+    assert not ok and "401" in message
+    fake.users.fail = False
+    assert shared_clients.check_notion_health("test-key") == (True, "")
+    assert fake.users.calls == 3
+
+
+def test_openai_clients_share_one_pool():
+    """同じ設定のモデルは再利用され、HTTPプールは全モデルで共有されることを確認"""
+    llm = shared_clients.get_chat_model("sk-test", model="gpt-4o-mini", temperature=0.7)
+    assert shared_clients.get_chat_model("sk-test", model="gpt-4o-mini", temperature=0.7) is llm
+    other = shared_clients.get_chat_model("sk-test", model="gpt-3.5-turbo", temperature=0.7)
+    assert other is not llm
+    assert llm.root_client._client is other.root_client._client is shared_clients.get_openai_http_client()
+    embeddings = shared_clients.get_embeddings("sk-test")
+    assert embeddings.client._client._client is shared_clients.get_openai_http_client()
+
+
+def test_creates_are_retried_only_when_rate_limited():
+    """作成（idempotent=False）はタイムアウト・5xxで再試行せず、429だけ再試行することを確認"""
+    print("=== 作成の再試行のテスト ===")
+
+    class APIError(Exception):
+        def __init__(self, status, headers=None):
+            super().__init__(f"status {status}")
+            self.status = status
+            self.headers = headers or {"Retry-After": "0"}
+
+    def flaky(errors):
+        calls = []
+
+        def func(**kwargs):
+            calls.append(kwargs)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return {"id": "page"}
+        return func, calls
+
+    func, calls = flaky([APIError(502)])
+    assert shared_clients.call_notion(func, properties={}) == {"id": "page"} and len(calls) == 2
+
+    func, calls = flaky([APIError(502)])
+    try:
+        shared_clients.call_notion(func, properties={}, idempotent=False)
+        raise AssertionError("5xx の後に作成を再試行した")
+    except APIError:
+        pass
+    # idempotent は Notion API には渡さない
+    assert calls == [{"properties": {}}]
+
+    func, calls = flaky([APIError(429)])
+    assert shared_clients.call_notion(func, properties={}, idempotent=False) == {"id": "page"} and len(calls) == 2
+
+
+if __name__ == "__main__":
+    test_health_check_is_cached_until_error()
+    test_openai_clients_share_one_pool()
+    test_creates_are_retried_only_when_rate_limited()
+    print("✅ すべてのテストに成功しました")
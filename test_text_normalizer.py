@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+照合用の正規化（text_normalizer.py）のテストスクリプト
+"""
+
+from blog_catalog import BlogCatalog
+from keyword_matcher import match_vocabulary
+from knowledge_index import KnowledgeBase
+from text_normalizer import normalize_text
+
+
+def test_normalize_text():
+    """全角半角・空白・長音・表記ゆれがそろい、何度適用しても同じになることを確認"""
+    print("=== 正規化のテスト ===")
+    cases = {
+        "ＬＥＤが点かない": "ledが点かない",
+        "１２Ｖまで下がる": "12vまで下がる",
+        "ｻﾌﾞﾊﾞｯﾃﾘｰ": "サブバッテリー",
+        "サブ バッテリー": "サブバッテリー",
+        "ルーフベント　換気扇": "ルーフベント換気扇",
+        "インバータ－の故障": "インバーターの故障",
+        "バッテリ交換": "バッテリー交換",
+        "バッテリー交換": "バッテリー交換",
+        "ウィンドウ": "ウインドウ",
+        "DC-AC 12V": "dc-ac 12v",
+    }
+    for text, expected in cases.items():
+        normalized = normalize_text(text)
+        print(f"{text!r} -> {normalized!r}")
+        assert normalized == expected
+        assert normalize_text(normalized) == normalized
+    # 改行は残す（行をまたいだ一致を作らない）
+    assert normalize_text("電装 \n  配線") == "電装\n配線"
+
+
+def test_normalize_text_is_idempotent():
+    """空白を挟んだ長音・合成できない濁点があっても、2回目の正規化で結果が変わらないことを確認"""
+    print("=== 正規化の冪等性のテスト ===")
+    cases = {
+        "モト ィー\u3000ー": "モトィー",
+        "モーター ー ー": "モーター",
+        "インバータ ーー": "インバーター",
+        "ｰｳｨﾝﾄﾞｰﾞ": "ーウインドウ",
+    }
+    for text, expected in cases.items():
+        normalized = normalize_text(text)
+        print(f"{text!r} -> {normalized!r}")
+        assert normalized == expected
+        assert normalize_text(normalized) == normalized
+
+
+def test_variants_match_indexes():
+    """表記ゆれのある質問が語彙・知識ベース・ブログカタログに一致することを確認"""
+    print("=== 表記ゆれの照合のテスト ===")
+    assert match_vocabulary("ＬＥＤ照明") == match_vocabulary("led照明")
+    assert "バッテリー" in match_vocabulary("ｻﾌﾞﾊﾞｯﾃﾘが充電されない")["main"]
+
+    kb = KnowledgeBase({"ルーフベント　換気扇": "【換気扇の修理】関連事項：ファン URL：https://example.com/fan/\n"})
+    assert kb.extracted_keywords(normalize_text("ルーフベント 換気扇が回らない"), ()) == ["ルーフベント換気扇"]
+
+    catalog = BlogCatalog([
+        {"title": "ＦＦヒーターの点検", "url": "https://example.com/ff/", "keywords": ["ＦＦヒーター"]},
+        {"title": "窓の修理", "url": "https://example.com/window/", "keywords": ["ウィンドウ"]},
+    ])
+    assert catalog.top("ffヒータが点かない", ["ffヒーター"], limit=1)[0]["url"] == "https://example.com/ff/"
+    assert catalog.top("ウインドーの雨漏り", ["ウインドウ"], limit=1)[0]["url"] == "https://example.com/window/"
+
+
+if __name__ == "__main__":
+    test_normalize_text()
+    test_normalize_text_is_idempotent()
+    test_variants_match_indexes()
+    print("✅ すべてのテストに成功しました")
@@ -0,0 +1,74 @@
+# text_normalizer.py
+"""
+照合用の日本語テキストの正規化
+
+索引の作成時（キーワード・本文・ブログ）と質問ごとに一度だけ適用し、
+照合はすべて正規化した形どうしで行う。同じ文字列は再計算しない（lru_cache）。
+
+1. NFKC（全角英数字 -> 半角、半角カナ -> 全角、全角スペース -> 半角）。合成できない濁点・半濁点は除く
+2. 小文字化
+3. カタカナの後の長音に似た記号（- ‐ – ― ～ など）を「ー」にそろえる
+4. 空白をまとめ、日本語の文字に挟まれた空白を除く（「サブ バッテリー」-> 「サブバッテリー」）。
+   続く長音（「ーー」「ー ー」）は一つにする
+5. 表記ゆれ（SYNONYMS）を代表の表記にそろえる（「バッテリ」-> 「バッテリー」）
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# 表記ゆれ -> 代表の表記（正規化の1〜4を適用した後の形で書く）
+SYNONYMS = {
+    "バッテリ": "バッテリー",
+    "インバータ": "インバーター",
+    "ヒータ": "ヒーター",
+    "コンプレッサ": "コンプレッサー",
+    "モータ": "モーター",
+    "ソーラ": "ソーラー",
+    "コントローラ": "コントローラー",
+    "ウィンドウ": "ウインドウ",
+    "ウインドー": "ウインドウ",
+    "ウィンドー": "ウインドウ",
+    "ベンチレーター": "ルーフベント",
+    "シーラント": "シーリング",
+}
+
+_JAPANESE = "ぁ-んァ-ヴー一-龯々"
+_LONG_VOWEL = re.compile(r"(?<=[ァ-ヴー])[-‐‑‒–—―−~〜～]+")
+_REPEATED_LONG_VOWEL = re.compile(r"ー{2,}")
+# NFKC で前の文字と合成できなかった濁点・半濁点（「ーﾞ」など）
+_COMBINING_SOUND_MARK = re.compile("[\u3099\u309a]")
+_SPACES = re.compile(r"[^\S\n]+")
+_SPACES_AROUND_NEWLINE = re.compile(r" ?\n ?")
+_SPACE_BETWEEN_JAPANESE = re.compile(rf"(?<=[{_JAPANESE}]) (?=[{_JAPANESE}])")
+
+
+def _synonym_pattern(synonyms):
+    # 代表の表記が表記ゆれで始まる場合（バッテリ -> バッテリー）は、代表の表記には一致させない
+    parts = []
+    for variant in sorted(synonyms, key=len, reverse=True):
+        canonical = synonyms[variant]
+        pattern = re.escape(variant)
+        if canonical.startswith(variant) and len(canonical) > len(variant):
+            pattern += f"(?!{re.escape(canonical[len(variant)])})"
+        parts.append(pattern)
+    return re.compile("|".join(parts))
+
+
+_SYNONYM_PATTERN = _synonym_pattern(SYNONYMS)
+
+
+@lru_cache(maxsize=4096)
+def normalize_text(text):
+    """照合用に正規化したテキスト（何度適用しても同じ結果になる）"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    # 残った濁点は表記ゆれの置き換え後に前の文字と合成されてしまうため除く
+    text = _COMBINING_SOUND_MARK.sub("", text)
+    text = _LONG_VOWEL.sub("ー", text)
+    text = _SPACES_AROUND_NEWLINE.sub("\n", _SPACES.sub(" ", text))
+    text = _SPACE_BETWEEN_JAPANESE.sub("", text)
+    # 空白を除いて隣り合った長音（「モト ー ー」）もまとめるため、空白の処理の後に行う
+    text = _REPEATED_LONG_VOWEL.sub("ー", text)
+    return _SYNONYM_PATTERN.sub(lambda match: SYNONYMS[match.group(0)], text)